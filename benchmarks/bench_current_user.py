@@ -0,0 +1,47 @@
+"""
+Hot path of ``Auth.get_current_user``.
+
+Times the dependency for an already cached user, with the verified-token cache warm and with it cleared
+before every call (a full ``jwt.decode``), and prints the token cache counters.
+
+    python -m benchmarks.bench_current_user --number 50000
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import print_table
+from src.database.models import User
+from src.services.auth import auth_service
+
+
+async def timed(fn, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        await fn()
+    return (time.perf_counter() - start) / number * 1e6
+
+
+async def main(args):
+    token = await auth_service.create_access_token(data={"sub": "bench@example.com"}, expires_delta=3600)
+    # warm the in-process user tier so only token handling is measured
+    auth_service.user_cache.set("bench@example.com", {"id": 1, "email": "bench@example.com"})
+
+    async def cold():
+        auth_service.token_cache.clear()
+        return await auth_service.get_current_user(token, None)
+
+    async def warm():
+        return await auth_service.get_current_user(token, None)
+
+    assert isinstance(await warm(), User)
+    rows = [["jwt.decode every call", await timed(cold, args.number)],
+            ["verified-token cache hit", await timed(warm, args.number)]]
+    print_table(["path", "us per call"], rows)
+    print(auth_service.token_cache.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=50_000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,161 @@
+"""
+Throughput of sending email with a new SMTP connection per message versus the persistent connection pool.
+
+A local aiosmtpd server accepts the messages. ``--latency`` delays every SMTP command on the server,
+as the round trip to a remote provider would, which is what the pool saves: the TCP and TLS handshakes,
+EHLO and AUTH are paid once per connection instead of once per message. ``--tls`` serves implicit TLS
+with a throwaway self-signed certificate.
+
+    python -m benchmarks.bench_email --messages 200 --latency 5
+    python -m benchmarks.bench_email --messages 200 --latency 20 --tls --pool-sizes 1 4 8
+"""
+import asyncio
+import datetime
+import socket
+import ssl
+import tempfile
+from pathlib import Path
+
+import aiosmtplib
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+from benchmarks.common import base_parser, print_table, Timer
+from src.services.email import SMTPPool, build_message, render
+
+USERNAME, PASSWORD = "bench", "password"
+
+
+class SlowHandler:
+    """Accepts every message, sleeping latency seconds on each command that needs a round trip."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.received = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.latency)
+        session.host_name = hostname
+        return responses
+
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        await asyncio.sleep(self.latency)
+        envelope.mail_from = address
+        envelope.mail_options.extend(mail_options)
+        return '250 OK'
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        await asyncio.sleep(self.latency)
+        envelope.rcpt_tos.append(address)
+        envelope.rcpt_options.extend(rcpt_options)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latency)
+        self.received += 1
+        return '250 OK'
+
+
+def authenticate(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=auth_data.login == USERNAME.encode() and auth_data.password == PASSWORD.encode())
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def self_signed_context() -> ssl.SSLContext:
+    """
+    The self_signed_context function creates a server TLS context with a new self-signed certificate for localhost.
+
+    :return: The server SSL context
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+                   .serial_number(x509.random_serial_number()).not_valid_before(now)
+                   .not_valid_after(now + datetime.timedelta(days=1)).sign(key, hashes.SHA256()))
+    folder = Path(tempfile.mkdtemp(prefix="bench_smtp_"))
+    (folder / "cert.pem").write_bytes(certificate.public_bytes(serialization.Encoding.PEM))
+    (folder / "key.pem").write_bytes(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                                       serialization.NoEncryption()))
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(folder / "cert.pem", folder / "key.pem")
+    return context
+
+
+async def per_message(options: dict, messages: list, concurrency: int) -> None:
+    """
+    The per_message function sends every message over its own connection, the way the mailer worked before the pool.
+
+    :param options: dict: Arguments of aiosmtplib.SMTP
+    :param messages: list: Messages to send
+    :param concurrency: int: Messages in flight at the same time
+    :return: None
+    """
+    slots = asyncio.Semaphore(concurrency)
+
+    async def send(message):
+        async with slots:
+            client = aiosmtplib.SMTP(**options)
+            await client.connect()
+            await client.login(USERNAME, PASSWORD)
+            await client.send_message(message)
+            await client.quit()
+
+    await asyncio.gather(*(send(message) for message in messages))
+
+
+async def main(args):
+    handler = SlowHandler(args.latency / 1000)
+    port = free_port()
+    server_tls = self_signed_context() if args.tls else None
+    controller = Controller(handler, hostname="127.0.0.1", port=port, authenticator=authenticate,
+                            auth_require_tls=False, ssl_context=server_tls)
+    controller.start()
+    options = {"hostname": "127.0.0.1", "port": port, "use_tls": args.tls, "validate_certs": False, "timeout": 30}
+    html = render("email_template.html", host="http://localhost:8000/", username="bench", token="token")
+    messages = [build_message(f"user{n}@example.com", "Confirm your email", html) for n in range(args.messages)]
+    rows = []
+    try:
+        for size in args.pool_sizes:
+            with Timer() as timer:
+                await per_message(options, messages, size)
+            rows.append([f"connection per message, {size} in flight", args.messages, args.messages / timer.elapsed])
+
+            pool = SMTPPool(**options, username=USERNAME, password=PASSWORD, size=size,
+                            max_messages=args.max_messages)
+            with Timer() as timer:
+                await asyncio.gather(*(pool.send(message) for message in messages))
+            rows.append([f"pool, send, size {size}", pool.stats()["connects"], args.messages / timer.elapsed])
+            await pool.close()
+
+            pool = SMTPPool(**options, username=USERNAME, password=PASSWORD, size=size,
+                            max_messages=args.max_messages)
+            with Timer() as timer:
+                await pool.send_many(messages)
+            rows.append([f"pool, send_many, size {size}", pool.stats()["connects"], args.messages / timer.elapsed])
+            await pool.close()
+    finally:
+        controller.stop()
+    print(f"{args.messages} messages, {args.latency} ms per SMTP command, {'TLS' if args.tls else 'plain'} "
+          f"({handler.received} received)")
+    print_table(["mode", "connections", "messages/s"], rows)
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=5, help="server delay per SMTP command in ms")
+    parser.add_argument("--tls", action="store_true", help="implicit TLS with a self-signed certificate")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--max-messages", type=int, default=100, help="messages per pooled connection")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,46 @@
+"""
+Full responses versus 304 revalidation for polling clients.
+
+Requests ``GET /api/contacts?limit=--limit`` and ``GET /api/contacts/{id}`` repeatedly, once without and
+once with the ETag of the previous response in ``If-None-Match``, and reports latency and bytes per request.
+
+    python -m benchmarks.bench_etag --contacts 10000 --limit 500
+"""
+import asyncio
+import time
+
+from benchmarks.common import (base_parser, create_database, seed_user, app_client, auth_headers, percentile,
+                               print_table)
+
+
+async def poll(client, url: str, headers: dict, requests: int, conditional: bool) -> list:
+    etag = (await client.get(url, headers=headers)).headers["etag"]
+    latencies, size, status = [], 0, None
+    for _ in range(requests):
+        request_headers = {**headers, "If-None-Match": etag} if conditional else headers
+        start = time.perf_counter()
+        response = await client.get(url, headers=request_headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        size, status = len(response.content), response.status_code
+    return [url.split("?")[0], status, size, percentile(latencies, 50), percentile(latencies, 99)]
+
+
+async def main(args):
+    engine = await create_database(args.url)
+    await seed_user(engine, contacts=args.contacts)
+    headers = await auth_headers()
+    rows = []
+    async with app_client(engine) as client:
+        for url in (f"/api/contacts/?limit={args.limit}", "/api/contacts/1"):
+            for conditional in (False, True):
+                rows.append(await poll(client, url, headers, args.requests, conditional))
+    await engine.dispose()
+    print_table(["endpoint", "status", "bytes", "p50 ms", "p99 ms"], rows)
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--contacts", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
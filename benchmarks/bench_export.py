@@ -0,0 +1,76 @@
+"""
+Streaming export versus paging through ``get_contacts``.
+
+For each size in ``--sizes`` one user is seeded, then the whole address book is read
+(1) by the export endpoint function, consuming its streaming body chunk by chunk, and
+(2) the old way, 500 contacts per ``get_contacts`` call validated through ``ContactResponse``.
+Reports time to first byte, total time and the tracemalloc peak of each.
+
+    python -m benchmarks.bench_export --sizes 10000 100000 1000000
+"""
+import asyncio
+import time
+import tracemalloc
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.common import base_parser, create_database, seed_user, print_table
+from src.database.models import User
+from src.repository.contacts import get_contacts
+from src.routes.contacts import export_contacts
+from src.schemas import ContactResponse
+
+
+async def export_all(user: User, db: AsyncSession, fmt: str) -> tuple[float, int]:
+    start = time.perf_counter()
+    response = await export_contacts(fmt, db, user)
+    first_byte, size = None, 0
+    async for chunk in response.body_iterator:
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        size += len(chunk)
+    return first_byte, size
+
+
+async def page_all(user: User, db: AsyncSession, limit: int = 500) -> tuple[float, int]:
+    start = time.perf_counter()
+    first_page, contacts, after_id = None, [], None
+    while page := await get_contacts(user, limit, 0, db, after_id=after_id):
+        if first_page is None:
+            first_page = time.perf_counter() - start
+        contacts.extend(ContactResponse.from_orm(contact) for contact in page)
+        after_id = page[-1].id
+    return first_page, len(contacts)
+
+
+async def measure(fn) -> list:
+    tracemalloc.start()
+    start = time.perf_counter()
+    first, _ = await fn()
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return [first * 1000, total, peak / 2 ** 20]
+
+
+async def main(args):
+    engine = await create_database(args.url)
+    rows = []
+    for size in sorted(args.sizes):
+        print(f"seeding {size} contacts...")
+        user = User(id=await seed_user(engine, email=f"export{size}@example.com", contacts=size))
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            for fmt in ("ndjson", "csv"):
+                rows.append([size, f"export {fmt}", *await measure(lambda: export_all(user, db, fmt))])
+            if size <= args.max_paging:
+                rows.append([size, "get_contacts pages", *await measure(lambda: page_all(user, db))])
+    await engine.dispose()
+    print_table(["contacts", "method", "first byte ms", "total s", "peak MiB"], rows)
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--max-paging", type=int, default=100_000,
+                        help="skip the paging comparison above this size, it keeps every contact in memory")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,93 @@
+"""
+Bulk import versus one ``POST /api/contacts`` per contact.
+
+Writes an NDJSON file of ``--rows`` contacts, uploads it to ``POST /api/contacts/import`` and compares
+the rows per second with ``--single`` calls of the single-create endpoint.
+With ``--memory`` the import is also run directly (without HTTP) under tracemalloc for each size in
+``--memory-sizes`` to show that peak memory does not grow with the file.
+
+    python -m benchmarks.bench_import --rows 100000 --single 200
+    python -m benchmarks.bench_import --rows 100000 --memory --memory-sizes 10000 100000 1000000
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.common import base_parser, create_database, seed_user, app_client, auth_headers, print_table
+from src.database.models import User
+from src.repository.contacts import import_contacts
+from src.services.contacts_io import ImportReport, parse_contacts
+
+
+def contact_record(i: int, prefix: str, base: int) -> dict:
+    return {"firstname": f"first{i}", "lastname": f"last{i}", "email": f"{prefix}{i}@example.com",
+            "phone": f"+{base + i:012d}", "birthday": f"19{i % 100:02d}-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+            "additional_info": "imported"}
+
+
+def write_ndjson(rows: int, prefix: str, base: int) -> str:
+    fd, path = tempfile.mkstemp(suffix=".ndjson")
+    with os.fdopen(fd, "w") as file:
+        for i in range(rows):
+            file.write(json.dumps(contact_record(i, prefix, base)) + "\n")
+    return path
+
+
+async def measure_memory(engine, user: User, rows: int, base: int) -> list:
+    path = write_ndjson(rows, f"mem{rows}_", base)
+    report = ImportReport()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(path, "rb") as file:
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            await import_contacts(user, parse_contacts(file, "ndjson", report), db, report)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    os.remove(path)
+    return [rows, report.inserted, elapsed, peak / 2 ** 20]
+
+
+async def main(args):
+    engine = await create_database(args.url)
+    user = User(id=await seed_user(engine))
+    headers = await auth_headers()
+    path = write_ndjson(args.rows, "bulk", 10 ** 10)
+    async with app_client(engine) as client:
+        start = time.perf_counter()
+        for i in range(args.single):
+            response = await client.post("/api/contacts/", json=contact_record(i, "single", 0), headers=headers)
+            assert response.status_code == 201, response.text
+        single_rate = args.single / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with open(path, "rb") as file:
+            response = await client.post("/api/contacts/import", headers=headers,
+                                         files={"file": ("contacts.ndjson", file, "application/x-ndjson")})
+        bulk_rate = args.rows / (time.perf_counter() - start)
+        assert response.status_code == 200 and response.json()["inserted"] == args.rows, response.text
+    os.remove(path)
+    print_table(["endpoint", "rows", "rows/s", "speedup"],
+                [["POST /api/contacts", args.single, single_rate, 1.0],
+                 ["POST /api/contacts/import", args.rows, bulk_rate, bulk_rate / single_rate]])
+
+    if args.memory:
+        rows = [await measure_memory(engine, user, size, (n + 2) * 10 ** 10)
+                for n, size in enumerate(args.memory_sizes)]
+        print()
+        print_table(["rows", "inserted", "seconds", "peak MiB (tracemalloc)"], rows)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--single", type=int, default=200)
+    parser.add_argument("--memory", action="store_true")
+    parser.add_argument("--memory-sizes", type=int, nargs="+", default=[10_000, 100_000])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,78 @@
+"""
+Contacts endpoint latency during a login storm.
+
+Runs back-to-back ``GET /api/contacts`` requests for as long as ``--logins`` concurrent ``POST /api/auth/login``
+requests are in flight, once with bcrypt on the ``password_executor`` process pool and once inline on the event
+loop (the old behaviour). The idle row runs ``--reads`` requests without logins as the baseline.
+Inline hashing shows up as a few reads stuck for the whole storm; with the executor reads keep flowing.
+On a single core the pool's one worker still takes CPU time from the event loop, so reads slow down
+during the storm instead of stalling; more cores leave the event loop a core of its own.
+
+    python -m benchmarks.bench_login_storm --logins 32
+"""
+import asyncio
+import time
+from unittest.mock import patch
+
+from benchmarks.common import (BENCH_PASSWORD, base_parser, create_database, seed_user, app_client, auth_headers,
+                               percentile, print_table)
+from src.services.auth import Auth, start_password_executor, shutdown_password_executor
+
+
+async def inline_verify(self, plain_password, hashed_password):
+    return self.pwd_context.verify(plain_password, hashed_password)
+
+
+async def run(client, headers: dict, logins: int, reads: int) -> list[float]:
+    latencies = []
+    storm = asyncio.Event()
+
+    def reading() -> bool:
+        return not storm.is_set() if logins else len(latencies) < reads
+
+    async def reader():
+        while reading():
+            start = time.perf_counter()
+            response = await client.get("/api/contacts/", headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.text
+
+    async def login():
+        response = await client.post("/api/auth/login",
+                                     data={"username": "bench@example.com", "password": BENCH_PASSWORD})
+        assert response.status_code == 200, response.text
+
+    async def login_storm():
+        await asyncio.gather(*(login() for _ in range(logins)))
+        storm.set()
+
+    await asyncio.gather(reader(), login_storm())
+    return latencies
+
+
+async def main(args):
+    engine = await create_database(args.url)
+    await seed_user(engine, contacts=args.contacts)
+    headers = await auth_headers()
+    start_password_executor()
+    rows = []
+    async with app_client(engine) as client:
+        for mode, logins in (("idle", 0), ("executor", args.logins), ("inline", args.logins)):
+            if mode == "inline":
+                with patch.object(Auth, "verify_password", inline_verify):
+                    latencies = await run(client, headers, logins, args.reads)
+            else:
+                latencies = await run(client, headers, logins, args.reads)
+            rows.append([mode, logins, len(latencies), percentile(latencies, 50), percentile(latencies, 99),
+                         max(latencies)])
+    await engine.dispose()
+    shutdown_password_executor()
+    print_table(["bcrypt", "logins", "reads", "contacts p50 ms", "contacts p99 ms", "max ms"], rows)
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--contacts", type=int, default=100)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--reads", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
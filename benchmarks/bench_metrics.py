@@ -0,0 +1,60 @@
+"""
+Cost of recording request metrics.
+
+Times the work the middleware adds to every request (two monotonic clock reads, the in-flight gauge and one
+latency histogram observation) spread over ``--routes`` route/status series, and compares it with ``--budget``
+microseconds. Also times rendering ``/metrics`` and merging the snapshots of ``--workers`` processes.
+
+    python -m benchmarks.bench_metrics --routes 40 --workers 8
+"""
+import json
+import random
+import time
+import timeit
+
+from benchmarks.common import base_parser, print_table
+from src.services import metrics
+
+
+def record(route: str, status: int) -> None:
+    # the same steps as main.custom_middleware, without the request itself
+    start = time.perf_counter()
+    metrics.http_requests_in_flight.inc()
+    during = time.perf_counter() - start
+    metrics.http_requests_in_flight.dec()
+    metrics.http_request_duration.observe(during, "GET", route, status)
+
+
+def main(args):
+    random.seed(0)
+    series = [(f"/api/route{i}", random.choice((200, 201, 204, 304, 404))) for i in range(args.routes)]
+    calls = [series[i % len(series)] for i in range(args.requests)]
+
+    def record_all():
+        for route, status in calls:
+            record(route, status)
+
+    def empty_loop():
+        for route, status in calls:
+            pass
+
+    per_request = (min(timeit.repeat(record_all, number=1, repeat=5)) -
+                   min(timeit.repeat(empty_loop, number=1, repeat=5))) / args.requests * 1e6
+    render = min(timeit.repeat(lambda: metrics.render(metrics.snapshot()), number=1, repeat=20)) * 1000
+    dumped = json.loads(json.dumps(metrics.snapshot()))
+    merge = min(timeit.repeat(lambda: metrics.render(metrics.merge([(dumped, True)] * args.workers)),
+                              number=1, repeat=20)) * 1000
+    print_table(["measurement", "value", "unit"],
+                [["record one request", per_request, "us"], ["budget", args.budget, "us"],
+                 [f"render /metrics ({len(series)} series)", render, "ms"],
+                 [f"merge + render, {args.workers} workers", merge, "ms"]])
+    print("\nwithin budget" if per_request < args.budget else "\nOVER BUDGET")
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--routes", type=int, default=40)
+    parser.add_argument("--requests", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--budget", type=float, default=2.0, help="allowed recording cost per request in microseconds")
+    main(parser.parse_args())
@@ -0,0 +1,107 @@
+"""
+Requests per second of a trivial endpoint behind the timing and error middlewares.
+
+Builds three apps with the same ``GET /ping`` endpoint: without middleware, with the previous
+``@app.middleware("http")`` pair (BaseHTTPMiddleware) and with the pure ASGI pair from
+``src.services.middleware``, and sends ``--requests`` requests to each in-process with ``--concurrency``
+requests in flight.
+
+    python -m benchmarks.bench_middleware --requests 20000 --concurrency 16
+"""
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from benchmarks.common import base_parser, print_table
+from src.services import metrics
+from src.services.middleware import TimingMiddleware, ErrorsMiddleware
+from src.services.timing import RequestTiming, request_timing
+
+
+def plain_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+def decorator_app() -> FastAPI:
+    app = plain_app()
+
+    # the middlewares as they were written before, for comparison
+    @app.middleware('http')
+    async def custom_middleware(request: Request, call_next):
+        timing = RequestTiming()
+        token = request_timing.set(timing)
+        metrics.http_requests_in_flight.inc()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+        finally:
+            during = time.perf_counter() - timing.start
+            request_timing.reset(token)
+            metrics.http_requests_in_flight.dec()
+            route = request.scope.get("route")
+            metrics.http_request_duration.observe(during, request.method, route.path if route else "other",
+                                                  status_code)
+        response.headers['performance'] = str(during)
+        response.headers['Server-Timing'] = timing.server_timing()
+        return response
+
+    @app.middleware("http")
+    async def errors_handling(request: Request, call_next):
+        try:
+            return await call_next(request)
+        except Exception as exc:
+            return JSONResponse(status_code=500, content={'reason': str(exc)})
+
+    return app
+
+
+def asgi_app() -> FastAPI:
+    app = plain_app()
+    app.add_middleware(TimingMiddleware)
+    app.add_middleware(ErrorsMiddleware)
+    return app
+
+
+async def run(app: FastAPI, requests: int, concurrency: int) -> float:
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        for _ in range(100):
+            await client.get("/ping")
+        remaining = iter(range(requests))
+
+        async def worker():
+            for _ in remaining:
+                response = await client.get("/ping")
+                assert response.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - start)
+
+
+async def main(args):
+    rows = []
+    for name, build in (("no middleware", plain_app), ("@app.middleware (BaseHTTPMiddleware)", decorator_app),
+                        ("pure ASGI", asgi_app)):
+        rate = max([await run(build(), args.requests, args.concurrency) for _ in range(args.repeat)])
+        rows.append([name, rate, 1e6 / rate])
+    for row in rows:
+        row.append(row[1] / rows[1][1])
+    print_table(["middleware", "requests/s", "us/request", "vs decorators"], rows)
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,53 @@
+"""
+Offset versus keyset pagination of ``repository.contacts.get_contacts``.
+
+Seeds one user with ``--contacts`` rows and times the first page and page ``--page`` in both modes.
+Offset pages get slower the deeper they are, keyset pages cost the same everywhere.
+
+    python -m benchmarks.bench_pagination --contacts 1000000 --page 10000 --limit 100
+"""
+import asyncio
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.common import base_parser, create_database, seed_user, print_table
+from src.database.models import Contact, User
+from src.repository.contacts import get_contacts
+
+
+async def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+async def main(args):
+    engine = await create_database(args.url)
+    print(f"seeding {args.contacts} contacts...")
+    user = User(id=await seed_user(engine, contacts=args.contacts))
+    offset = (args.page - 1) * args.limit
+    rows = []
+    async with AsyncSession(engine) as db:
+        # the keyset cursor of page N is the id of the last contact on page N - 1
+        last_id = (await db.execute(select(Contact.id).filter(Contact.user_id == user.id)
+                                    .order_by(Contact.id).offset(offset - 1).limit(1))).scalar_one()
+        for page, page_offset, after_id in ((1, 0, 0), (args.page, offset, last_id)):
+            offset_ms = await timed(lambda: get_contacts(user, args.limit, page_offset, db), args.repeat)
+            keyset_ms = await timed(lambda: get_contacts(user, args.limit, 0, db, after_id=after_id), args.repeat)
+            rows.append([page, offset_ms, keyset_ms])
+    await engine.dispose()
+    print_table(["page", "offset ms", "keyset ms"], rows)
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--contacts", type=int, default=1_000_000)
+    parser.add_argument("--page", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
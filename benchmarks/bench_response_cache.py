@@ -0,0 +1,61 @@
+"""
+Response cache hits versus building the response from the database.
+
+Requests the contact list, the birthday list and a search for one seeded user, first with the response
+cache disabled and then with it enabled (in memory, or a real server with ``--redis-url``), and reports
+latency per request together with the hit ratio and the compression ratio of the stored bodies.
+
+    python -m benchmarks.bench_response_cache --contacts 10000 --limit 500
+    python -m benchmarks.bench_response_cache --redis-url redis://localhost:6379/0
+"""
+import asyncio
+import time
+
+import redis.asyncio as redis
+
+from benchmarks.common import (base_parser, create_database, seed_user, app_client, auth_headers, percentile,
+                               print_table, FakeRedis)
+from src.services.response_cache import response_cache
+
+
+async def poll(client, url: str, headers: dict, requests: int) -> list:
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.text
+    return [percentile(latencies, 50), percentile(latencies, 99)]
+
+
+async def main(args):
+    engine = await create_database(args.url)
+    await seed_user(engine, contacts=args.contacts)
+    headers = await auth_headers()
+    backend = redis.from_url(args.redis_url) if args.redis_url else FakeRedis()
+    urls = (f"/api/contacts/?limit={args.limit}", "/api/search/shift/30", f"/api/search/find/{args.query}")
+    rows = []
+    async with app_client(engine) as client:
+        for url in urls:
+            response_cache.r = None
+            uncached = await poll(client, url, headers, args.requests)
+            response_cache.r = backend
+            cached = await poll(client, url, headers, args.requests)
+            rows.append([url.split("?")[0], *uncached, *cached, uncached[0] / cached[0]])
+    response_cache.r = None
+    if args.redis_url:
+        await backend.close()
+    await engine.dispose()
+    print_table(["endpoint", "db p50 ms", "db p99 ms", "cached p50 ms", "cached p99 ms", "speedup"], rows)
+    stats = response_cache.stats()
+    print(f"\nhit ratio {stats['hit_ratio']:.3f}, compression ratio {stats['compression_ratio']:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--contacts", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--query", default="42")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--redis-url", help="use this Redis server instead of an in-memory stand-in")
+    asyncio.run(main(parser.parse_args()))
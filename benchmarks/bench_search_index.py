@@ -0,0 +1,59 @@
+"""
+Search latency of ``repository.search.get_users_by_partial_info`` against the number of contacts.
+
+For each size in ``--sizes`` one user is seeded and the same query is timed with the database backend,
+with the in-process trigram index on its first (cold, builds the index) call and on later (warm) calls.
+The "index only" column is the id lookup alone, without loading the matching rows.
+
+    python -m benchmarks.bench_search_index --sizes 1000 10000 100000 --query 4242
+"""
+import asyncio
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.common import base_parser, create_database, seed_user, print_table
+from src.conf.config import settings
+from src.database.models import User
+from src.repository.search import get_users_by_partial_info
+from src.services.search_index import search_index
+
+
+async def timed(fn, repeat: int) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = await fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+async def main(args):
+    engine = await create_database(args.url)
+    rows = []
+    seeded = 0
+    for size in sorted(args.sizes):
+        print(f"seeding {size} contacts...")
+        user = User(id=await seed_user(engine, email=f"search{size}@example.com", contacts=size))
+        seeded += size
+        async with AsyncSession(engine) as db:
+            settings.search_backend = "database"
+            db_ms, expected = await timed(lambda: get_users_by_partial_info(user, args.query, db), args.repeat)
+            settings.search_backend = "memory"
+            search_index.invalidate(user.id)
+            cold_ms, _ = await timed(lambda: get_users_by_partial_info(user, args.query, db), 1)
+            warm_ms, found = await timed(lambda: get_users_by_partial_info(user, args.query, db), args.repeat)
+            index_ms, _ = await timed(lambda: search_index.search(user, args.query, db), args.repeat)
+        assert [c.id for c in found] == [c.id for c in expected], "index and database disagree"
+        rows.append([size, len(found), db_ms, cold_ms, warm_ms, index_ms])
+    await engine.dispose()
+    print_table(["contacts", "matches", "database ms", "memory cold ms", "memory warm ms", "index only ms"], rows)
+    print(search_index.stats())
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--query", default="4242")
+    parser.add_argument("--repeat", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
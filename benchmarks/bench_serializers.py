@@ -0,0 +1,63 @@
+"""
+Serialization time of one page of contacts.
+
+Loads ``--limit`` contacts with ``get_contacts`` once, then times turning the page into the JSON body
+(1) the way FastAPI does for a response_model: ``ContactResponse.from_orm`` validation (including EmailStr),
+``jsonable_encoder`` and stdlib ``json``, and (2) with the precompiled serializer and orjson.
+Reports the best and median time per page over ``--repeat`` runs.
+
+    python -m benchmarks.bench_serializers --limit 500 --repeat 200
+"""
+import asyncio
+import json
+import statistics
+import time
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.common import base_parser, create_database, seed_user, print_table
+from src.database.models import User
+from src.repository.contacts import get_contacts
+from src.schemas import ContactResponse
+from src.services.serializers import dump_many
+
+
+def pydantic_json(contacts) -> bytes:
+    content = jsonable_encoder([ContactResponse.from_orm(contact) for contact in contacts])
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def compiled_orjson(contacts) -> bytes:
+    return dump_many(ContactResponse, contacts)
+
+
+def timed(fn, contacts, repeat: int) -> list:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(contacts)
+        runs.append((time.perf_counter() - start) * 1000)
+    return [min(runs), statistics.median(runs), len(body)]
+
+
+async def main(args):
+    engine = await create_database(args.url)
+    user = User(id=await seed_user(engine, contacts=args.limit))
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        contacts = await get_contacts(user, args.limit, 0, db)
+    await engine.dispose()
+    assert json.loads(pydantic_json(contacts)) == json.loads(compiled_orjson(contacts))
+    rows = [[name, *timed(fn, contacts, args.repeat)]
+            for name, fn in (("from_orm + jsonable_encoder + json", pydantic_json),
+                             ("compiled serializer + orjson", compiled_orjson))]
+    for row in rows:
+        row.append(rows[0][2] / row[2])
+    print_table([f"{len(contacts)} contacts", "best ms", "median ms", "bytes", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,56 @@
+"""
+Per-request cost of the user cache in ``Auth.get_current_user``.
+
+Compares the old path (``pickle`` of a loaded SQLAlchemy ``User``) with the compact ``dump_user`` layout
+read from Redis and with a hit in the in-process tier. Reports the payload size and the time per lookup;
+the Redis round-trip itself is not included.
+
+    python -m benchmarks.bench_user_cache --number 100000
+"""
+import asyncio
+import pickle
+import timeit
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.common import base_parser, create_database, seed_user, print_table
+from src.database.models import User
+from src.services.auth import dump_user, load_user_fields, user_from_fields
+from src.services.lru_cache import LRUCache
+
+
+async def load_user(url: str | None) -> User:
+    engine = await create_database(url)
+    user_id = await seed_user(engine)
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        user = (await db.execute(select(User).filter(User.id == user_id))).scalar_one()
+    await engine.dispose()
+    return user
+
+
+def main(args):
+    user = asyncio.run(load_user(args.url))
+    pickled = pickle.dumps(user)
+    compact = dump_user(user)
+    local = LRUCache(10)
+    local.set(user.email, load_user_fields(compact))
+
+    cases = [
+        ("pickle loads (old)", len(pickled), lambda: pickle.loads(pickled)),
+        ("compact loads", len(compact), lambda: user_from_fields(load_user_fields(compact))),
+        ("in-process hit", 0, lambda: user_from_fields(local.get(user.email))),
+        ("pickle dumps (old, miss)", len(pickled), lambda: pickle.dumps(user)),
+        ("compact dumps (miss)", len(compact), lambda: dump_user(user)),
+    ]
+    rows = []
+    for name, size, fn in cases:
+        seconds = min(timeit.repeat(fn, number=args.number, repeat=3))
+        rows.append([name, size, seconds / args.number * 1e6])
+    print_table(["path", "bytes", "us per call"], rows)
+
+
+if __name__ == "__main__":
+    parser = base_parser(__doc__)
+    parser.add_argument("--number", type=int, default=100_000)
+    main(parser.parse_args())
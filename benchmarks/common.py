@@ -0,0 +1,231 @@
+"""
+Shared helpers for the benchmark scripts.
+
+The benchmarks run the real FastAPI application in-process through the httpx ASGI transport,
+against a throwaway SQLite database or any async SQLAlchemy URL passed with ``--url``.
+Redis and the rate limiter are replaced with in-memory stand-ins, so no external services are needed.
+"""
+import argparse
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+
+import httpx
+from fastapi_limiter import FastAPILimiter
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine
+
+from main import app
+from src.database.db import get_db
+from src.database.models import Base, Contact, User, Role, birth_md_of
+from src.services.auth import auth_service
+
+BENCH_PASSWORD = "password"
+
+
+def default_url() -> str:
+    """
+    The default_url function returns a URL of a fresh SQLite database in the temp directory.
+
+    :return: An async SQLAlchemy URL
+    """
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "bench.db")
+    return f"sqlite+aiosqlite:///{path}"
+
+
+def base_parser(description: str) -> argparse.ArgumentParser:
+    """
+    The base_parser function builds the command line parser shared by all benchmarks.
+
+    :param description: str: Description shown in --help
+    :return: An argument parser with the --url option
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--url", default=None, help="async SQLAlchemy URL (defaults to a temporary SQLite file)")
+    return parser
+
+
+async def create_database(url: str | None = None, **engine_kwargs) -> AsyncEngine:
+    """
+    The create_database function creates an engine and a clean schema for a benchmark run.
+
+    :param url: str | None: Database URL, a temporary SQLite file if omitted
+    :param engine_kwargs: Extra arguments passed to create_async_engine
+    :return: The async engine
+    """
+    engine = create_async_engine(url or default_url(), **engine_kwargs)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    return engine
+
+
+def contact_rows(user_id: int, count: int, start: int = 0) -> list[dict]:
+    """
+    The contact_rows function generates deterministic contact rows with unique emails and phones.
+
+    :param user_id: int: Owner of the contacts
+    :param count: int: Number of rows to generate
+    :param start: int: Index of the first row, used to generate rows in chunks
+    :return: A list of dictionaries ready for a Core insert
+    """
+    # Core inserts skip the ORM listener that keeps birth_md in sync, so it is filled in here
+    birthdays = [date(2000, 1, 1) + timedelta(days=day) for day in range(366)]
+    return [
+        {
+            "firstname": f"first{i}",
+            "lastname": f"last{i}",
+            "email": f"contact{user_id}_{i}@example.com",
+            "phone": f"+{user_id:03d}{i:09d}",
+            "birthday": birthdays[i % 366],
+            "birth_md": birth_md_of(birthdays[i % 366]),
+            "additional_info": "benchmark",
+            "is_favorite": False,
+            "user_id": user_id,
+        }
+        for i in range(start, start + count)
+    ]
+
+
+async def seed_user(engine: AsyncEngine, email: str = "bench@example.com", contacts: int = 0,
+                    chunk: int = 10_000) -> int:
+    """
+    The seed_user function inserts a confirmed admin user and the requested number of contacts.
+
+    :param engine: AsyncEngine: Engine of the benchmark database
+    :param email: str: Email of the user
+    :param contacts: int: Number of contacts to create for the user
+    :param chunk: int: Number of rows per insert statement
+    :return: The id of the new user
+    """
+    async with engine.begin() as conn:
+        result = await conn.execute(insert(User).returning(User.id), [{
+            "username": "bench", "email": email, "password": auth_service.pwd_context.hash(BENCH_PASSWORD),
+            "roles": Role.admin, "confirmed": True,
+        }])
+        user_id = result.scalar_one()
+        for start in range(0, contacts, chunk):
+            await conn.execute(insert(Contact), contact_rows(user_id, min(chunk, contacts - start), start))
+    return user_id
+
+
+class FakeRedis:
+    """In-memory stand-in for the async Redis client used by the auth service and the response cache."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+
+class FakeLimiterRedis:
+    """Stand-in for the limiter backend that never rejects a request."""
+
+    async def evalsha(self, *args, **kwargs):
+        return 0
+
+
+async def bench_identifier(request) -> str:
+    return request.scope["path"]
+
+
+@asynccontextmanager
+async def app_client(engine: AsyncEngine):
+    """
+    The app_client function runs the application against the benchmark database.
+
+    :param engine: AsyncEngine: Engine of the benchmark database
+    :return: An httpx client bound to the application
+    """
+    session_maker = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_db():
+        db = session_maker()
+        try:
+            yield db
+        finally:
+            await db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    original_redis = auth_service.r
+    original_limiter = {name: getattr(FastAPILimiter, name) for name in ("redis", "lua_sha", "identifier")}
+    auth_service.r = FakeRedis()
+    FastAPILimiter.redis = FakeLimiterRedis()
+    FastAPILimiter.lua_sha = "bench"
+    FastAPILimiter.identifier = bench_identifier
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            yield client
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        auth_service.r = original_redis
+        for name, value in original_limiter.items():
+            setattr(FastAPILimiter, name, value)
+
+
+async def auth_headers(email: str = "bench@example.com") -> dict:
+    """
+    The auth_headers function returns bearer headers for the given user.
+
+    :param email: str: Email of the user
+    :return: A dictionary with the Authorization header
+    """
+    token = await auth_service.create_access_token(data={"sub": email}, expires_delta=3600)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """
+    The percentile function returns the nearest-rank percentile of the values.
+
+    :param values: list[float]: Samples
+    :param pct: float: Percentile between 0 and 100
+    :return: The percentile value
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def print_table(headers: list[str], rows: list[list]) -> None:
+    """
+    The print_table function prints the benchmark results as an aligned text table.
+
+    :param headers: list[str]: Column titles
+    :param rows: list[list]: Table rows
+    :return: None
+    """
+    cells = [headers] + [[f"{value:.3f}" if isinstance(value, float) else str(value) for value in row]
+                         for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    for n, row in enumerate(cells):
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+        if n == 0:
+            print("  ".join("-" * width for width in widths))
+
+
+class Timer:
+    """Context manager that measures elapsed wall time with the monotonic clock."""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
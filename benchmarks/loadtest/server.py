@@ -0,0 +1,61 @@
+"""
+The application as the load test runs it: the real app under uvicorn, with local stand-ins.
+
+Redis (user cache, response cache and rate limiter) is replaced with in-memory stand-ins that never reject a request,
+unless ``LOADTEST_REDIS_URL`` points to a real server. Confirmation emails only land in the outbox table,
+as in production; the outbox worker is not started, so nothing is sent.
+The database is taken from ``SQLALCHEMY_DATABASE_URL`` like in production.
+
+    SQLALCHEMY_DATABASE_URL=sqlite+aiosqlite:///load.db python -m benchmarks.loadtest.server --port 8001
+"""
+import argparse
+import os
+from contextlib import asynccontextmanager
+
+import redis.asyncio as redis
+import uvicorn
+from fastapi import FastAPI
+from fastapi_limiter import FastAPILimiter
+
+from benchmarks.common import FakeRedis, FakeLimiterRedis, bench_identifier
+from main import app
+from src.conf.config import settings
+from src.database.db import engine
+from src.database.db_pool import prewarm
+from src.database.replicas import replica_router
+from src.services import metrics
+from src.services.auth import auth_service, start_password_executor, shutdown_password_executor
+from src.services.response_cache import response_cache
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    redis_url = os.environ.get("LOADTEST_REDIS_URL")
+    r = redis.from_url(redis_url) if redis_url else None
+    auth_service.r = response_cache.r = replica_router.r = r or FakeRedis()
+    FastAPILimiter.redis = FakeLimiterRedis()
+    FastAPILimiter.lua_sha = "loadtest"
+    FastAPILimiter.identifier = bench_identifier
+    start_password_executor()
+    await prewarm(engine, settings.db_pool_prewarm)
+    # replicas from DB_REPLICA_URLS are checked once, a load test is too short for them to fall behind
+    await replica_router.check()
+    yield
+    shutdown_password_executor()
+    if r is not None:
+        await r.close()
+
+
+app.router.lifespan_context = lifespan
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    if settings.metrics_dir:
+        metrics.clear(settings.metrics_dir)
+    uvicorn.run("benchmarks.loadtest.server:app", host=args.host, port=args.port, workers=args.workers,
+                log_level="warning", access_log=False)
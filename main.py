@@ -1,21 +1,93 @@
+import asyncio
+import logging
 import pathlib
-import time
+from contextlib import asynccontextmanager
 
-import redis.asyncio as redis
 import uvicorn
 from fastapi import FastAPI, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi_limiter import FastAPILimiter
 from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.middleware.cors import CORSMiddleware
 
-from src.database.db import get_db
+from src.conf.config import settings
+from src.database.db import get_db, engine
+from src.database.db_pool import pool_stats, prewarm
+from src.database.replicas import replica_router
+from src.database.redis_pool import init_redis, close_redis
 from src.routes import contacts, search, auth, users
+from src.services import metrics
+from src.services.auth import auth_service, start_password_executor, shutdown_password_executor
+from src.services.middleware import TimingMiddleware, ErrorsMiddleware
+from src.services.response_cache import response_cache
+from src.services.search_index import search_index
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    The lifespan function creates the shared Redis connection pool when the application starts
+    and closes it on shutdown.
+    The rate limiter, the auth user cache and the response cache all use this one client.
+    It also opens settings.db_pool_prewarm database connections, so the first requests do not wait for them,
+    and with settings.metrics_dir set, keeps writing the metrics of this worker for the other workers.
+    Read replicas are checked before the first request and then every settings.db_replica_check_interval seconds.
+    Passwords are hashed on a process pool of this worker, stopped on shutdown.
+
+    :param app: FastAPI: The application
+    :return: An async context manager
+    """
+    r = await init_redis()
+    await FastAPILimiter.init(r)
+    auth_service.r = r
+    response_cache.r = r
+    replica_router.r = r
+    start_password_executor()
+    try:
+        await prewarm(engine, settings.db_pool_prewarm)
+    except (OSError, SQLAlchemyError) as err:
+        # the pool opens connections on demand once the database is reachable
+        logger.warning("Database pool prewarm failed: %s", err)
+    flush = check = None
+    if settings.metrics_dir:
+        flush = asyncio.create_task(metrics.flush_periodically(settings.metrics_dir, settings.metrics_flush_interval))
+    if replica_router.replicas:
+        await replica_router.check()
+        check = asyncio.create_task(replica_router.check_periodically(settings.db_replica_check_interval))
+    yield
+    if flush is not None:
+        flush.cancel()
+        metrics.write_snapshot(settings.metrics_dir)
+    if check is not None:
+        check.cancel()
+        await replica_router.dispose()
+    auth_service.r = None
+    response_cache.r = None
+    replica_router.r = None
+    await close_redis()
+    shutdown_password_executor()
+
+
+app = FastAPI(lifespan=lifespan)
+
+metrics.register("db_pool", lambda: pool_stats.snapshot(engine.pool))
+metrics.register("response_cache", response_cache.stats)
+metrics.register("user_cache", auth_service.user_cache.stats)
+metrics.register("token_cache", auth_service.token_cache.stats)
+metrics.register("search_index", search_index.stats)
+metrics.register("replicas", replica_router.stats)
+metrics.register_cache("response", response_cache.stats)
+metrics.register_cache("user", auth_service.user_cache.stats)
+metrics.register_cache("token", auth_service.token_cache.stats)
+metrics.register_cache("search_index", search_index.stats)
+metrics.add_collector(lambda: pool_stats.export(engine.pool))
+metrics.add_collector(replica_router.export)
 
 origins = [
     "http://localhost:3000"
@@ -27,33 +99,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Link", "ETag", "Server-Timing"],
 )
-
-
-@app.middleware('http')
-async def custom_middleware(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    during = time.time() - start_time
-    response.headers['performance'] = str(during)
-    return response
-
-
-@app.middleware("http")
-async def errors_handling(request: Request, call_next):
-    """
-    The errors_handling function is a middleware that catches any exception raised by the application.
-    It returns an error response with status code 500 and a JSON body containing the reason for the error.
-
-    :param request: Request: Access the request object
-    :param call_next: Pass the request to the next handler in the pipeline
-    :return: A jsonresponse object with a 500 status code and the reason for the error
-    :doc-author: Trelent
-    """
-    try:
-        return await call_next(request)
-    except Exception as exc:
-        return JSONResponse(status_code=500, content={'reason': str(exc)})
+# the last one added runs first: errors are caught outside the timing, which records them as 500
+app.add_middleware(TimingMiddleware)
+app.add_middleware(ErrorsMiddleware)
 
 
 templates = Jinja2Templates(directory='templates')
@@ -77,19 +127,19 @@ async def root(request: Request):
 
 
 @app.get("/api/healthchecker")
-def healthchecker(db: Session = Depends(get_db)):
+async def healthchecker(db: AsyncSession = Depends(get_db)):
     """
     The healthchecker function is a simple function that checks the health of the database.
     It does this by making a request to the database and checking if it returns any results.
     If there are no results, then we know something is wrong with our connection.
 
-    :param db: Session: Pass in the database session
+    :param db: AsyncSession: Pass in the database session
     :return: A dictionary with a message
     :doc-author: Trelent
     """
     try:
         # Make request
-        result = db.execute(text("SELECT 1")).fetchone()
+        result = (await db.execute(text("SELECT 1"))).fetchone()
         if result is None:
             raise HTTPException(status_code=500, detail="Database is not configured correctly")
         return {"message": "Welcome to FastAPI!"}
@@ -98,26 +148,35 @@ def healthchecker(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Error connecting to the database")
 
 
-app.include_router(auth.router)
-app.include_router(contacts.router)
-app.include_router(search.search)
-app.include_router(users.router)
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_prometheus_metrics():
+    """
+    The get_prometheus_metrics function returns the metrics in the Prometheus text format: request latency
+    histograms by route and status, requests in flight, database and Redis calls, the connection pool
+    and the cache hit ratios. With settings.metrics_dir set, the values of all workers are added up.
+
+    :return: The metrics as text
+    """
+    return PlainTextResponse(metrics.exposition(settings.metrics_dir),
+                             media_type="text/plain; version=0.0.4")
 
 
-@app.on_event("startup")
-async def startup():
+@app.get("/api/metrics")
+async def get_metrics():
     """
-    The startup function is called when the application starts up.
-    It's a good place to initialize things that are needed by your app,
-    such as connecting to databases or initializing caches.
+    The get_metrics function returns the counters of the connection pool and the caches of this process,
+    e.g. checkout wait times and timeouts of the database pool for sizing it against real load.
 
-    :return: A coroutine, so it must be awaited
-    :doc-author: Trelent
+    :return: A dictionary of metrics by component
     """
-    from src.conf.config import settings
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
-                          decode_responses=True)
-    await FastAPILimiter.init(r)
+    return metrics.collect()
+
+
+app.include_router(auth.router)
+app.include_router(contacts.router)
+app.include_router(search.search)
+app.include_router(users.router)
+
 
 #
 # if __name__ == '__main__':
@@ -0,0 +1,55 @@
+"""add contacts search indexes
+
+Revision ID: 276685941096
+Revises: 1244f65bea3f
+Create Date: 2026-10-17 11:03:27.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '276685941096'
+down_revision: Union[str, None] = '1244f65bea3f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_COLUMNS = ('firstname', 'lastname', 'email', 'phone')
+
+
+def upgrade() -> None:
+    dialect = op.get_context().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name in SEARCH_COLUMNS:
+            op.create_index(f'ix_contacts_{name}_trgm', 'contacts', [name], unique=False,
+                            postgresql_using='gin', postgresql_ops={name: 'gin_trgm_ops'})
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE contacts_fts USING fts5(firstname, lastname, email, phone, "
+                   "content='contacts', content_rowid='id', tokenize='trigram case_sensitive 1')")
+        op.execute("CREATE TRIGGER contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+                   "INSERT INTO contacts_fts(rowid, firstname, lastname, email, phone) "
+                   "VALUES (new.id, new.firstname, new.lastname, new.email, new.phone); END")
+        op.execute("CREATE TRIGGER contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+                   "INSERT INTO contacts_fts(contacts_fts, rowid, firstname, lastname, email, phone) "
+                   "VALUES ('delete', old.id, old.firstname, old.lastname, old.email, old.phone); END")
+        op.execute("CREATE TRIGGER contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+                   "INSERT INTO contacts_fts(contacts_fts, rowid, firstname, lastname, email, phone) "
+                   "VALUES ('delete', old.id, old.firstname, old.lastname, old.email, old.phone); "
+                   "INSERT INTO contacts_fts(rowid, firstname, lastname, email, phone) "
+                   "VALUES (new.id, new.firstname, new.lastname, new.email, new.phone); END")
+        op.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_context().dialect.name
+    if dialect == 'postgresql':
+        for name in SEARCH_COLUMNS:
+            op.drop_index(f'ix_contacts_{name}_trgm', table_name='contacts')
+    elif dialect == 'sqlite':
+        for trigger in ('contacts_fts_ai', 'contacts_fts_ad', 'contacts_fts_au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS contacts_fts')
@@ -0,0 +1,33 @@
+"""add contacts birth_md
+
+Revision ID: 3d9a9a96da01
+Revises: 276685941096
+Create Date: 2026-10-17 11:48:09.117350
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d9a9a96da01'
+down_revision: Union[str, None] = '276685941096'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birth_md', sa.Integer(), nullable=True))
+    if op.get_context().dialect.name == 'sqlite':
+        op.execute("UPDATE contacts SET birth_md = CAST(strftime('%m', birthday) AS INTEGER) * 100 "
+                   "+ CAST(strftime('%d', birthday) AS INTEGER)")
+    else:
+        op.execute("UPDATE contacts SET birth_md = EXTRACT(MONTH FROM birthday) * 100 + EXTRACT(DAY FROM birthday)")
+    op.create_index('ix_contacts_user_id_birth_md', 'contacts', ['user_id', 'birth_md'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_birth_md', table_name='contacts')
+    op.drop_column('contacts', 'birth_md')
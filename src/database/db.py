@@ -1,31 +1,36 @@
 from fastapi import HTTPException, status
-from sqlalchemy import create_engine
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
 from src.conf.config import settings
+from src.database.db_pool import InstrumentedPool, instrument
 
 SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
 URI = SQLALCHEMY_DATABASE_URL
-engine = create_engine(URI, echo=True)
+engine = create_async_engine(URI, echo=settings.db_echo, poolclass=InstrumentedPool,
+                             pool_size=settings.db_pool_size, max_overflow=settings.db_max_overflow,
+                             pool_timeout=settings.db_pool_timeout, pool_recycle=settings.db_pool_recycle,
+                             pool_pre_ping=settings.db_pool_pre_ping)
+instrument(engine)
 
-DBSession = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+DBSession = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, autocommit=False,
+                               expire_on_commit=False)
 
 
 # Dependency
-def get_db():
+async def get_db():
     """
     The get_db function is a context manager that will automatically close the database session at the end of a request.
     It also handles any exceptions that occur during the request, rolling back any changes to the database if an exception occurs.
 
-    :return: A database connection from the pool
+    :return: An asynchronous database session from the pool
     :doc-author: Trelent
     """
     db = DBSession()
     try:
         yield db
     except SQLAlchemyError as err:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
     finally:
-        db.close()
+        await db.close()
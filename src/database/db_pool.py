@@ -0,0 +1,219 @@
+import asyncio
+import bisect
+import time
+
+from sqlalchemy import event, exc, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+from src.services.metrics import Counter, Gauge, Histogram, LATENCY_BUCKETS, bucket_label
+from src.services.timing import add_db_time
+
+# upper bounds in seconds of the checkout wait histogram, the last bucket is unbounded
+WAIT_BUCKETS = LATENCY_BUCKETS
+QUERY_OPERATIONS = {'select', 'insert', 'update', 'delete'}
+
+db_queries = Counter('db_queries_total', 'SQL statements sent to the database', ('operation',))
+db_errors = Counter('db_errors_total', 'SQL statements that raised an error')
+db_pool_connections = Gauge('db_pool_connections', 'Connections of the database pool', ('pool', 'state'))
+db_pool_events = Counter('db_pool_events_total', 'Events of the database pool', ('pool', 'event'))
+db_pool_checkout_wait = Histogram('db_pool_checkout_wait_seconds', 'Time a checkout waited for a connection',
+                                  ('pool',), buckets=WAIT_BUCKETS)
+
+
+class PoolStats:
+    def __init__(self):
+        """
+        The __init__ function creates empty counters for a connection pool.
+
+        :param self: Represent the instance of the class
+        :return: The instance of the class
+        """
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        The reset function sets every counter back to zero.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.max_checked_out = 0
+        self.max_overflow = 0
+        self.wait_count = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+
+    def observe_wait(self, seconds: float) -> None:
+        """
+        The observe_wait function records how long one checkout waited for a connection.
+
+        :param self: Represent the instance of the class
+        :param seconds: float: Time spent in the pool, including opening a new connection
+        :return: None
+        """
+        self.wait_count += 1
+        self.wait_sum += seconds
+        self.wait_max = max(self.wait_max, seconds)
+        self.wait_buckets[bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+
+    def snapshot(self, pool: Pool) -> dict:
+        """
+        The snapshot function returns the counters together with the current state of the pool.
+
+        :param self: Represent the instance of the class
+        :param pool: Pool: The pool the counters belong to
+        :return: A dictionary of metrics; wait_buckets counts the checkouts per upper bound (not cumulative)
+        """
+        state = {}
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            state = {"size": pool.size(), "checked_out": pool.checkedout(), "checked_in": pool.checkedin(),
+                     "overflow": max(pool.overflow(), 0)}
+        return {**state, "connects": self.connects, "checkouts": self.checkouts, "checkins": self.checkins,
+                "invalidations": self.invalidations, "timeouts": self.timeouts,
+                "max_checked_out": self.max_checked_out, "max_overflow": self.max_overflow,
+                "wait_count": self.wait_count, "wait_sum": self.wait_sum, "wait_max": self.wait_max,
+                "wait_buckets": dict(zip(map(bucket_label, WAIT_BUCKETS), self.wait_buckets))}
+
+    def export(self, pool: Pool, name: str = 'primary') -> None:
+        """
+        The export function copies the counters and the state of the pool into the Prometheus metrics.
+
+        :param self: Represent the instance of the class
+        :param pool: Pool: The pool the counters belong to
+        :param name: str: Value of the pool label, 'primary' or the name of a replica
+        :return: None
+        """
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            db_pool_connections.set(pool.checkedout(), name, 'checked_out')
+            db_pool_connections.set(pool.checkedin(), name, 'checked_in')
+            db_pool_connections.set(max(pool.overflow(), 0), name, 'overflow')
+        for event in ('connects', 'checkouts', 'checkins', 'invalidations', 'timeouts'):
+            db_pool_events.set(getattr(self, event), name, event)
+        db_pool_checkout_wait.series[(name,)] = [*self.wait_buckets, self.wait_sum]
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records the time each checkout waits and the checkouts that time out in its stats,
+    which instrument sets to the PoolStats of the engine. Pool events only fire once a connection has been
+    handed out, so the wait has to be measured here.
+    """
+    stats: PoolStats | None = None
+
+    def recreate(self):
+        # engine.dispose replaces the pool, the new one keeps counting into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        if self.stats is None:
+            return super()._do_get()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.observe_wait(time.perf_counter() - start)
+
+
+def instrument(engine: AsyncEngine, stats: PoolStats = pool_stats) -> None:
+    """
+    The instrument function counts connects, checkouts, checkins and invalidations of the engine's pool
+    through pool events, and tracks the highest number of checked out and overflow connections.
+    It also counts the statements sent to the database by operation, and the ones that failed,
+    and adds the time of every statement to the Server-Timing accounting of the current request.
+    Every engine needs its own stats; with an InstrumentedPool they also receive the checkout waits and timeouts.
+
+    :param engine: AsyncEngine: The engine to instrument
+    :param stats: PoolStats: Receives the counts
+    :return: None
+    """
+    target = engine.sync_engine
+    if isinstance(target.pool, InstrumentedPool):
+        target.pool.stats = stats
+
+    @event.listens_for(target, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        stats.connects += 1
+
+    @event.listens_for(target, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.checkouts += 1
+        pool = target.pool
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            stats.max_checked_out = max(stats.max_checked_out, pool.checkedout())
+            stats.max_overflow = max(stats.max_overflow, pool.overflow())
+
+    @event.listens_for(target, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        stats.checkins += 1
+
+    @event.listens_for(target, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        stats.invalidations += 1
+
+    @event.listens_for(target, 'before_cursor_execute')
+    def on_execute(connection, cursor, statement, parameters, context, executemany):
+        operation = statement.split(None, 1)[0].lower() if statement else ''
+        db_queries.inc(operation if operation in QUERY_OPERATIONS else 'other')
+        if context is not None:
+            context._query_start = time.perf_counter()
+
+    @event.listens_for(target, 'after_cursor_execute')
+    def on_executed(connection, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_query_start', None)
+        if start is not None:
+            add_db_time(time.perf_counter() - start)
+
+    @event.listens_for(target, 'handle_error')
+    def on_error(exception_context):
+        db_errors.inc()
+
+
+async def prewarm(engine: AsyncEngine, connections: int) -> int:
+    """
+    The prewarm function opens connections before the first request needs them, so the first requests
+    after a start or deploy do not pay for connection setup. The connections are held at the same time,
+    which forces the pool to open distinct ones, and then returned to the pool.
+
+    :param engine: AsyncEngine: The engine whose pool is filled
+    :param connections: int: Number of connections to open, capped at the pool size
+    :return: The number of connections opened
+    """
+    pool = engine.pool
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        connections = min(connections, pool.size())
+    if connections <= 0:
+        return 0
+    ready = asyncio.Event()
+    opened = 0
+
+    async def hold():
+        nonlocal opened
+        try:
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+                opened += 1
+                if opened == connections:
+                    ready.set()
+                await ready.wait()
+        except BaseException:
+            # release the others instead of leaving them waiting for a connection that never comes
+            ready.set()
+            raise
+
+    await asyncio.gather(*(hold() for _ in range(connections)))
+    return opened
@@ -1,6 +1,8 @@
 import enum
+from datetime import date
 
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, Date, func, event, Enum, ForeignKey
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Date, func, event, Enum, ForeignKey, Index, DDL
+from sqlalchemy import table, column
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -20,6 +22,7 @@ class Contact(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     phone = Column(String(15), unique=True, index=True, nullable=False)
     birthday = Column(Date, default=func.now())
+    birth_md = Column(Integer, nullable=True)  # month * 100 + day of birthday, kept in sync by set_birth_md
     additional_info = Column(String(150), nullable=True)
     is_favorite = Column(Boolean, default=False)
     created_at = Column(DateTime, default=func.now())
@@ -27,6 +30,44 @@ class Contact(Base):
     user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=1)
     user = relationship('User', backref='contacts')
 
+    __table_args__ = (
+        Index('ix_contacts_user_id_id', 'user_id', 'id'),
+        Index('ix_contacts_user_id_birth_md', 'user_id', 'birth_md'),
+        *(Index(f'ix_contacts_{name}_trgm', name, postgresql_using='gin',
+                postgresql_ops={name: 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+          for name in ('firstname', 'lastname', 'email', 'phone')),
+    )
+
+
+# Substring search support: pg_trgm GIN indexes on Postgres, an external content FTS5 table with the trigram
+# tokenizer on SQLite. The FTS5 table is kept in sync with contacts by triggers.
+SEARCH_COLUMNS = ('firstname', 'lastname', 'email', 'phone')
+
+contacts_fts = table('contacts_fts', column('rowid'), *(column(name) for name in SEARCH_COLUMNS))
+
+event.listen(Contact.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+for statement in (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(firstname, lastname, email, phone, "
+    "content='contacts', content_rowid='id', tokenize='trigram case_sensitive 1')",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts(rowid, firstname, lastname, email, phone) "
+    "VALUES (new.id, new.firstname, new.lastname, new.email, new.phone); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, firstname, lastname, email, phone) "
+    "VALUES ('delete', old.id, old.firstname, old.lastname, old.email, old.phone); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, firstname, lastname, email, phone) "
+    "VALUES ('delete', old.id, old.firstname, old.lastname, old.email, old.phone); "
+    "INSERT INTO contacts_fts(rowid, firstname, lastname, email, phone) "
+    "VALUES (new.id, new.firstname, new.lastname, new.email, new.phone); END",
+):
+    event.listen(Contact.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+event.listen(Contact.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS contacts_fts').execute_if(dialect='sqlite'))
+
 
 @event.listens_for(Contact, 'before_insert')
 def updated_favorite(mapper, conn, target):
@@ -62,6 +103,34 @@ def updated_favorite(mapper, conn, target):
         target.is_favorite = True
 
 
+def birth_md_of(birthday: date | None) -> int:
+    """
+    The birth_md_of function packs the month and day of a birthday into one sortable integer (month * 100 + day).
+    A missing birthday falls back to today, like the column default does.
+
+    :param birthday: date | None: Birthday of the contact
+    :return: An integer from 101 to 1231
+    """
+    if not isinstance(birthday, date):
+        birthday = date.today()
+    return birthday.month * 100 + birthday.day
+
+
+@event.listens_for(Contact, 'before_insert')
+@event.listens_for(Contact, 'before_update')
+def set_birth_md(mapper, conn, target):
+    """
+    The set_birth_md function is a listener that keeps the birth_md column in sync with birthday
+    whenever a contact is inserted or updated through the ORM.
+
+    :param mapper: Access the mapper object that is associated with the target
+    :param conn: Access the database connection
+    :param target: Access the contact that is being saved
+    :return: None
+    """
+    target.birth_md = birth_md_of(target.birthday)
+
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
@@ -75,3 +144,21 @@ class User(Base):
     confirmed = Column(Boolean, default=False)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+
+class EmailOutbox(Base):
+    """
+    Emails waiting to be sent by the outbox worker. A row is deleted once its email is sent;
+    next_attempt_at is NULL for an email that failed for good, which stays with its last_error.
+    """
+    __tablename__ = "email_outbox"
+    id = Column(Integer, primary_key=True)
+    email = Column(String(150), nullable=False)
+    username = Column(String(50))
+    host = Column(String(255), nullable=False)
+    subject = Column(String(150), nullable=False)
+    template_name = Column(String(100), nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, nullable=True, index=True)  # UTC, set by the application
+    last_error = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=func.now())
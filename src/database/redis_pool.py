@@ -0,0 +1,69 @@
+import time
+
+import redis.asyncio as redis
+
+from src.conf.config import settings
+from src.services.metrics import Counter
+from src.services.timing import add_redis_time
+
+redis_commands = Counter('redis_commands_total', 'Commands sent to Redis', ('command',))
+redis_errors = Counter('redis_errors_total', 'Redis commands that raised an error', ('command',))
+
+redis_client: redis.Redis | None = None
+
+
+class CountingRedis(redis.Redis):
+    """
+    Async Redis client that counts every command it sends, including the rate limiter's EVALSHA,
+    and adds its time to the Server-Timing accounting of the current request.
+    """
+
+    async def execute_command(self, *args, **options):
+        command = str(args[0]).lower()
+        redis_commands.inc(command)
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        except redis.RedisError:
+            redis_errors.inc(command)
+            raise
+        finally:
+            add_redis_time(time.perf_counter() - start)
+
+
+async def init_redis() -> redis.Redis:
+    """
+    The init_redis function creates the application's single async Redis client.
+    Every user of Redis (rate limiter, auth cache, response cache) shares its connection pool,
+    which is capped at settings.redis_max_connections.
+    Values are returned as bytes, because the response cache stores compressed bodies.
+
+    :return: The shared async Redis client
+    """
+    global redis_client
+    if redis_client is None:
+        pool = redis.ConnectionPool(host=settings.redis_host, port=settings.redis_port, db=0,
+                                    max_connections=settings.redis_max_connections)
+        redis_client = CountingRedis(connection_pool=pool)
+    return redis_client
+
+
+def get_redis() -> redis.Redis | None:
+    """
+    The get_redis function returns the shared Redis client.
+
+    :return: The client, or None when init_redis has not been called (e.g. in tests and scripts)
+    """
+    return redis_client
+
+
+async def close_redis() -> None:
+    """
+    The close_redis function closes the shared client and disconnects its pool.
+
+    :return: None
+    """
+    global redis_client
+    if redis_client is not None:
+        await redis_client.close(close_connection_pool=True)
+        redis_client = None
@@ -0,0 +1,261 @@
+import asyncio
+import itertools
+
+import redis.asyncio as redis
+from fastapi import Depends, HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError, DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
+
+from src.conf.config import settings
+from src.database.db import get_db
+from src.database.db_pool import InstrumentedPool, PoolStats, instrument
+from src.database.models import User
+from src.services.auth import auth_service
+from src.services.metrics import Counter, Gauge
+from src.services.response_cache import response_cache
+
+# seconds the replica is behind the primary; a primary, or a replica that replayed everything it received, is 0
+POSTGRES_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END")
+
+db_reads = Counter('db_reads_total', 'Read-only requests by the database that served them', ('target',))
+db_replica_healthy = Gauge('db_replica_healthy', 'Whether a replica is used for reads', ('replica',))
+db_replica_lag = Gauge('db_replica_lag_seconds', 'Replication lag measured by the last health check', ('replica',))
+
+
+class Replica:
+    def __init__(self, url: str, **engine_kwargs):
+        """
+        The __init__ function creates the engine and session factory of a read replica.
+        A replica is not used until a health check has passed.
+
+        :param self: Represent the instance of the class
+        :param url: str: Async SQLAlchemy URL of the replica
+        :param engine_kwargs: Extra arguments passed to create_async_engine
+        :return: The instance of the class
+        """
+        self.name = make_url(url).render_as_string(hide_password=True)
+        self.engine: AsyncEngine = create_async_engine(url, poolclass=InstrumentedPool, **engine_kwargs)
+        self.session_maker = async_sessionmaker(bind=self.engine, class_=AsyncSession, autoflush=False,
+                                                autocommit=False, expire_on_commit=False)
+        self.pool_stats = PoolStats()
+        instrument(self.engine, self.pool_stats)
+        self.healthy = False
+        self.lag: float | None = None
+        self.last_error: str | None = None
+        self.reads = 0
+
+    def mark_unhealthy(self, reason: str) -> None:
+        self.healthy = False
+        self.last_error = reason
+
+
+class ReplicaRouter:
+    r: redis.Redis | None = None
+
+    def __init__(self, urls: list[str], max_lag: float, marker_ttl: int, check_timeout: float, **engine_kwargs):
+        """
+        The __init__ function creates the router of read-only requests.
+        Reads go to the healthy replicas in turn. A user who wrote recently is pinned to the primary
+        until the marker in Redis expires, so they always read their own writes.
+        marker_ttl has to exceed max_lag plus the check interval, the longest a lagging replica can stay in use.
+
+        :param self: Represent the instance of the class
+        :param urls: list[str]: URLs of the replicas, none to send every read to the primary
+        :param max_lag: float: Replicas further behind the primary than this, in seconds, are not used
+        :param marker_ttl: int: Seconds a write pins the reads of its user to the primary
+        :param check_timeout: float: Seconds a health check may take before the replica counts as down
+        :param engine_kwargs: Extra arguments passed to create_async_engine for every replica
+        :return: The instance of the class
+        """
+        self.replicas = [Replica(url, **engine_kwargs) for url in urls]
+        self.max_lag = max_lag
+        self.marker_ttl = marker_ttl
+        self.check_timeout = check_timeout
+        self.turn = itertools.count()
+        self.primary_reads = 0
+        self.pinned_reads = 0
+
+    @staticmethod
+    def marker_key(user_id: int) -> str:
+        return f"db:wrote:{user_id}"
+
+    async def mark_write(self, user_id: int) -> None:
+        """
+        The mark_write function pins the following reads of the user to the primary for marker_ttl seconds.
+        It is called after every committed write of the user's data, before the response cache version is bumped.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The user who wrote
+        :return: None
+        """
+        if not self.replicas or self.r is None:
+            return
+        try:
+            await self.r.set(self.marker_key(user_id), 1, ex=self.marker_ttl)
+        except redis.RedisError:
+            # without the marker the replicas can't be trusted for this user, recently_wrote fails closed
+            pass
+
+    async def recently_wrote(self, user_id: int) -> bool:
+        """
+        The recently_wrote function tells whether the user has to read from the primary.
+        Without Redis the answer is always yes, since a write could not have been recorded.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The user who reads
+        :return: True if a write of the user may not have reached the replicas yet
+        """
+        if self.r is None:
+            return True
+        try:
+            return await self.r.get(self.marker_key(user_id)) is not None
+        except redis.RedisError:
+            return True
+
+    async def choose(self, user_id: int) -> Replica | None:
+        """
+        The choose function picks the database for a read-only request of the user.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The user who reads
+        :return: A healthy replica, or None for the primary
+        """
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            self.primary_reads += 1
+            return None
+        if await self.recently_wrote(user_id):
+            self.pinned_reads += 1
+            return None
+        replica = healthy[next(self.turn) % len(healthy)]
+        replica.reads += 1
+        return replica
+
+    async def check_replica(self, replica: Replica) -> None:
+        """
+        The check_replica function measures the replication lag of a replica and decides whether it is used.
+        On Postgres the lag is the age of the last replayed transaction, 0 once all received WAL is replayed;
+        other databases, e.g. SQLite files used for local testing, report no lag.
+
+        :param self: Represent the instance of the class
+        :param replica: Replica: The replica to check
+        :return: None
+        """
+        query = POSTGRES_LAG if replica.engine.dialect.name == 'postgresql' else text("SELECT 0")
+
+        async def measure() -> float:
+            async with replica.engine.connect() as connection:
+                return float((await connection.execute(query)).scalar() or 0)
+
+        try:
+            lag = await asyncio.wait_for(measure(), self.check_timeout)
+        except (OSError, SQLAlchemyError, asyncio.TimeoutError) as err:
+            replica.lag = None
+            replica.mark_unhealthy(f"check failed: {err!r}")
+            return
+        replica.lag = lag
+        if lag > self.max_lag:
+            replica.mark_unhealthy(f"lag {lag:.3f} s exceeds {self.max_lag} s")
+        else:
+            replica.healthy = True
+            replica.last_error = None
+
+    async def check(self) -> None:
+        """
+        The check function checks every replica at the same time.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        await asyncio.gather(*(self.check_replica(replica) for replica in self.replicas))
+
+    async def check_periodically(self, interval: float) -> None:
+        """
+        The check_periodically function checks the replicas every interval seconds, so lagging or failed
+        replicas are dropped and recovered ones come back. It runs until it is cancelled.
+
+        :param self: Represent the instance of the class
+        :param interval: float: Seconds between two checks
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(interval)
+            await self.check()
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def stats(self) -> dict:
+        """
+        The stats function returns the state of the replicas and where the reads went.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary of metrics
+        """
+        return {"primary_reads": self.primary_reads, "pinned_reads": self.pinned_reads,
+                "replicas": [{"name": replica.name, "healthy": replica.healthy, "lag": replica.lag,
+                              "reads": replica.reads, "error": replica.last_error,
+                              "pool": replica.pool_stats.snapshot(replica.engine.pool)}
+                             for replica in self.replicas]}
+
+    def export(self) -> None:
+        """
+        The export function copies the read counts, the state of the replicas and the counters of their
+        connection pools, labelled with the replica name, into the Prometheus metrics.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        db_reads.set(self.primary_reads, 'primary')
+        db_reads.set(self.pinned_reads, 'primary_pinned')
+        db_reads.set(sum(replica.reads for replica in self.replicas), 'replica')
+        for replica in self.replicas:
+            db_replica_healthy.set(int(replica.healthy), replica.name)
+            db_replica_lag.set(replica.lag if replica.lag is not None else -1, replica.name)
+            replica.pool_stats.export(replica.engine.pool, replica.name)
+
+
+replica_router = ReplicaRouter(settings.db_replica_urls, max_lag=settings.db_replica_max_lag,
+                               marker_ttl=settings.db_read_your_writes_ttl,
+                               check_timeout=settings.db_replica_check_timeout, echo=settings.db_echo,
+                               pool_size=settings.db_pool_size, max_overflow=settings.db_max_overflow,
+                               pool_timeout=settings.db_pool_timeout, pool_recycle=settings.db_pool_recycle,
+                               pool_pre_ping=settings.db_pool_pre_ping)
+
+
+async def get_read_db(current_user: User = Depends(auth_service.get_current_user),
+                      db: AsyncSession = Depends(get_db)):
+    """
+    The get_read_db function is the database dependency of read-only routes.
+    It yields a session of a healthy replica, or the primary session of get_db when there are no replicas,
+    all of them are down or lagging, or the user wrote recently.
+    A replica whose connection fails during the request is dropped until the next health check passes.
+    The response cache version is pinned before the database is chosen, see ResponseCache.pin_version.
+
+    :param current_user: User: The user who reads, resolved once per request with the route's own dependency
+    :param db: AsyncSession: The primary session
+    :return: An asynchronous database session
+    """
+    await response_cache.pin_version(current_user.id)
+    replica = await replica_router.choose(current_user.id)
+    if replica is None:
+        yield db
+        return
+    session = replica.session_maker()
+    try:
+        yield session
+    except DBAPIError as err:
+        await session.rollback()
+        if err.connection_invalidated or isinstance(err.orig, OSError):
+            replica.mark_unhealthy(f"request failed: {err!r}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    except SQLAlchemyError as err:
+        await session.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    finally:
+        await session.close()
@@ -1,26 +1,94 @@
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+import asyncio
+from itertools import islice
+from typing import AsyncIterator, Iterable, Sequence
 
-from src.database.models import Contact, User
-from src.schemas import ContactModel, ContactFavoriteModel
+from sqlalchemy import and_, select, insert, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.database.models import Contact, User, birth_md_of
+from src.database.replicas import replica_router
+from src.schemas import ContactModel, ContactFavoriteModel, ContactBatchOperation
+from src.services.contacts_io import ImportReport, EXPORT_COLUMNS
+from src.services.response_cache import response_cache
+from src.services.search_index import search_index
 
-async def get_contacts(user: User, limit: int, offset: int, db: Session):
+
+def _page_query(user: User, limit: int, offset: int, after_id: int | None, *columns):
+    query = select(*columns).filter(Contact.user_id == user.id).order_by(Contact.id).limit(limit)
+    if after_id is not None:
+        return query.filter(Contact.id > after_id)
+    return query.offset(offset)
+
+
+async def get_contacts(user: User, limit: int, offset: int, db: AsyncSession, after_id: int | None = None):
     """
-    The get_contacts function returns a list of contacts for the user.
+    The get_contacts function returns a list of contacts for the user ordered by id.
+    When after_id is given the page starts right after that contact (keyset pagination) and offset is ignored,
+    so the cost of a page does not depend on how deep it is.
 
     :param user: User: Get the user's contacts
     :param limit: int: Limit the number of contacts returned
     :param offset: int: Specify the number of records to skip before starting to return rows
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
+    :param after_id: int | None: Id of the last contact of the previous page
     :return: A list of contacts for a given user
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter(Contact.user_id == user.id).limit(limit).offset(offset).all()
-    return contacts
+    contacts = await db.execute(_page_query(user, limit, offset, after_id, Contact))
+    return contacts.scalars().all()
+
+
+async def get_contacts_version(user: User, limit: int, offset: int, db: AsyncSession, after_id: int | None = None):
+    """
+    The get_contacts_version function summarizes the page get_contacts would return without loading it:
+    the number of contacts, the newest updated_at, the sum of the ids and the last id.
+
+    :param user: User: Get the user's contacts
+    :param limit: int: Limit the number of contacts
+    :param offset: int: Specify the number of records to skip
+    :param db: AsyncSession: Get the database session
+    :param after_id: int | None: Id of the last contact of the previous page
+    :return: A (count, max_updated_at, id_sum, last_id) row
+    """
+    page = _page_query(user, limit, offset, after_id, Contact.id, Contact.updated_at).subquery()
+    version = await db.execute(select(func.count(), func.max(page.c.updated_at), func.sum(page.c.id),
+                                      func.max(page.c.id)))
+    return version.one()
+
+
+async def stream_contacts(user: User, db: AsyncSession, batch_size: int = 1000) -> AsyncIterator[Sequence[tuple]]:
+    """
+    The stream_contacts function reads all contacts of the user through a server-side cursor,
+    without building ORM objects, and yields them in batches of plain rows ordered by id.
+
+    :param user: User: Owner of the contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :param batch_size: int: Number of rows fetched from the cursor at a time
+    :return: An async iterator of row batches with the EXPORT_COLUMNS values
+    """
+    result = await db.stream(select(*(getattr(Contact, name) for name in EXPORT_COLUMNS))
+                             .filter(Contact.user_id == user.id).order_by(Contact.id)
+                             .execution_options(yield_per=batch_size))
+    async for batch in result.partitions():
+        yield batch
 
 
-async def get_contact_by_id(user: User, contact_id: int, db: Session):
+async def get_contact_version(user: User, contact_id: int, db: AsyncSession):
+    """
+    The get_contact_version function reads only the modification time of a contact.
+
+    :param user: User: Owner of the contact
+    :param contact_id: int: Id of the contact
+    :param db: AsyncSession: Pass the database session to the function
+    :return: A row with updated_at, or None if the contact does not exist
+    """
+    version = await db.execute(select(Contact.updated_at).filter(and_(Contact.user_id == user.id,
+                                                                      Contact.id == contact_id)))
+    return version.first()
+
+
+async def get_contact_by_id(user: User, contact_id: int, db: AsyncSession):
     """
     The get_contact_by_id function returns a contact from the database based on the user and contact id.
         Args:
@@ -29,33 +97,36 @@ async def get_contact_by_id(user: User, contact_id: int, db: Session):
 
     :param user: User: Get the user's id
     :param contact_id: int: Specify the contact id of the contact that we want to get
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A contact object
     :doc-author: Trelent
     """
-    contact = db.query(Contact).filter(and_(Contact.user_id == user.id, Contact.id == contact_id)).first()
-    return contact
+    contact = await db.execute(select(Contact).filter(and_(Contact.user_id == user.id, Contact.id == contact_id)))
+    return contact.scalars().first()
 
 
-async def create(user: User, body: ContactModel, db: Session):
+async def create(user: User, body: ContactModel, db: AsyncSession):
     """
     The create function creates a new contact in the database.
 
 
     :param user: User: Get the user_id from the token
     :param body: ContactModel: Pass the data from the request body to the function
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: The contact object that was created
     :doc-author: Trelent
     """
     contact = Contact(**body.dict(), user_id=user.id)
     db.add(contact)
-    db.commit()
-    db.refresh(contact)
+    await db.commit()
+    await db.refresh(contact)
+    search_index.contact_saved(contact)
+    await replica_router.mark_write(user.id)
+    await response_cache.bump(user.id)
     return contact
 
 
-async def update(user: User, contact_id: int, body: ContactModel, db: Session):
+async def update(user: User, contact_id: int, body: ContactModel, db: AsyncSession):
     """
     The update function updates a contact in the database.
         Args:
@@ -66,7 +137,7 @@ async def update(user: User, contact_id: int, body: ContactModel, db: Session):
     :param user: User: Get the user id from the token
     :param contact_id: int: Get the contact by id
     :param body: ContactModel: Get the data from the request body
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A contact object, which is the same as the one we get from get_contact_by_id
     :doc-author: Trelent
     """
@@ -79,29 +150,36 @@ async def update(user: User, contact_id: int, body: ContactModel, db: Session):
         contact.birthday = body.birthday
         contact.additional_info = body.additional_info
         contact.is_favorite = body.is_favorite
-        db.commit()
+        await db.commit()
+        await db.refresh(contact)
+        search_index.contact_saved(contact)
+        await replica_router.mark_write(user.id)
+        await response_cache.bump(user.id)
     return contact
 
 
-async def remove(user: User, contact_id: int, db: Session):
+async def remove(user: User, contact_id: int, db: AsyncSession):
     """
     The remove function removes a contact from the database.
 
 
     :param user: User: Identify the user who is making the request
     :param contact_id: int: Specify which contact to remove from the database
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: The contact that was just removed
     :doc-author: Trelent
     """
     contact = await get_contact_by_id(user, contact_id, db)
     if contact:
-        db.delete(contact)
-        db.commit()
+        await db.delete(contact)
+        await db.commit()
+        search_index.contact_removed(contact)
+        await replica_router.mark_write(user.id)
+        await response_cache.bump(user.id)
     return contact
 
 
-async def set_favorite(user: User, contact_id: int, body: ContactFavoriteModel, db: Session):
+async def set_favorite(user: User, contact_id: int, body: ContactFavoriteModel, db: AsyncSession):
     """
     The set_favorite function is used to set a contact as favorite or not.
         Args:
@@ -112,12 +190,151 @@ async def set_favorite(user: User, contact_id: int, body: ContactFavoriteModel,
     :param user: User: Identify the user that is making the request
     :param contact_id: int: Identify the contact to be updated
     :param body: ContactFavoriteModel: Pass the is_favorite value to the function
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: The contact object
     :doc-author: Trelent
     """
     contact = await get_contact_by_id(user, contact_id, db)
     if contact:
         contact.is_favorite = body.is_favorite
-        db.commit()
+        await db.commit()
+        await db.refresh(contact)
+        await replica_router.mark_write(user.id)
+        await response_cache.bump(user.id)
     return contact
+
+
+async def get_contacts_by_ids(user: User, ids: Iterable[int], db: AsyncSession,
+                              refresh: bool = False) -> dict[int, Contact]:
+    """
+    The get_contacts_by_ids function loads several contacts of the user with a single IN query.
+    Ids that do not exist or belong to another user are left out of the result.
+
+    :param user: User: Owner of the contacts
+    :param ids: Iterable[int]: Ids of the contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :param refresh: bool: Overwrite contacts already present in the session with the database state
+    :return: A dictionary of contacts by id
+    """
+    ids = set(ids)
+    if not ids:
+        return {}
+    query = select(Contact).filter(and_(Contact.user_id == user.id, Contact.id.in_(ids)))
+    if refresh:
+        query = query.execution_options(populate_existing=True)
+    contacts = await db.execute(query)
+    return {contact.id: contact for contact in contacts.scalars()}
+
+
+async def apply_batch(user: User, operations: list[ContactBatchOperation], contacts: dict[int, Contact],
+                      db: AsyncSession, get_ids: Iterable[int] = ()) -> tuple[list[tuple[str, Contact]], dict]:
+    """
+    The apply_batch function applies create, update, favorite and delete operations in order and commits them
+    in one transaction. The unit of work sends all changes in a single flush, batching rows that change
+    the same columns into one executemany. Changed and requested contacts are then reloaded with one IN query,
+    which also picks up the server-side updated_at.
+
+    :param user: User: Owner of the contacts
+    :param operations: list[ContactBatchOperation]: The operations, already checked against roles and contacts
+    :param contacts: dict[int, Contact]: Contacts referenced by the operations, from get_contacts_by_ids
+    :param db: AsyncSession: Pass the database session to the function
+    :param get_ids: Iterable[int]: Ids of further contacts to return
+    :return: The (op, contact) result of every operation and a dictionary of the current contacts by id
+    """
+    results = []
+    for operation in operations:
+        if operation.op == 'create':
+            contact = Contact(**operation.contact.dict(), user_id=user.id)
+            db.add(contact)
+        else:
+            contact = contacts[operation.id]
+            if operation.op == 'update':
+                for name, value in operation.contact.dict().items():
+                    setattr(contact, name, value)
+            elif operation.op == 'favorite':
+                contact.is_favorite = operation.is_favorite
+            else:
+                await db.delete(contact)
+        results.append((operation.op, contact))
+    if not results:
+        return results, await get_contacts_by_ids(user, get_ids, db)
+    await db.commit()
+    deleted = {contact.id for op, contact in results if op == 'delete'}
+    current = await get_contacts_by_ids(user, {contact.id for op, contact in results if op != 'delete'} | set(get_ids),
+                                        db, refresh=True)
+    for op, contact in results:
+        if op == 'delete':
+            search_index.contact_removed(contact)
+        elif contact.id not in deleted:
+            search_index.contact_saved(current[contact.id])
+    await replica_router.mark_write(user.id)
+    await response_cache.bump(user.id)
+    return results, current
+
+
+def contact_row(user: User, body: ContactModel) -> dict:
+    """
+    The contact_row function turns a validated contact into a row for a Core insert.
+    Core inserts skip the ORM listeners, so the 'My' favorite rule and birth_md are applied here.
+
+    :param user: User: Owner of the contact
+    :param body: ContactModel: The validated contact
+    :return: A dictionary of column values
+    """
+    row = body.dict()
+    row["user_id"] = user.id
+    row["is_favorite"] = row["is_favorite"] or row["firstname"].startswith('My')
+    row["birth_md"] = birth_md_of(row["birthday"])
+    return row
+
+
+async def _insert_rows(rows: list[tuple[int, dict]], db: AsyncSession, report: ImportReport) -> None:
+    try:
+        await db.execute(insert(Contact.__table__), [row for _, row in rows])
+        await db.commit()
+        report.inserted += len(rows)
+    except IntegrityError as err:
+        await db.rollback()
+        if len(rows) == 1:
+            report.error(rows[0][0], f"conflicts with an existing contact: {err.orig}")
+            return
+        # bisect to find the offending rows, every other row still gets inserted
+        middle = len(rows) // 2
+        await _insert_rows(rows[:middle], db, report)
+        await _insert_rows(rows[middle:], db, report)
+
+
+async def import_contacts(user: User, contacts: Iterable[tuple[int, ContactModel]], db: AsyncSession,
+                          report: ImportReport, chunk_size: int = 1000) -> ImportReport:
+    """
+    The import_contacts function inserts contacts in chunks with one multi-row INSERT and one commit per chunk.
+    Only two chunks are held in memory at a time: the next chunk is parsed and validated on a worker thread
+    while the current one is being inserted, which also keeps the CPU-heavy validation off the event loop.
+    A chunk that violates a unique constraint is split in halves until the conflicting rows are found;
+    those are reported and the rest of the chunk is still inserted.
+
+    :param user: User: Owner of the contacts
+    :param contacts: Iterable[tuple[int, ContactModel]]: Row numbers and validated contacts, e.g. from parse_contacts
+    :param db: AsyncSession: Pass the database session to the function
+    :param report: ImportReport: Receives the inserted count and the rejected rows
+    :param chunk_size: int: Number of rows per INSERT
+    :return: The report
+    """
+    contacts = iter(contacts)
+
+    def read_chunk() -> list[tuple[int, dict]]:
+        return [(row, contact_row(user, body)) for row, body in islice(contacts, chunk_size)]
+
+    loop = asyncio.get_running_loop()
+    next_chunk = loop.run_in_executor(None, read_chunk)
+    try:
+        while chunk := await next_chunk:
+            next_chunk = loop.run_in_executor(None, read_chunk)
+            await _insert_rows(chunk, db, report)
+    finally:
+        # never leave the reader running on a file that is about to be closed
+        await asyncio.wait([next_chunk])
+        search_index.invalidate(user.id)
+        await replica_router.mark_write(user.id)
+        await response_cache.bump(user.id)
+    return report
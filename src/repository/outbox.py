@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from src.database.models import EmailOutbox
+
+
+async def enqueue_email(email: str, username: str, host: str, payload: dict, db: AsyncSession) -> EmailOutbox:
+    """
+    The enqueue_email function adds an email to the outbox, from where the outbox worker sends it.
+    It does not commit: the caller commits the email together with the change that asks for it, e.g. a new user,
+    so either both are stored or neither is. The request does not wait for the SMTP server.
+
+    :param email: str: Address of the recipient
+    :param username: str: Name of the recipient, used by the template
+    :param host: str: Base URL of the service, used for the links of the template
+    :param payload: dict: The subject and template_name of the email
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The outbox row, pending until the session commits
+    """
+    message = EmailOutbox(email=email, username=username, host=host, subject=payload["subject"],
+                          template_name=payload["template_name"], next_attempt_at=datetime.utcnow())
+    db.add(message)
+    return message
+
+
+async def claim_batch(limit: int, lease: float, db: AsyncSession) -> list[EmailOutbox]:
+    """
+    The claim_batch function takes up to limit emails that are due, oldest first, and moves their next attempt
+    lease seconds ahead, so no other worker takes them meanwhile. If the worker dies before it records the result,
+    the emails become due again when the lease runs out. On Postgres the rows are locked with SKIP LOCKED,
+    so concurrent workers claim different emails instead of waiting on each other.
+
+    :param limit: int: Maximum number of emails
+    :param lease: float: Seconds the emails are reserved for the caller
+    :param db: AsyncSession: Pass the database session to the function
+    :return: The claimed emails, with attempts already counting this attempt
+    """
+    now = datetime.utcnow()
+    leased_until = now + timedelta(seconds=lease)
+    query = (select(EmailOutbox).where(EmailOutbox.next_attempt_at <= now).order_by(EmailOutbox.next_attempt_at)
+             .limit(limit).with_for_update(skip_locked=True))
+    messages = list((await db.execute(query)).scalars())
+    if messages:
+        await db.execute(update(EmailOutbox).where(EmailOutbox.id.in_([message.id for message in messages]))
+                         .values(attempts=EmailOutbox.attempts + 1, next_attempt_at=leased_until)
+                         .execution_options(synchronize_session=False))
+    await db.commit()
+    for message in messages:
+        # the rows already hold these values, the objects must not be flushed again
+        set_committed_value(message, 'attempts', message.attempts + 1)
+        set_committed_value(message, 'next_attempt_at', leased_until)
+    return messages
+
+
+async def delete_sent(ids: list[int], db: AsyncSession) -> None:
+    """
+    The delete_sent function removes the emails that were sent from the outbox.
+
+    :param ids: list[int]: Ids of the sent emails
+    :param db: AsyncSession: Pass the database session to the function
+    :return: None
+    """
+    if ids:
+        await db.execute(delete(EmailOutbox).where(EmailOutbox.id.in_(ids)))
+        await db.commit()
+
+
+async def reschedule(message_id: int, error: str, next_attempt_at: datetime | None, db: AsyncSession) -> None:
+    """
+    The reschedule function records a failed attempt to send an email.
+
+    :param message_id: int: Id of the email
+    :param error: str: Why the attempt failed
+    :param next_attempt_at: datetime | None: When to try again in UTC, None to give up on the email
+    :param db: AsyncSession: Pass the database session to the function
+    :return: None
+    """
+    await db.execute(update(EmailOutbox).where(EmailOutbox.id == message_id)
+                     .values(last_error=error[:255], next_attempt_at=next_attempt_at))
+    await db.commit()
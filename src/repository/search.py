@@ -1,44 +1,50 @@
-from datetime import date, datetime
+from datetime import date, timedelta
 from typing import List
 
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, select, func, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import Contact, User
+from src.conf.config import settings
+from src.database.models import Contact, User, contacts_fts, SEARCH_COLUMNS, birth_md_of
+from src.services.search_index import search_index
 
+# ids bound per IN query; asyncpg allows at most 32767 bind parameters per statement
+IDS_PER_QUERY = 10_000
 
-async def get_contact_by_firstname(user: User, firstname: str, db: Session) -> List[Contact]:
+
+async def get_contact_by_firstname(user: User, firstname: str, db: AsyncSession) -> List[Contact]:
     """
     The get_contact_by_firstname function returns a list of contacts that match the firstname parameter.
         The function takes in a user object, firstname string and database session as parameters.
 
     :param user: User: Get the user id of the logged in user
     :param firstname: str: Search for a contact by firstname
-    :param db: Session: Create a database session, which is used to query the database
+    :param db: AsyncSession: Create a database session, which is used to query the database
     :return: A list of contacts that match the firstname given
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter(
-        and_(Contact.user_id == user.id, Contact.firstname.like(f'%{firstname}%'))).all()
-    return contacts
+    contacts = await db.execute(select(Contact).filter(
+        and_(Contact.user_id == user.id, Contact.firstname.like(f'%{firstname}%'))))
+    return contacts.scalars().all()
 
 
-async def get_contact_by_lastname(user: User, lastname: str, db: Session) -> List[Contact]:
+async def get_contact_by_lastname(user: User, lastname: str, db: AsyncSession) -> List[Contact]:
     """
     The get_contact_by_lastname function returns a list of contacts that match the lastname parameter.
         The user_id is used to ensure that only contacts belonging to the current user are returned.
 
     :param user: User: Get the user's id from the user object
     :param lastname: str: Filter the contacts by lastname
-    :param db: Session: Create a database session
+    :param db: AsyncSession: Create a database session
     :return: A list of contacts with the given lastname
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter(and_(Contact.user_id == user.id, Contact.lastname.like(f'%{lastname}%'))).all()
-    return contacts
+    contacts = await db.execute(
+        select(Contact).filter(and_(Contact.user_id == user.id, Contact.lastname.like(f'%{lastname}%'))))
+    return contacts.scalars().all()
 
 
-async def get_contact_by_email(user: User, email: str, db: Session) -> List[Contact]:
+async def get_contact_by_email(user: User, email: str, db: AsyncSession) -> List[Contact]:
     """
     The get_contact_by_email function takes in a user, an email string, and a database session.
     It then queries the database for all contacts that match the given email string.
@@ -46,15 +52,16 @@ async def get_contact_by_email(user: User, email: str, db: Session) -> List[Cont
 
     :param user: User: Filter the contacts by user id
     :param email: str: Search for a contact by email
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A list of contacts that match the email address
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter(and_(Contact.user_id == user.id, Contact.email.like(f'%{email}%'))).all()
-    return contacts
+    contacts = await db.execute(
+        select(Contact).filter(and_(Contact.user_id == user.id, Contact.email.like(f'%{email}%'))))
+    return contacts.scalars().all()
 
 
-async def get_contact_by_phone(user: User, phone: str, db: Session) -> List[Contact]:
+async def get_contact_by_phone(user: User, phone: str, db: AsyncSession) -> List[Contact]:
     """
     The get_contact_by_phone function returns a list of contacts that match the phone number provided.
         Args:
@@ -63,73 +70,94 @@ async def get_contact_by_phone(user: User, phone: str, db: Session) -> List[Cont
 
     :param user: User: Filter the contacts by user
     :param phone: str: Search for a contact by phone number
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A list of contacts that match the user's id and phone number
     :doc-author: Trelent
     """
-    contacts = db.query(Contact).filter(and_(Contact.user_id == user.id, Contact.phone.like(f'%{phone}%'))).all()
-    return contacts
+    contacts = await db.execute(
+        select(Contact).filter(and_(Contact.user_id == user.id, Contact.phone.like(f'%{phone}%'))))
+    return contacts.scalars().all()
 
 
-async def get_birthday_list(user: User, shift: int, db: Session) -> List[Contact]:
+async def get_birthday_list(user: User, shift: int, db: AsyncSession) -> List[Contact]:
     """
     The get_birthday_list function takes in a user, shift, and db.
     It returns a list of contacts that have birthdays within the next 'shift' days.
+    The window is matched against the indexed birth_md column (month * 100 + day), wrapping over the new year,
+    so only matching rows are read. In non-leap years Feb 29 birthdays fall between Feb 28 and Mar 1.
 
     :param user: User: Identify the user that is currently logged in
     :param shift: int: Determine how many days in the future to look for birthdays
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: A list of contacts whose birthdays are within the next 'shift' days
     :doc-author: Trelent
     """
-    contacts = []
-    all_contacts = db.query(Contact).filter_by(user_id=user.id).all()
-    today = date.today()
-    for contact in all_contacts:
-        birthday = contact.birthday
-        evaluated_date = (datetime(today.year, birthday.month, birthday.day).date() - today).days
-        if evaluated_date < 0:
-            evaluated_date = (datetime(today.year + 1, birthday.month, birthday.day).date() - today).days
-        if evaluated_date <= shift:
-            contacts.append(contact)
-    return contacts
-
-#
-# async def get_users_by_partial_info(user: User, partial_info: str, db: Session) -> List[Contact]:
-#     """
-#     The get_users_by_partial_info function takes in a user and partial_info,
-#         then returns a list of contacts that match the partial_info.
-#
-#     :param user: User: Identify the user who is making the request
-#     :param partial_info: str: Search for a user by their first name, last name, email or phone number
-#     :param db: Session: Pass the database session to the function
-#     :return: A list of contacts
-#     :doc-author: Trelent
-#     """
-#     contacts = []
-#     search_by_firstname = await get_contact_by_firstname(user, partial_info, db)
-#     if search_by_firstname:
-#         for item in search_by_firstname:
-#             contacts.append(item)
-#     search_by_second_name = await get_contact_by_lastname(user, partial_info, db)
-#     if search_by_second_name:
-#         for item in search_by_second_name:
-#             contacts.append(item)
-#     search_by_email = await get_contact_by_email(user, partial_info, db)
-#     if search_by_email:
-#         for item in search_by_email:
-#             contacts.append(item)
-#     search_by_phone = await get_contact_by_phone(user, partial_info, db)
-#     if search_by_phone:
-#         for item in search_by_phone:
-#             contacts.append(item)
-#     return contacts
-
-async def get_users_by_partial_info(user: User, partial_info: str, db: Session) -> List[Contact]:
-    contacts = db.query(Contact).filter(Contact.user_id == user.id).all()
-    filtered_contacts = [contact for contact in contacts if
-                         partial_info in contact.firstname or
-                         partial_info in contact.lastname or
-                         partial_info in contact.email or
-                         partial_info in contact.phone]
-    return filtered_contacts
+    if shift < 0:
+        return []
+    query = select(Contact).filter(Contact.user_id == user.id).order_by(Contact.id)
+    if shift < 365:
+        today = date.today()
+        last_day = today + timedelta(days=shift)
+        start, end = birth_md_of(today), birth_md_of(last_day)
+        if last_day.year == today.year:
+            query = query.filter(Contact.birth_md.between(start, end))
+        else:
+            query = query.filter(or_(Contact.birth_md >= start, Contact.birth_md <= end))
+    contacts = await db.execute(query)
+    return contacts.scalars().all()
+
+
+def partial_info_filter(partial_info: str, dialect: str):
+    """
+    The partial_info_filter function builds a case-sensitive substring condition over firstname, lastname,
+    email and phone that the database can answer from an index.
+    On SQLite queries of three or more characters go through the contacts_fts trigram table,
+    elsewhere a LIKE '%...%' is used, which Postgres serves from the pg_trgm GIN indexes.
+
+    :param partial_info: str: Substring to look for
+    :param dialect: str: Name of the database dialect
+    :return: A SQLAlchemy condition
+    """
+    columns = [getattr(Contact, name) for name in SEARCH_COLUMNS]
+    if dialect == 'sqlite':
+        if len(partial_info) >= 3:
+            phrase = '"' + partial_info.replace('"', '""') + '"'
+            matches = select(contacts_fts.c.rowid).where(literal_column('contacts_fts').op('MATCH')(phrase))
+            return Contact.id.in_(matches)
+        # the trigram index can't answer shorter queries and LIKE is case-insensitive in SQLite
+        return or_(*(func.instr(col, partial_info) > 0 for col in columns))
+    return or_(*(col.contains(partial_info, autoescape=True) for col in columns))
+
+
+async def get_users_by_partial_info(user: User, partial_info: str, db: AsyncSession, limit: int | None = None,
+                                    offset: int = 0) -> List[Contact]:
+    """
+    The get_users_by_partial_info function takes in a user and partial_info,
+        then returns a list of contacts whose first name, last name, email or phone contains partial_info.
+        The filtering is done by the database, so only matching rows are loaded.
+        With the 'memory' search backend the matching ids come from the in-process trigram index instead;
+        the page is cut from the ids before any row is read, and the rows are loaded IDS_PER_QUERY ids at a time,
+        so a broad query never exceeds the bind parameter limit of the driver.
+
+    :param user: User: Identify the user who is making the request
+    :param partial_info: str: Search for a contact by their first name, last name, email or phone number
+    :param db: AsyncSession: Pass the database session to the function
+    :param limit: int | None: Maximum number of contacts, None for all of them
+    :param offset: int: Number of matching contacts to skip, in id order
+    :return: A list of contacts
+    """
+    if settings.search_backend == 'memory':
+        ids = await search_index.search(user, partial_info, db)
+        ids = ids[offset:] if limit is None else ids[offset:offset + limit]
+        contacts = []
+        for start in range(0, len(ids), IDS_PER_QUERY):
+            chunk = await db.execute(select(Contact).filter(and_(
+                Contact.user_id == user.id, Contact.id.in_(ids[start:start + IDS_PER_QUERY]))).order_by(Contact.id))
+            contacts.extend(chunk.scalars())
+        return contacts
+    condition = partial_info_filter(partial_info, db.get_bind().dialect.name)
+    query = select(Contact).filter(and_(Contact.user_id == user.id, condition)).order_by(Contact.id).offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    contacts = await db.execute(query)
+    return contacts.scalars().all()
@@ -1,14 +1,22 @@
 from typing import List
 
-from fastapi import Depends, HTTPException, status, Path, APIRouter, Query
+from fastapi import Depends, HTTPException, status, Path, APIRouter, Query, Request, UploadFile, File
+from fastapi.responses import StreamingResponse
 from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
+from src.database.replicas import get_read_db
 from src.database.models import User, Role
 from src.repository import contacts as repository_contacts
-from src.schemas import ContactResponse, ContactModel, ContactFavoriteModel
+from src.schemas import (ContactResponse, ContactModel, ContactFavoriteModel, ContactImportResponse,
+                         ContactBatchRequest, ContactBatchResponse)
 from src.services.auth import auth_service
+from src.services.contacts_io import ImportReport, detect_format, parse_contacts, encode_contacts, EXPORT_MEDIA_TYPES
+from src.services.etag import contact_etag, page_etag, etag_matches, not_modified
+from src.services.pagination import encode_cursor, decode_cursor, next_link
+from src.services.response_cache import response_cache
+from src.services.serializers import dump_one, dump_many, dumps, json_response, compile_serializer
 from src.services.role import RoleAccess
 
 router = APIRouter(prefix="/api/contacts", tags=['contacts'])
@@ -17,67 +25,200 @@ allowed_operation_get = RoleAccess([Role.admin, Role.moderator, Role.user])  # n
 allowed_operation_create = RoleAccess([Role.admin, Role.moderator, Role.user])  # noqa
 allowed_operation_update = RoleAccess([Role.admin, Role.moderator])  # noqa
 allowed_operation_remove = RoleAccess([Role.admin])  # noqa
+allowed_batch_operations = {'create': allowed_operation_create, 'update': allowed_operation_update,  # noqa
+                            'favorite': allowed_operation_update, 'delete': allowed_operation_remove}
 
 
 @router.get("/", response_model=List[ContactResponse], description='No more than 10 requests per minute',
             dependencies=[Depends(allowed_operation_get), Depends(RateLimiter(times=10, seconds=60))])
-async def get_contacts(limit: int = Query(10, le=500), offset: int = 0, db: Session = Depends(get_db),
+async def get_contacts(request: Request, limit: int = Query(10, le=500), offset: int = 0,
+                       cursor: str | None = Query(None, description='Opaque cursor from the Link header of the '
+                                                                    'previous page, replaces offset'),
+                       db: AsyncSession = Depends(get_read_db),
                        current_user: User = Depends(auth_service.get_current_user)):
     """
     The get_contacts function returns a list of contacts.
+    When the page is full, a Link header with rel="next" points to the next page using a cursor,
+    which keeps deep pages as cheap as the first one.
+    The ETag is derived from the number of contacts on the page, their newest updated_at and their ids.
+    If the If-None-Match header matches, a 304 is returned after an aggregate query, before any contact is loaded.
+    Serialized pages are kept in the response cache until the user changes a contact.
 
+    :param request: Request: Build the link to the next page
     :param limit: int: Limit the number of contacts returned
     :param le: Limit the number of contacts returned to 500
     :param offset: int: Skip a number of records
-    :param db: Session: Pass the database session to the repository layer
+    :param cursor: str | None: Continue after the page the cursor was issued for
+    :param db: AsyncSession: Pass the database session to the repository layer
     :param current_user: User: Get the current user
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.get_contacts(current_user, limit, offset, db)
-    return contacts
+    after_id = decode_cursor(cursor) if cursor is not None else None
+    if_none_match = request.headers.get("if-none-match")
+    # the url holds every parameter of the page and is also the base of the Link header
+    cache_key = await response_cache.key(current_user.id, "contacts", url=str(request.url))
+    cached = await response_cache.get(cache_key)
+    if cached is not None:
+        body, headers = cached
+        if etag_matches(if_none_match, headers["ETag"]):
+            return not_modified(headers.pop("ETag"), headers)
+        return json_response(body, headers=headers)
+    if if_none_match:
+        count, max_updated_at, id_sum, last_id = await repository_contacts.get_contacts_version(
+            current_user, limit, offset, db, after_id=after_id)
+        etag = page_etag(count, max_updated_at, id_sum, last_id)
+        if etag_matches(if_none_match, etag):
+            headers = {"Link": next_link(request.url, encode_cursor(last_id))} if count and count == limit else {}
+            return not_modified(etag, headers)
+    contacts = await repository_contacts.get_contacts(current_user, limit, offset, db, after_id=after_id)
+    headers = {}
+    if contacts and len(contacts) == limit:
+        headers["Link"] = next_link(request.url, encode_cursor(contacts[-1].id))
+    headers["ETag"] = page_etag(len(contacts), max((c.updated_at for c in contacts), default=None),
+                                sum(c.id for c in contacts), contacts[-1].id if contacts else None)
+    body = dump_many(ContactResponse, contacts)
+    await response_cache.set(cache_key, body, headers)
+    return json_response(body, headers=headers)
+
+
+@router.get("/export", response_class=StreamingResponse, dependencies=[Depends(allowed_operation_get)],
+            responses={200: {"content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()}}})
+async def export_contacts(format: str = Query('ndjson', regex='^(csv|ndjson)$'),
+                          db: AsyncSession = Depends(get_read_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The export_contacts function streams the whole address book of the user as NDJSON or CSV.
+    Rows are read through a server-side cursor and encoded as they arrive, so memory use and the time
+    to the first byte do not depend on the number of contacts.
+
+    :param format: str: ndjson (default) or csv
+    :param db: AsyncSession: Get the database session, kept open until the response is sent
+    :param current_user: User: Get the user whose contacts are exported
+    :return: A streaming response with the contacts
+    """
+    body = encode_contacts(repository_contacts.stream_contacts(current_user, db), format)
+    return StreamingResponse(body, media_type=EXPORT_MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="contacts.{format}"'})
 
 
 @router.get("/{contact_id}", response_model=ContactResponse, dependencies=[Depends(allowed_operation_get)])
-async def get_contact(contact_id: int = Path(ge=1), db: Session = Depends(get_db),
+async def get_contact(request: Request, contact_id: int = Path(ge=1),
+                      db: AsyncSession = Depends(get_read_db),
                       current_user: User = Depends(auth_service.get_current_user)):
     """
     The get_contact function is a GET request that returns the contact with the given ID.
     The function takes in an optional contact_id parameter, which defaults to 1 if not provided.
-    It also takes in a db Session object and current_user User object as parameters, both of which are injected by FastAPI.
+    It also takes in a db AsyncSession object and current_user User object as parameters, both of which are injected by FastAPI.
+
+    The ETag is derived from the id and updated_at of the contact. If the If-None-Match header matches,
+    a 304 is returned after reading only updated_at.
 
+    :param request: Request: Read the If-None-Match header
     :param contact_id: int: Get the contact id from the url path
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the user who is logged in
     :return: A contact object
     :doc-author: Trelent
     """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        version = await repository_contacts.get_contact_version(current_user, contact_id, db)
+        if version is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+        etag = contact_etag(contact_id, version.updated_at)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
     contact = await repository_contacts.get_contact_by_id(current_user, contact_id, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-    return contact
+    return json_response(dump_one(ContactResponse, contact),
+                         headers={"ETag": contact_etag(contact.id, contact.updated_at)})
 
 
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED,
              dependencies=[Depends(allowed_operation_create)])
-async def create_contact(body: ContactModel, db: Session = Depends(get_db),
+async def create_contact(body: ContactModel, db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
     The create_contact function creates a new contact in the database.
 
     :param body: ContactModel: Get the data from the request body
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the user from the database
     :return: A contactmodel object
     :doc-author: Trelent
     """
     contact = await repository_contacts.create(current_user, body, db)
-    return contact
+    return json_response(dump_one(ContactResponse, contact), status_code=status.HTTP_201_CREATED)
+
+
+@router.post("/import", response_model=ContactImportResponse, dependencies=[Depends(allowed_operation_create)],
+             description='CSV with a header row or NDJSON, one contact per row')
+async def import_contacts(file: UploadFile = File(),
+                          format: str | None = Query(None, regex='^(csv|ndjson)$',
+                                                     description='Defaults to the file extension or content type'),
+                          db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The import_contacts function creates contacts in bulk from an uploaded CSV or NDJSON file.
+    The file is read row by row, validated against ContactModel and inserted in chunks,
+    so memory use does not depend on the size of the file.
+    Invalid or conflicting rows are reported with their row numbers and do not stop the import.
+    A file that is not UTF-8 is imported up to the undecodable bytes, which are reported as a failed row.
+
+    :param file: UploadFile: The CSV or NDJSON file
+    :param format: str | None: Format of the file, guessed from its name or content type when omitted
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the user who owns the new contacts
+    :return: The number of inserted and failed rows and the first errors
+    """
+    fmt = format or detect_format(file.filename, file.content_type)
+    if fmt is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown file format, use csv or ndjson")
+    report = ImportReport()
+    await repository_contacts.import_contacts(current_user, parse_contacts(file.file, fmt, report), db, report)
+    return {"inserted": report.inserted, "failed": report.failed, "errors": report.errors}
+
+
+@router.post("/batch", response_model=ContactBatchResponse, dependencies=[Depends(allowed_operation_get)],
+             description='Every operation needs the role of its single-contact endpoint')
+async def batch_contacts(body: ContactBatchRequest, db: AsyncSession = Depends(get_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The batch_contacts function runs a list of create, update, favorite and delete operations in one transaction
+    and returns the contacts listed in get. Each operation is checked against the same roles as its
+    single-contact endpoint, and all referenced contacts are loaded with one query before anything changes.
+    If any operation is forbidden or refers to a missing (or already deleted) contact, nothing is applied.
+
+    :param body: ContactBatchRequest: The operations and the ids to return
+    :param db: AsyncSession: Get the database session
+    :param current_user: User: Get the user that is currently logged in
+    :return: The result of every operation and the requested contacts
+    """
+    for operation in body.operations:
+        allowed_batch_operations[operation.op].check(current_user)
+    ids = {operation.id for operation in body.operations if operation.id is not None} | set(body.get)
+    contacts = await repository_contacts.get_contacts_by_ids(current_user, ids, db)
+    deleted = set()
+    for operation in body.operations:
+        if operation.id is not None and (operation.id not in contacts or operation.id in deleted):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Contact {operation.id} not found")
+        if operation.op == 'delete':
+            deleted.add(operation.id)
+    results, current = await repository_contacts.apply_batch(current_user, body.operations, contacts, db,
+                                                             get_ids=body.get)
+    serialize = compile_serializer(ContactResponse)
+    return json_response(dumps({
+        "results": [{"op": op, "id": contact.id,
+                     "contact": serialize(current[contact.id]) if contact.id in current else None}
+                    for op, contact in results],
+        "contacts": [serialize(current[contact_id]) for contact_id in body.get if contact_id in current]}))
 
 
 @router.put("/{contact_id}", response_model=ContactResponse, dependencies=[Depends(allowed_operation_update)],
             description='Only moderators and admin')
-async def update_contact(body: ContactModel, contact_id: int = Path(ge=1), db: Session = Depends(get_db),
+async def update_contact(body: ContactModel, contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
     The update_contact function updates a contact in the database.
@@ -86,7 +227,7 @@ async def update_contact(body: ContactModel, contact_id: int = Path(ge=1), db: S
 
     :param body: ContactModel: Pass the contact model to the function
     :param contact_id: int: Specify the contact id in the url
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the user that is currently logged in
     :return: The updated contact
     :doc-author: Trelent
@@ -94,18 +235,18 @@ async def update_contact(body: ContactModel, contact_id: int = Path(ge=1), db: S
     contact = await repository_contacts.update(current_user, contact_id, body, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-    return contact
+    return json_response(dump_one(ContactResponse, contact))
 
 
 @router.delete("/{contact_id}", status_code=status.HTTP_204_NO_CONTENT,
                dependencies=[Depends(allowed_operation_remove)])
-async def remove_contact(contact_id: int = Path(ge=1), db: Session = Depends(get_db),
+async def remove_contact(contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
                          current_user: User = Depends(auth_service.get_current_user)):
     """
     The remove_contact function removes a contact from the database.
 
     :param contact_id: int: Pass the contact_id to the function
-    :param db: Session: Get a database session
+    :param db: AsyncSession: Get a database session
     :param current_user: User: Get the current user from the database
     :return: The deleted contact
     :doc-author: Trelent
@@ -118,7 +259,7 @@ async def remove_contact(contact_id: int = Path(ge=1), db: Session = Depends(get
 
 @router.patch("/{contact_id}/favorite", response_model=ContactResponse,
               dependencies=[Depends(allowed_operation_update)])
-async def favorite_contact(body: ContactFavoriteModel, contact_id: int = Path(ge=1), db: Session = Depends(get_db),
+async def favorite_contact(body: ContactFavoriteModel, contact_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
                            current_user: User = Depends(auth_service.get_current_user)):
     """
     The favorite_contact function is used to set a contact as favorite or not.
@@ -129,7 +270,7 @@ async def favorite_contact(body: ContactFavoriteModel, contact_id: int = Path(ge
 
     :param body: ContactFavoriteModel: Get the data from the request body
     :param contact_id: int: Get the contact id from the url
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :param current_user: User: Get the user who is currently logged in
     :return: A contactmodel object
     :doc-author: Trelent
@@ -137,4 +278,4 @@ async def favorite_contact(body: ContactFavoriteModel, contact_id: int = Path(ge
     contact = await repository_contacts.set_favorite(current_user, contact_id, body, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-    return contact
+    return json_response(dump_one(ContactResponse, contact))
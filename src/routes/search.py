@@ -1,54 +1,78 @@
+from datetime import date
 from typing import List
 
-from fastapi import Depends, HTTPException, status, APIRouter
+from fastapi import Depends, HTTPException, status, APIRouter, Query
 from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.db import get_db
+from src.database.replicas import get_read_db
 from src.database.models import User
 from src.repository import search as repository_contacts
 from src.schemas import ContactResponse
 from src.services.auth import auth_service
+from src.services.response_cache import response_cache
+from src.services.serializers import dump_many, json_response
 
 search = APIRouter(prefix="/api/search", tags=['search'])
 
 
 @search.get("/shift/{shift}", response_model=List[ContactResponse])
-async def get_birthday_list(shift: int, db: Session = Depends(get_db),
+async def get_birthday_list(shift: int, db: AsyncSession = Depends(get_read_db),
                             current_user: User = Depends(auth_service.get_current_user)):
     """
     The get_birthday_list function returns a list of contacts with birthdays in the next 7 days.
         The shift parameter is used to determine which week to return:
             0 = this week, 1 = next week, 2 = two weeks from now, etc.
 
+    The list depends on the current date, which is therefore part of the response cache key.
+
     :param shift: int: Determine the shift in days from today
-    :param db: Session: Get the database session
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the user id of the current logged in user
     :return: A list of contacts with birthday in the next 7 days
     :doc-author: Trelent
     """
+    cache_key = await response_cache.key(current_user.id, "birthdays", shift=shift, today=date.today())
+    cached = await response_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached[0])
     contacts = await repository_contacts.get_birthday_list(current_user, shift, db)
     if contacts is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-    return contacts
+    body = dump_many(ContactResponse, contacts)
+    await response_cache.set(cache_key, body)
+    return json_response(body)
 
 
 @search.get("/find/{partial_info}", response_model=List[ContactResponse],
             description='No more than 10 requests per minute',
             dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def find_contacts_by_partial_info(partial_info: str, db: Session = Depends(get_db),
-                                  current_user: User = Depends(auth_service.get_current_user)):
+async def find_contacts_by_partial_info(partial_info: str, limit: int | None = Query(None, ge=1, le=500),
+                                        offset: int = Query(0, ge=0), db: AsyncSession = Depends(get_read_db),
+                                        current_user: User = Depends(auth_service.get_current_user)):
     """
     The find_contacts_by_partial_info function is used to find contacts by partial information.
         The function takes in a string of partial information and returns a list of users that match the search criteria.
 
+    Results are kept in the response cache until the user changes a contact.
+    limit and offset page through the matches in id order; without limit all matches are returned.
+
     :param partial_info: str: Search for users by their name, email or phone number
-    :param db: Session: Get the database session
+    :param limit: int | None: Maximum number of contacts in the response
+    :param offset: int: Number of matches to skip
+    :param db: AsyncSession: Get the database session
     :param current_user: User: Get the current user
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = await repository_contacts.get_users_by_partial_info(current_user, partial_info, db)
+    cache_key = await response_cache.key(current_user.id, "find", partial_info=partial_info, limit=limit,
+                                       offset=offset)
+    cached = await response_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached[0])
+    contacts = await repository_contacts.get_users_by_partial_info(current_user, partial_info, db, limit, offset)
     if contacts is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Users not found")
-    return contacts
+    body = dump_many(ContactResponse, contacts)
+    await response_cache.set(cache_key, body)
+    return json_response(body)
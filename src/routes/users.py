@@ -1,7 +1,7 @@
 import cloudinary
 import cloudinary.uploader
 from fastapi import APIRouter, Depends, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf.config import settings
 from src.database.db import get_db
@@ -27,18 +27,18 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
 
 @router.patch('/avatar', response_model=UserResponse)
 async def update_avatar_user(file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user),
-                             db: Session = Depends(get_db)):
+                             db: AsyncSession = Depends(get_db)):
     """
     The update_avatar_user function updates the avatar of a user.
         The function takes in an UploadFile object, which is a file that has been uploaded to the server.
-        It also takes in a User object and Session object as dependencies.
+        It also takes in a User object and AsyncSession object as dependencies.
 
         The function first configures cloudinary with our cloudinary account information, then uploads the file to
             our RestContacts folder on Cloudinary using its public_id (which is set to be equal to RestContacts/username).
 
     :param file: UploadFile: Upload the file to cloudinary
     :param current_user: User: Get the current user
-    :param db: Session: Pass the database session to the repository function
+    :param db: AsyncSession: Pass the database session to the repository function
     :return: A user object, but the avatar is not updated in the database
     :doc-author: Trelent
     """
@@ -53,4 +53,5 @@ async def update_avatar_user(file: UploadFile = File(), current_user: User = Dep
     src_url = cloudinary.CloudinaryImage(f'RestContacts/{current_user.username}') \
         .build_url(width=250, height=250, crop='fill', version=r.get('version'))
     user = await repository_users.update_avatar(current_user.email, src_url, db)
+    await auth_service.forget_user(current_user.email)
     return user
@@ -1,6 +1,7 @@
 import datetime
+from typing import List, Literal
 
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, root_validator
 
 from src.database.models import Role
 
@@ -10,7 +11,7 @@ class ContactModel(BaseModel):
     lastname: str = Field(default='Unknown', min_length=2, max_length=50)
     email: EmailStr
     phone: str = Field(default='+380001234567', min_length=10, max_length=15)
-    birthday: datetime.date = Field(default='2023-04-04')
+    birthday: datetime.date = Field(default=datetime.date(2023, 4, 4))
     additional_info: str = Field(default='nothing yet', min_length=1, max_length=150)
     is_favorite: bool = False
 
@@ -35,6 +36,51 @@ class ContactResponse(BaseModel):
         orm_mode = True
 
 
+class ContactImportError(BaseModel):
+    row: int
+    error: str
+
+
+class ContactImportResponse(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[ContactImportError]
+
+
+class ContactBatchOperation(BaseModel):
+    op: Literal['create', 'update', 'delete', 'favorite']
+    id: int | None = Field(default=None, ge=1)
+    contact: ContactModel | None = None
+    is_favorite: bool | None = None
+
+    @root_validator(skip_on_failure=True)
+    def check_fields(cls, values):
+        op = values['op']
+        if op != 'create' and values['id'] is None:
+            raise ValueError(f"'{op}' needs an id")
+        if op in ('create', 'update') and values['contact'] is None:
+            raise ValueError(f"'{op}' needs a contact")
+        if op == 'favorite' and values['is_favorite'] is None:
+            raise ValueError("'favorite' needs is_favorite")
+        return values
+
+
+class ContactBatchRequest(BaseModel):
+    get: List[int] = Field(default=[], max_items=1000, description='Ids of contacts to return after the operations')
+    operations: List[ContactBatchOperation] = Field(default=[], max_items=1000)
+
+
+class ContactBatchResult(BaseModel):
+    op: str
+    id: int
+    contact: ContactResponse | None
+
+
+class ContactBatchResponse(BaseModel):
+    results: List[ContactBatchResult]
+    contacts: List[ContactResponse]
+
+
 class UserModel(BaseModel):
     username: str = Field(min_length=4, max_length=12)
     email: EmailStr
@@ -1,32 +1,144 @@
-import pickle
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
-import redis as redis
+import redis.asyncio as redis
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import instrumentation
 
 from src.conf import messages
 from src.conf.config import settings
 from src.database.db import get_db
+from src.database.models import User, Role
 from src.repository import users as repository_users
+from src.services import passwords
+from src.services.lru_cache import LRUCache
+
+
+def password_workers() -> int:
+    """
+    The password_workers function returns the number of processes that hash passwords for this web worker.
+    By default the cores but one are shared out between the settings.web_concurrency web workers of the host,
+    so the event loops keep a core and the hashing processes of all workers together do not exceed the cores.
+
+    :return: settings.password_hash_workers, or this worker's share of the cores minus one, at least 1
+    """
+    if settings.password_hash_workers:
+        return settings.password_hash_workers
+    return max(1, ((os.cpu_count() or 1) - 1) // max(settings.web_concurrency, 1))
+
+
+# bcrypt runs in separate processes: threads still share the GIL and the core of the event loop with it.
+# The pool belongs to the lifespan of the application; without it, e.g. in scripts, hashing runs on a thread.
+password_executor: ProcessPoolExecutor | None = None
+
+
+def start_password_executor() -> ProcessPoolExecutor:
+    """
+    The start_password_executor function creates the process pool that hashes passwords.
+    forkserver workers start from a clean interpreter instead of a copy of the running application.
+
+    :return: The pool
+    """
+    global password_executor
+    context = multiprocessing.get_context(
+        'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+    password_executor = ProcessPoolExecutor(max_workers=password_workers(), mp_context=context)
+    return password_executor
+
+
+def shutdown_password_executor() -> None:
+    """
+    The shutdown_password_executor function stops the processes of the pool, waiting for running hashes.
+
+    :return: None
+    """
+    global password_executor
+    executor, password_executor = password_executor, None
+    if executor is not None:
+        executor.shutdown()
+
+
+USER_CACHE_VERSION = 1
+USER_CACHE_FIELDS = ('id', 'username', 'email', 'password', 'refresh_token', 'password_reset_token', 'avatar',
+                     'roles', 'confirmed', 'created_at', 'updated_at')
+
+
+def dump_user(user: User) -> bytes:
+    """
+    The dump_user function serializes the columns of a user into a compact JSON array.
+    The first item is the schema version, so entries written by an older layout are ignored instead of misread.
+
+    :param user: User: The user to serialize
+    :return: The serialized user
+    """
+    roles = user.roles.value if isinstance(user.roles, Role) else user.roles
+    created_at = user.created_at.isoformat() if user.created_at else None
+    updated_at = user.updated_at.isoformat() if user.updated_at else None
+    row = [USER_CACHE_VERSION, user.id, user.username, user.email, user.password, user.refresh_token,
+           user.password_reset_token, user.avatar, roles, user.confirmed, created_at, updated_at]
+    return json.dumps(row, separators=(',', ':')).encode()
+
+
+def load_user_fields(data: bytes) -> dict | None:
+    """
+    The load_user_fields function parses data written by dump_user.
+
+    :param data: bytes: The serialized user
+    :return: A dictionary of column values, or None if the data has another schema version or is malformed
+    """
+    try:
+        version, *row = json.loads(data)
+    except (ValueError, TypeError):
+        return None
+    if version != USER_CACHE_VERSION or len(row) != len(USER_CACHE_FIELDS):
+        return None
+    fields = dict(zip(USER_CACHE_FIELDS, row))
+    fields['roles'] = Role(fields['roles']) if fields['roles'] else None
+    for name in ('created_at', 'updated_at'):
+        if fields[name]:
+            fields[name] = datetime.fromisoformat(fields[name])
+    return fields
+
+
+def user_from_fields(fields: dict) -> User:
+    """
+    The user_from_fields function builds a detached User from cached column values.
+    The values are written straight into the instance dictionary, skipping the instrumented constructor,
+    which costs more than the whole cache lookup.
+
+    :param fields: dict: Column values returned by load_user_fields
+    :return: A new User instance that is not attached to any session
+    """
+    user = instrumentation.manager_of_class(User).new_instance()
+    user.__dict__.update(fields)
+    return user
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = passwords.pwd_context
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    r: redis.Redis | None = None
+    user_cache = LRUCache(settings.user_cache_size, ttl=settings.user_cache_local_ttl)
+    token_cache = LRUCache(settings.token_cache_size)
 
-    def verify_password(self, plain_password, hashed_password):
+    async def verify_password(self, plain_password, hashed_password):
         """
         The verify_password function takes a plain-text password and hashed
         password as arguments. It then uses the pwd_context object to verify that the
         plain-text password matches the hashed one.
+        The check runs on password_executor so it does not block the event loop.
 
         :param self: Make the function a method of the user class
         :param plain_password: Take in the password that is entered by the user
@@ -34,19 +146,22 @@ class Auth:
         :return: A boolean value
         :doc-author: Trelent
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await asyncio.get_running_loop().run_in_executor(password_executor, passwords.verify_password,
+                                                                plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
+    async def get_password_hash(self, password: str):
         """
         The get_password_hash function takes a password as input and returns the hash of that password.
         The hash is generated using the pwd_context object, which is an instance of Flask-Bcrypt's Bcrypt class.
+        Hashing runs on password_executor so it does not block the event loop.
 
         :param self: Represent the instance of the class
         :param password: str: Pass in the password that we want to hash
         :return: A hash of the password
         :doc-author: Trelent
         """
-        return self.pwd_context.hash(password)
+        return await asyncio.get_running_loop().run_in_executor(password_executor, passwords.hash_password,
+                                                                password)
 
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
         """
@@ -92,15 +207,44 @@ class Auth:
         encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_refresh_token
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    def decode_access_token(self, token: str) -> dict | None:
+        """
+        The decode_access_token function verifies a JWT and returns its claims.
+        Verified claims are kept in token_cache, keyed by the SHA-256 digest of the token, until the token's exp,
+        so repeated requests with the same bearer token skip parsing and the signature check.
+        Hit and miss counters are available from token_cache.stats().
+
+        :param self: Represent the instance of the class
+        :param token: str: The encoded token
+        :return: The claims, or None if the token is invalid or expired
+        """
+        digest = hashlib.sha256(token.encode()).digest()
+        payload = self.token_cache.get(digest)
+        if payload is None:
+            try:
+                payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            except JWTError:
+                return None
+            ttl = payload.get("exp", 0) - time.time()
+            if ttl > 0:
+                self.token_cache.set(digest, payload, ttl=ttl)
+        return payload
+
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
         """
         The get_current_user function is a dependency that will be used in the
             protected endpoints. It takes a token as an argument and returns the user
             if it's valid, otherwise raises an HTTPException with status code 401.
+            Verified token claims are cached by decode_access_token.
+            Users are cached in two tiers: a short-lived in-process LRU in front of Redis,
+            both holding the compact dump_user serialization rather than pickled ORM objects.
+            The Redis tier uses the shared async client set up in the application lifespan
+            and is skipped while no client is set.
+            The returned user is a new detached instance on every call.
 
         :param self: Refer to the class itself
         :param token: str: Pass the token to the function
-        :param db: Session: Get the database session
+        :param db: AsyncSession: Get the database session
         :return: A user object
         :doc-author: Trelent
         """
@@ -110,28 +254,41 @@ class Auth:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-        try:
-            # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload.get("scope") == "access_token":
-                email = payload.get("sub")
-                if email is None:
-                    raise credentials_exception
-            else:
-                raise credentials_exception
-        except JWTError as e:
+        payload = self.decode_access_token(token)
+        if payload is None or payload.get("scope") != "access_token":
+            raise credentials_exception
+        email = payload.get("sub")
+        if email is None:
             raise credentials_exception
 
-        user = self.r.get(f"user:{email}")
-        if user is None:
-            user = await repository_users.get_user_by_email(email, db)
-            if user is None:
-                raise credentials_exception
-            self.r.set(f"user:{email}", pickle.dumps(user))
-            self.r.expire(f"user:{email}", 900)
-        else:
-            user = pickle.loads(user)
-        return user
+        fields = self.user_cache.get(email)
+        if fields is None:
+            key = f"user:v{USER_CACHE_VERSION}:{email}"
+            data = await self.r.get(key) if self.r is not None else None
+            fields = load_user_fields(data) if data is not None else None
+            if fields is None:
+                user = await repository_users.get_user_by_email(email, db)
+                if user is None:
+                    raise credentials_exception
+                data = dump_user(user)
+                if self.r is not None:
+                    await self.r.set(key, data, ex=settings.user_cache_ttl)
+                fields = load_user_fields(data)
+            self.user_cache.set(email, fields)
+        return user_from_fields(fields)
+
+    async def forget_user(self, email: str) -> None:
+        """
+        The forget_user function drops a user from both cache tiers after the user has been changed.
+        Other worker processes keep their in-process copy until user_cache_local_ttl runs out.
+
+        :param self: Represent the instance of the class
+        :param email: str: Email of the changed user
+        :return: None
+        """
+        self.user_cache.pop(email)
+        if self.r is not None:
+            await self.r.delete(f"user:v{USER_CACHE_VERSION}:{email}")
 
     async def decode_refresh_token(self, refresh_token: str):
         """
@@ -197,24 +354,27 @@ class Auth:
 
 
 class AuthPassword:
-    pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+    pwd_context = passwords.pwd_context
 
-    def get_hash_password(self, password: str):
+    async def get_hash_password(self, password: str):
         """
         The get_hash_password function takes a password as an argument and returns the hashed version of that password.
         The hash is generated using the pwd_context object's hash method, which uses bcrypt to generate a secure hash.
+        Hashing runs on password_executor so it does not block the event loop.
 
         :param self: Represent the instance of the class
         :param password: str: Pass the password entered by the user to be hashed
         :return: A hash of the password
         :doc-author: Trelent
         """
-        return self.pwd_context.hash(password)
+        return await asyncio.get_running_loop().run_in_executor(password_executor, passwords.hash_password,
+                                                                password)
 
-    def verify_password(self, password: str, hashed_password: str):
+    async def verify_password(self, password: str, hashed_password: str):
         """
         The verify_password function takes a plain-text password and hashed password as arguments.
         It then uses the verify method of the pwd_context object to check if they match.
+        The check runs on password_executor so it does not block the event loop.
 
         :param self: Represent the instance of the class
         :param password: str: Pass in the password that the user has entered
@@ -222,7 +382,8 @@ class AuthPassword:
         :return: True if the password is correct, and false otherwise
         :doc-author: Trelent
         """
-        return self.pwd_context.verify(password, hashed_password)
+        return await asyncio.get_running_loop().run_in_executor(password_executor, passwords.verify_password,
+                                                                password, hashed_password)
 
 
 auth_service = Auth()
@@ -0,0 +1,155 @@
+import csv
+import io
+import json
+import threading
+from datetime import date, datetime
+from typing import AsyncIterator, BinaryIO, Iterator, Sequence
+
+from pydantic import ValidationError
+
+from src.schemas import ContactModel
+from src.services.serializers import dumps
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_COLUMNS = ('id', 'firstname', 'lastname', 'email', 'phone', 'birthday', 'additional_info', 'is_favorite',
+                  'created_at', 'updated_at')
+EXPORT_MEDIA_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+
+class ImportReport:
+    def __init__(self, max_errors: int = 100):
+        """
+        The __init__ function creates an empty import report.
+        Only the first max_errors errors are kept with their row numbers, the rest are only counted,
+        so a broken file of any size cannot grow the report without bound.
+
+        :param self: Represent the instance of the class
+        :param max_errors: int: Number of errors kept in detail
+        :return: The instance of the class
+        """
+        self.max_errors = max_errors
+        self.inserted = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+        self._lock = threading.Lock()
+
+    def error(self, row: int, message: str) -> None:
+        """
+        The error function records a rejected row. It may be called from the thread that parses the file.
+
+        :param self: Represent the instance of the class
+        :param row: int: Number of the row in the file, counting data rows from 1
+        :param message: str: Why the row was rejected
+        :return: None
+        """
+        with self._lock:
+            self.failed += 1
+            if len(self.errors) < self.max_errors:
+                self.errors.append({"row": row, "error": message})
+
+
+def detect_format(filename: str | None, content_type: str | None) -> str | None:
+    """
+    The detect_format function guesses the format of an uploaded file from its name or content type.
+
+    :param filename: str | None: Name of the uploaded file
+    :param content_type: str | None: Content type sent by the client
+    :return: 'csv', 'ndjson' or None if the format is unknown
+    """
+    name = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith('.csv') or content_type.startswith('text/csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    return None
+
+
+def read_records(file: BinaryIO, fmt: str, report: ImportReport) -> Iterator[tuple[int, dict]]:
+    """
+    The read_records function reads the raw records of a CSV (with a header row) or NDJSON file one at a time.
+    Empty CSV cells and blank NDJSON lines are skipped, so missing values fall back to the model defaults.
+    Lines that cannot be parsed are recorded in the report. Bytes that are not UTF-8 end the file: the row
+    after the last one read is recorded as failed, and the rows before it are still imported.
+
+    :param file: BinaryIO: The uploaded file
+    :param fmt: str: 'csv' or 'ndjson'
+    :param report: ImportReport: Collects the rejected rows
+    :return: An iterator of (row number, record) pairs
+    """
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    row = 0
+    try:
+        if fmt == 'csv':
+            for record in csv.DictReader(text):
+                row += 1
+                yield row, {key: value for key, value in record.items() if key and value not in ('', None)}
+            return
+        for line in text:
+            if not line.strip():
+                continue
+            row += 1
+            try:
+                record = json.loads(line)
+            except ValueError as err:
+                report.error(row, f"invalid JSON: {err}")
+                continue
+            if not isinstance(record, dict):
+                report.error(row, "expected a JSON object")
+                continue
+            yield row, record
+    except UnicodeDecodeError as err:
+        # the file is decoded in blocks, so the bad bytes are at this row or a few rows after it
+        report.error(row + 1, f"the file must be UTF-8 encoded, the import stopped here: {err}")
+    finally:
+        # leave the upload open, its owner closes it
+        text.detach()
+
+
+def parse_contacts(file: BinaryIO, fmt: str, report: ImportReport) -> Iterator[tuple[int, ContactModel]]:
+    """
+    The parse_contacts function validates the records of an uploaded file against ContactModel.
+    Rows that fail validation are recorded in the report and skipped.
+
+    :param file: BinaryIO: The uploaded file
+    :param fmt: str: 'csv' or 'ndjson'
+    :param report: ImportReport: Collects the rejected rows
+    :return: An iterator of (row number, contact) pairs
+    """
+    for row, record in read_records(file, fmt, report):
+        try:
+            yield row, ContactModel(**record)
+        except ValidationError as err:
+            report.error(row, "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in err.errors()))
+
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+async def encode_contacts(batches: AsyncIterator[Sequence[tuple]], fmt: str) -> AsyncIterator[bytes]:
+    """
+    The encode_contacts function encodes batches of EXPORT_COLUMNS rows as CSV (with a header row) or NDJSON.
+    Rows are encoded one by one and every batch becomes one chunk of the response body,
+    so memory is bounded by the batch size rather than the number of contacts.
+
+    :param batches: AsyncIterator[Sequence[tuple]]: Batches of rows, e.g. from repository.contacts.stream_contacts
+    :param fmt: str: 'csv' or 'ndjson'
+    :return: An async iterator of encoded chunks
+    """
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        async for batch in batches:
+            for row in batch:
+                writer.writerow([_export_value(value) for value in row])
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+        return
+    # NDJSON rows are encoded with orjson like the JSON responses, dates and datetimes included
+    async for batch in batches:
+        yield b''.join(dumps(dict(zip(EXPORT_COLUMNS, row))) + b'\n' for row in batch)
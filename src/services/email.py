@@ -1,54 +1,229 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from email.message import EmailMessage
+from email.utils import formataddr
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
-from pydantic import EmailStr
+import aiosmtplib
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 
 from src.conf.config import settings
 from src.services.auth import auth_service
 
+# templates are compiled on first use and kept in the environment's cache; auto_reload off skips the mtime checks
+templates = Environment(loader=FileSystemLoader(Path(__file__).parent / 'templates'),
+                        autoescape=select_autoescape(['html']), auto_reload=False)
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=EmailStr(settings.mail_username),
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME="Our service feedback",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+# errors after which the connection can't be trusted anymore; a rejected message (SMTPResponseException) is not one
+CONNECTION_ERRORS = (aiosmtplib.SMTPServerDisconnected, OSError)
+# the server refused a message and aiosmtplib reset the envelope, the session can send the next one
+REPLY_ERRORS = (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused)
 
 
-async def send_email(email: EmailStr, username: str, host: str, payload: dict):
+class PooledConnection:
+    __slots__ = ('client', 'sent', 'last_used')
+
+    def __init__(self, client: aiosmtplib.SMTP):
+        self.client = client
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    def __init__(self, hostname: str, port: int, username: str | None = None, password: str | None = None,
+                 use_tls: bool = True, start_tls: bool = False, validate_certs: bool = True, size: int = 2,
+                 max_messages: int = 100, idle_timeout: float = 60, timeout: float = 10):
+        """
+        The __init__ function creates a pool of authenticated SMTP connections.
+        Connections are opened on demand, at most size at a time, and kept open between messages,
+        so the TCP and TLS handshakes and the login are paid once per connection instead of once per message.
+        A connection is closed after max_messages messages, since servers limit messages per session,
+        and is not reused after idle_timeout seconds without traffic, since servers drop idle sessions.
+
+        :param self: Represent the instance of the class
+        :param hostname: str: SMTP server
+        :param port: int: Port of the server
+        :param username: str | None: Login, None to send without authentication
+        :param password: str | None: Password of the login
+        :param use_tls: bool: Connect with implicit TLS (port 465)
+        :param start_tls: bool: Upgrade a plain connection with STARTTLS (port 587)
+        :param validate_certs: bool: Check the certificate of the server
+        :param size: int: Maximum number of open connections
+        :param max_messages: int: Messages sent over one connection before it is replaced
+        :param idle_timeout: float: Seconds an unused connection is kept for reuse
+        :param timeout: float: Timeout of every SMTP operation in seconds
+        :return: The instance of the class
+        """
+        self.options = {"hostname": hostname, "port": port, "use_tls": use_tls, "start_tls": start_tls,
+                        "validate_certs": validate_certs, "timeout": timeout}
+        self.username = username
+        self.password = password
+        self.size = size
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.idle: list[PooledConnection] = []
+        self.slots = asyncio.Semaphore(size)
+        self.in_use = 0
+        self.connects = 0
+        self.reconnects = 0
+        self.sent = 0
+        self.errors = 0
+
+    async def _connect(self) -> PooledConnection:
+        client = aiosmtplib.SMTP(**self.options)
+        await client.connect()
+        try:
+            if self.username:
+                await client.login(self.username, self.password)
+        except BaseException:
+            client.close()
+            raise
+        self.connects += 1
+        return PooledConnection(client)
+
+    @staticmethod
+    async def _close(connection: PooledConnection) -> None:
+        try:
+            await connection.client.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            connection.client.close()
+
+    async def _take(self) -> PooledConnection:
+        # the most recently used connection is the least likely to have been dropped by the server
+        while self.idle:
+            connection = self.idle.pop()
+            if connection.client.is_connected and time.monotonic() - connection.last_used < self.idle_timeout:
+                return connection
+            await self._close(connection)
+        return await self._connect()
+
+    async def _release(self, connection: PooledConnection) -> None:
+        connection.last_used = time.monotonic()
+        if connection.client.is_connected and connection.sent < self.max_messages:
+            self.idle.append(connection)
+        else:
+            await self._close(connection)
+
+    @asynccontextmanager
+    async def connection(self):
+        """
+        The connection function lends a connection of the pool, waiting while all size connections are in use.
+        The connection is returned to the pool afterwards, also when the server refused a message,
+        unless it broke, was cancelled mid-command or reached max_messages.
+
+        :param self: Represent the instance of the class
+        :return: An async context manager of a PooledConnection
+        """
+        async with self.slots:
+            connection = await self._take()
+            self.in_use += 1
+            try:
+                yield connection
+            except BaseException as err:
+                if not isinstance(err, REPLY_ERRORS):
+                    connection.client.close()
+                raise
+            finally:
+                self.in_use -= 1
+                await self._release(connection)
+
+    async def _reconnect(self, connection: PooledConnection) -> None:
+        connection.client.close()
+        self.reconnects += 1
+        connection.client = (await self._connect()).client
+        connection.sent = 0
+
+    async def send(self, *messages: EmailMessage) -> None:
+        """
+        The send function sends messages one after another over one connection of the pool.
+        Every message still takes its own MAIL, RCPT and DATA round trips: aiosmtplib has no command
+        pipelining (RFC 2920), so the pool saves the connection setup only, and send_many gets its throughput
+        from using all connections at once.
+        A message that fails because the connection broke is sent again over a new connection once,
+        so a message may rarely be delivered twice but is not lost to a stale connection.
+
+        :param self: Represent the instance of the class
+        :param messages: EmailMessage: Messages with their sender and recipients set
+        :return: None
+        """
+        try:
+            async with self.connection() as connection:
+                for message in messages:
+                    try:
+                        await connection.client.send_message(message)
+                    except CONNECTION_ERRORS:
+                        await self._reconnect(connection)
+                        await connection.client.send_message(message)
+                    connection.sent += 1
+                    self.sent += 1
+        except (aiosmtplib.SMTPException, OSError):
+            self.errors += 1
+            raise
+
+    async def send_many(self, messages: list[EmailMessage]) -> None:
+        """
+        The send_many function spreads messages over all connections of the pool, each sending its share in turn.
+
+        :param self: Represent the instance of the class
+        :param messages: list[EmailMessage]: Messages with their sender and recipients set
+        :return: None
+        """
+        await asyncio.gather(*(self.send(*messages[start::self.size]) for start in range(self.size)))
+
+    async def close(self) -> None:
+        """
+        The close function ends the sessions of all idle connections.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        idle, self.idle = self.idle, []
+        await asyncio.gather(*(self._close(connection) for connection in idle))
+
+    def stats(self) -> dict:
+        return {"connects": self.connects, "reconnects": self.reconnects, "sent": self.sent, "errors": self.errors,
+                "idle": len(self.idle), "in_use": self.in_use}
+
+
+mailer = SMTPPool(settings.mail_server, settings.mail_port, settings.mail_username, settings.mail_password,
+                  use_tls=True, size=settings.mail_pool_size, max_messages=settings.mail_max_messages_per_connection,
+                  timeout=settings.mail_timeout)
+
+
+def render(template_name: str, **context) -> str:
     """
-    The send_email function is used to send an email to a user.
-        It takes in the following parameters:
-            - email: The recipient's email address.
-            - username: The recipient's username. This will be used for personalization purposes in the template body of the message being sent out.
-            - host: The hostname of where this service is running on (e.g., http://localhost). This will be used for personalization purposes in the template body of the message being sent out, as well as for generating a link that can be clicked by users to verify their emails and complete registration/password reset processes
-
-    :param email: EmailStr: Validate the email address
-    :param username: str: Pass the username to the template
-    :param host: str: Pass the hostname of the server to the template
-    :param payload: dict: Pass the subject, template_name and other parameters
-    :return: A coroutine object, which is a special kind of iterator
-    :doc-author: Trelent
+    The render function fills an email template, compiling it only the first time it is used.
+
+    :param template_name: str: File name of the template in the templates folder
+    :param context: Values used by the template
+    :return: The HTML body
     """
-    try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject=payload["subject"],
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name=payload["template_name"])
-    except ConnectionErrors as err:
-        print(err)
+    return templates.get_template(template_name).render(**context)
+
+
+def build_message(email: str, subject: str, html: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = formataddr(("Our service feedback", settings.mail_username))
+    message["To"] = email
+    message["Subject"] = subject
+    message.set_content(html, subtype="html")
+    return message
+
 
+async def deliver(email: str, username: str, host: str, subject: str, template_name: str) -> None:
+    """
+    The deliver function renders a template with a new email token and sends it over the mailer.
+    It raises the SMTP and connection errors, so the outbox worker can retry.
+
+    :param email: str: Address of the recipient
+    :param username: str: Name of the recipient, used by the template
+    :param host: str: Base URL of the service, used for the links of the template
+    :param subject: str: Subject of the email
+    :param template_name: str: File name of the template in the templates folder
+    :return: None
+    """
+    token_verification = auth_service.create_email_token({"sub": email})
+    html = render(template_name, host=host, username=username, token=token_verification)
+    await mailer.send(build_message(email, subject, html))
 
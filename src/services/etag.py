@@ -0,0 +1,67 @@
+import hashlib
+from datetime import datetime
+
+from fastapi import Response, status
+
+
+def make_etag(*parts) -> str:
+    """
+    The make_etag function builds a strong entity tag from the values that identify a version of a resource.
+
+    :param parts: Values such as ids, timestamps and counts
+    :return: A quoted entity tag
+    """
+    value = "|".join(part.isoformat() if isinstance(part, datetime) else str(part) for part in parts)
+    return '"' + hashlib.sha1(value.encode()).hexdigest() + '"'
+
+
+def contact_etag(contact_id: int, updated_at: datetime | None) -> str:
+    """
+    The contact_etag function returns the entity tag of a single contact.
+
+    :param contact_id: int: Id of the contact
+    :param updated_at: datetime | None: Last modification time of the contact
+    :return: A quoted entity tag
+    """
+    return make_etag("contact", contact_id, updated_at)
+
+
+def page_etag(count: int, max_updated_at: datetime | None, id_sum: int | None, last_id: int | None) -> str:
+    """
+    The page_etag function returns the entity tag of a page of contacts.
+    Edits move the newest updated_at, deletions and insertions change the count or the ids on the page.
+
+    :param count: int: Number of contacts on the page
+    :param max_updated_at: datetime | None: Newest modification time on the page
+    :param id_sum: int | None: Sum of the ids on the page
+    :param last_id: int | None: Id of the last contact on the page
+    :return: A quoted entity tag
+    """
+    return make_etag("contacts", count, max_updated_at, id_sum or 0, last_id)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    The etag_matches function checks an If-None-Match header against the current entity tag,
+    using the weak comparison that RFC 9110 prescribes for If-None-Match.
+
+    :param if_none_match: str | None: Value of the If-None-Match header
+    :param etag: str: Current entity tag
+    :return: True if the client's copy is current
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str, headers: dict | None = None) -> Response:
+    """
+    The not_modified function builds an empty 304 response carrying the entity tag.
+
+    :param etag: str: Current entity tag
+    :param headers: dict | None: Other headers to keep, such as Link
+    :return: A 304 response
+    """
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={**(headers or {}), "ETag": etag})
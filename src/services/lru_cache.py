@@ -0,0 +1,143 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class LRUCache:
+    def __init__(self, maxsize: int, ttl: float | None = None, weigher: Callable[[Any], int] | None = None):
+        """
+        The __init__ function creates an in-process least recently used cache.
+        Capacity is counted in weight units: every entry weighs 1 unless a weigher is given,
+        and the least recently used entries are evicted until the total weight fits into maxsize.
+
+        :param self: Represent the instance of the class
+        :param maxsize: int: Maximum total weight of the cached values
+        :param ttl: float | None: Default lifetime of an entry in seconds, None keeps entries until evicted
+        :param weigher: Callable[[Any], int] | None: Function returning the weight of a value
+        :return: The instance of the class
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weigher = weigher
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict[Hashable, tuple[Any, float | None, int]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        The get function returns the cached value and marks it as recently used.
+        Expired entries are dropped and reported as a miss.
+
+        :param self: Represent the instance of the class
+        :param key: Hashable: Key of the entry
+        :param default: Any: Value returned on a miss
+        :return: The cached value or default
+        """
+        entry = self._data.get(key)
+        if entry is not None:
+            value, expire_at, _ = entry
+            if expire_at is None or expire_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            self.pop(key)
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """
+        The set function stores a value and evicts the least recently used entries while the cache is over capacity.
+        A value heavier than the whole cache is not stored.
+
+        :param self: Represent the instance of the class
+        :param key: Hashable: Key of the entry
+        :param value: Any: Value to cache
+        :param ttl: float | None: Lifetime of this entry in seconds, defaults to the cache ttl
+        :return: None
+        """
+        self.pop(key)
+        weight = self.weigher(value) if self.weigher else 1
+        if weight > self.maxsize:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expire_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (value, expire_at, weight)
+        self.weight += weight
+        self._evict()
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """
+        The peek function returns a cached value without touching recency or the hit counters.
+
+        :param self: Represent the instance of the class
+        :param key: Hashable: Key of the entry
+        :param default: Any: Value returned when the key is not cached
+        :return: The cached value or default
+        """
+        entry = self._data.get(key)
+        return entry[0] if entry is not None else default
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        The pop function removes an entry from the cache.
+
+        :param self: Represent the instance of the class
+        :param key: Hashable: Key of the entry
+        :param default: Any: Value returned when the key is not cached
+        :return: The removed value or default
+        """
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return default
+        self.weight -= entry[2]
+        return entry[0]
+
+    def resize(self, key: Hashable) -> None:
+        """
+        The resize function recomputes the weight of a value that was changed in place.
+
+        :param self: Represent the instance of the class
+        :param key: Hashable: Key of the entry
+        :return: None
+        """
+        entry = self._data.get(key)
+        if entry is not None and self.weigher:
+            value, expire_at, weight = entry
+            new_weight = self.weigher(value)
+            self._data[key] = (value, expire_at, new_weight)
+            self.weight += new_weight - weight
+            self._evict()
+
+    def _evict(self) -> None:
+        while self.weight > self.maxsize:
+            _, (_, _, evicted_weight) = self._data.popitem(last=False)
+            self.weight -= evicted_weight
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        The clear function drops every entry but keeps the counters.
+
+        :param self: Represent the instance of the class
+        :return: None
+        """
+        self._data.clear()
+        self.weight = 0
+
+    def stats(self) -> dict:
+        """
+        The stats function reports the size of the cache and its hit, miss and eviction counters.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the counters
+        """
+        return {"entries": len(self._data), "weight": self.weight, "maxsize": self.maxsize, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
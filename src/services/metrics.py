@@ -0,0 +1,406 @@
+import argparse
+import asyncio
+import bisect
+import json
+import os
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+from src.conf.config import settings
+
+sources: dict[str, Callable[[], dict]] = {}
+collectors: list[Callable[[], None]] = []
+REGISTRY: dict[str, 'Metric'] = {}
+
+# upper bounds in seconds of latency histograms, the last bucket is unbounded
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+# snapshot files of exited workers are folded into this one, so the directory does not grow with every restart
+EXITED_SNAPSHOT = 'exited.json'
+
+
+def register(name: str, source: Callable[[], dict]) -> None:
+    """
+    The register function adds a component to the metrics surface of the application.
+
+    :param name: str: Name of the component, e.g. db_pool
+    :param source: Callable[[], dict]: Returns the current metrics of the component
+    :return: None
+    """
+    sources[name] = source
+
+
+def collect() -> dict:
+    """
+    The collect function reads the current metrics of every registered component.
+
+    :return: A dictionary of metrics by component name
+    """
+    return {name: source() for name, source in sources.items()}
+
+
+def add_collector(collector: Callable[[], None]) -> None:
+    """
+    The add_collector function registers a function that copies the counters of a component
+    (a cache, the connection pool) into Prometheus metrics right before they are exported.
+
+    :param collector: Callable[[], None]: Sets the values of some metrics
+    :return: None
+    """
+    collectors.append(collector)
+
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        """
+        The __init__ function creates a metric and adds it to the registry.
+        Series are kept per tuple of label values, in the order of labelnames.
+
+        :param self: Represent the instance of the class
+        :param name: str: Name of the metric
+        :param documentation: str: Help text of the metric
+        :param labelnames: Iterable[str]: Names of the labels
+        :return: The instance of the class
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.series: dict[tuple, float] = {}
+        REGISTRY[name] = self
+
+    def set(self, value: float, *labels) -> None:
+        self.series[labels] = value
+
+    def dump(self) -> dict:
+        return {"type": self.type, "help": self.documentation, "labels": self.labelnames,
+                "series": [[list(labels), value] for labels, value in self.series.items()]}
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.series[labels] = self.series.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        """
+        The __init__ function creates a histogram.
+        Every series is a list with the count of each bucket (not cumulative) followed by the sum,
+        so an observation is one bisect and two additions.
+
+        :param self: Represent the instance of the class
+        :param name: str: Name of the metric
+        :param documentation: str: Help text of the metric
+        :param labelnames: Iterable[str]: Names of the labels
+        :param buckets: tuple: Sorted upper bounds, ending with infinity
+        :return: The instance of the class
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def dump(self) -> dict:
+        return {**super().dump(), "buckets": [bucket_label(bound) for bound in self.buckets]}
+
+
+def bucket_label(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+def snapshot() -> dict:
+    """
+    The snapshot function runs the collectors and returns every metric of this process in a JSON-compatible form.
+
+    :return: A dictionary of dumped metrics by name
+    """
+    for collector in collectors:
+        collector()
+    return {name: metric.dump() for name, metric in REGISTRY.items()}
+
+
+def merge(snapshots: Iterable[tuple[dict, bool]]) -> dict:
+    """
+    The merge function adds up the snapshots of several worker processes.
+    Counters and histograms of exited workers are kept, so totals never go down;
+    gauges describe the present and are only taken from workers that are still running.
+
+    :param snapshots: Iterable[tuple[dict, bool]]: Snapshots, each with whether its process is alive
+    :return: A snapshot with the summed series
+    """
+    merged = {}
+    for dumped, alive in snapshots:
+        for name, metric in dumped.items():
+            target = merged.setdefault(name, {**metric, "series": {}})
+            if metric["type"] == 'gauge' and not alive:
+                continue
+            for labels, value in metric["series"]:
+                key = tuple(labels)
+                current = target["series"].get(key)
+                if current is None:
+                    target["series"][key] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    target["series"][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target["series"][key] = current + value
+    for metric in merged.values():
+        metric["series"] = [[list(labels), value] for labels, value in metric["series"].items()]
+    return merged
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names: Iterable[str], values: Iterable, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render(dumped: dict) -> str:
+    """
+    The render function formats a snapshot in the Prometheus text exposition format (version 0.0.4).
+
+    :param dumped: dict: Snapshot from snapshot or merge
+    :return: The text of the /metrics response
+    """
+    lines = []
+    for name, metric in sorted(dumped.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for labels, value in metric["series"]:
+            if metric["type"] != 'histogram':
+                lines.append(f"{name}{_labels(metric['labels'], labels)} {float(value)!r}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric["buckets"], value):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_labels(metric['labels'], labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(metric['labels'], labels)} {float(value[-1])!r}")
+            lines.append(f"{name}_count{_labels(metric['labels'], labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+def _alive(pid: int) -> bool:
+    if os.name == 'nt':
+        # os.kill(pid, 0) would send CTRL_C_EVENT on Windows; a process that has exited is signalled
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x00100000, False, pid)  # SYNCHRONIZE
+        if not handle:
+            return False
+        try:
+            return kernel32.WaitForSingleObject(handle, 0) == 0x00000102  # WAIT_TIMEOUT
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def write_snapshot(directory: str) -> None:
+    """
+    The write_snapshot function stores the snapshot of this process as {pid}.json in the shared directory,
+    replacing the previous one atomically.
+
+    :param directory: str: Directory shared by all worker processes
+    :return: None
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    with open(path + '.tmp', 'w') as file:
+        json.dump(snapshot(), file)
+    os.replace(path + '.tmp', path)
+
+
+async def flush_periodically(directory: str, interval: float) -> None:
+    """
+    The flush_periodically function writes the snapshot of this process every interval seconds,
+    so a scrape handled by another worker sees recent values. It runs until it is cancelled.
+
+    :param directory: str: Directory shared by all worker processes
+    :param interval: float: Seconds between two snapshots
+    :return: None
+    """
+    while True:
+        await asyncio.sleep(interval)
+        write_snapshot(directory)
+
+
+def _read_snapshot(path: str) -> dict | None:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        # a worker is replacing its file or exited while writing it
+        return None
+
+
+def _worker_snapshots(directory: str) -> dict[int, str]:
+    paths = {}
+    for filename in os.listdir(directory):
+        pid, _, extension = filename.partition('.')
+        if extension == 'json' and pid.isdigit():
+            paths[int(pid)] = os.path.join(directory, filename)
+    return paths
+
+
+@contextmanager
+def _exclusive(path: str):
+    # the lock is held by the open file and released when the process exits, even if it crashes
+    with open(path, 'a+') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+            return
+        lock.seek(0)
+        msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def fold_exited(directory: str) -> None:
+    """
+    The fold_exited function adds the snapshots of exited workers to EXITED_SNAPSHOT and deletes their files.
+    Their counters and histograms stay in the totals, their gauges are dropped, as in merge.
+    Workers that scrape at the same time take turns on a lock file, so no snapshot is counted twice.
+
+    :param directory: str: Directory shared by all worker processes
+    :return: None
+    """
+    with _exclusive(os.path.join(directory, 'exited.lock')):
+        exited = {pid: path for pid, path in _worker_snapshots(directory).items() if not _alive(pid)}
+        if not exited:
+            return
+        path = os.path.join(directory, EXITED_SNAPSHOT)
+        snapshots = [(dumped, False) for dumped in map(_read_snapshot, [path, *exited.values()]) if dumped]
+        with open(path + '.tmp', 'w') as file:
+            json.dump(merge(snapshots), file)
+        os.replace(path + '.tmp', path)
+        for worker_path in exited.values():
+            os.remove(worker_path)
+
+
+def clear(directory: str) -> None:
+    """
+    The clear function deletes every snapshot in the directory. Run it before the workers start,
+    so a new deployment does not count the requests of the previous one, or take a recycled pid for one of its own.
+
+    :param directory: str: Directory shared by all worker processes
+    :return: None
+    """
+    if not os.path.isdir(directory):
+        return
+    for filename in os.listdir(directory):
+        if filename.endswith(('.json', '.tmp', '.lock')):
+            os.remove(os.path.join(directory, filename))
+
+
+def exposition(directory: str | None = None) -> str:
+    """
+    The exposition function returns the metrics of the application for a Prometheus scrape.
+    Without a directory only this process is reported. With one, this process writes its snapshot first,
+    the snapshots of exited workers are folded into one file and all snapshots in the directory are added up,
+    whichever worker handles the scrape.
+
+    :param directory: str | None: Directory shared by all worker processes
+    :return: The text of the /metrics response
+    """
+    if directory is None:
+        return render(with_hit_ratios(snapshot()))
+    write_snapshot(directory)
+    fold_exited(directory)
+    snapshots = [(dumped, True) for dumped in map(_read_snapshot, _worker_snapshots(directory).values()) if dumped]
+    exited = _read_snapshot(os.path.join(directory, EXITED_SNAPSHOT))
+    if exited:
+        snapshots.append((exited, False))
+    return render(with_hit_ratios(merge(snapshots)))
+
+
+http_request_duration = Histogram('http_request_duration_seconds', 'Latency of HTTP requests',
+                                  ('method', 'route', 'status'))
+http_requests_in_flight = Gauge('http_requests_in_flight', 'HTTP requests being handled')
+cache_hits = Counter('cache_hits_total', 'Cache lookups that found an entry', ('cache',))
+cache_misses = Counter('cache_misses_total', 'Cache lookups that found nothing', ('cache',))
+
+
+def register_cache(name: str, stats: Callable[[], dict]) -> None:
+    """
+    The register_cache function exports the hits and misses of a cache with a stats method.
+    The hit ratio is derived from them when the metrics are rendered, so it is also right across workers.
+
+    :param name: str: Value of the cache label
+    :param stats: Callable[[], dict]: Returns a dictionary with hits and misses
+    :return: None
+    """
+    def collector():
+        current = stats()
+        cache_hits.set(current["hits"], name)
+        cache_misses.set(current["misses"], name)
+
+    add_collector(collector)
+
+
+def with_hit_ratios(dumped: dict) -> dict:
+    """
+    The with_hit_ratios function adds the cache_hit_ratio gauge, computed from the (possibly merged)
+    hit and miss counters of every cache.
+
+    :param dumped: dict: Snapshot from snapshot or merge
+    :return: The snapshot with cache_hit_ratio
+    """
+    hits = {tuple(labels): value for labels, value in dumped.get('cache_hits_total', {}).get('series', [])}
+    misses = {tuple(labels): value for labels, value in dumped.get('cache_misses_total', {}).get('series', [])}
+    series = [[list(labels), hit / (hit + misses.get(labels, 0)) if hit + misses.get(labels, 0) else 0.0]
+              for labels, hit in hits.items()]
+    return {**dumped, 'cache_hit_ratio': {"type": "gauge", "help": "Share of cache lookups that found an entry",
+                                          "labels": ["cache"], "series": series}}
+
+
+if __name__ == "__main__":
+    # python -m src.services.metrics && uvicorn main:app --workers 4
+    parser = argparse.ArgumentParser(description="Delete the metric snapshots of earlier workers, "
+                                                 "run it before the workers start")
+    parser.add_argument("directory", nargs="?", default=settings.metrics_dir,
+                        help="defaults to settings.metrics_dir")
+    args = parser.parse_args()
+    if args.directory:
+        clear(args.directory)
@@ -0,0 +1,105 @@
+import time
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.services import metrics
+from src.services.timing import RequestTiming, request_timing
+
+
+class TimingMiddleware:
+    def __init__(self, app: ASGIApp):
+        """
+        The __init__ function wraps the application in the timing middleware.
+
+        :param self: Represent the instance of the class
+        :param app: ASGIApp: The wrapped application
+        :return: The instance of the class
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        The __call__ function measures every request with the monotonic clock.
+        When the response starts, the time so far is added as the performance header and the Server-Timing header
+        reports the number and total time of the SQL statements and Redis commands the request ran,
+        e.g. app;dur=12.31, db;dur=8.02;desc="3 queries", redis;dur=0.41;desc="2 commands".
+        Once the body has been sent, the whole duration is recorded in the latency histogram by method,
+        route template and status; requests that do not match an API route are recorded under the route 'other'.
+        Messages are passed through as they come, so streaming responses are not buffered.
+
+        :param self: Represent the instance of the class
+        :param scope: Scope: The ASGI connection scope
+        :param receive: Receive: Receives request messages
+        :param send: Send: Sends response messages
+        :return: None
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timing = RequestTiming()
+        token = request_timing.set(timing)
+        metrics.http_requests_in_flight.inc()
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("performance", str(time.perf_counter() - timing.start))
+                headers.append("Server-Timing", timing.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            during = time.perf_counter() - timing.start
+            request_timing.reset(token)
+            metrics.http_requests_in_flight.dec()
+            route = scope.get("route")
+            metrics.http_request_duration.observe(during, scope["method"], route.path if route else "other",
+                                                  status_code)
+
+
+class ErrorsMiddleware:
+    def __init__(self, app: ASGIApp):
+        """
+        The __init__ function wraps the application in the error handling middleware.
+
+        :param self: Represent the instance of the class
+        :param app: ASGIApp: The wrapped application
+        :return: The instance of the class
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        The __call__ function catches any exception raised by the application and answers with status code 500
+        and a JSON body containing the reason for the error. If the response has already started,
+        nothing can be sent anymore and the exception is raised again.
+
+        :param self: Represent the instance of the class
+        :param scope: Scope: The ASGI connection scope
+        :param receive: Receive: Receives request messages
+        :param send: Send: Sends response messages
+        :return: None
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = False
+
+        async def send_tracking(message: Message) -> None:
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_tracking)
+        except Exception as exc:
+            if started:
+                raise
+            await JSONResponse(status_code=500, content={'reason': str(exc)})(scope, receive, send)
@@ -0,0 +1,171 @@
+"""
+The outbox worker sends the emails that the auth routes store in the email_outbox table.
+
+It runs as its own process, next to the web workers, so sending never competes with request handling and
+emails survive restarts of either side:
+
+    python -m src.services.outbox
+    python -m src.services.outbox --once
+"""
+import argparse
+import asyncio
+import logging
+import random
+import signal
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from aiosmtplib import SMTPRecipientsRefused
+from jinja2 import TemplateError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.conf.config import settings
+from src.database.db import DBSession, engine
+from src.database.models import EmailOutbox
+from src.repository import outbox as repository_outbox
+from src.services.email import deliver, mailer
+
+logger = logging.getLogger(__name__)
+
+# errors that fail the same way on every attempt
+PERMANENT_ERRORS = (SMTPRecipientsRefused, TemplateError)
+
+
+class OutboxWorker:
+    def __init__(self, session_maker: async_sessionmaker, send: Callable[..., Awaitable[None]], batch_size: int = 50,
+                 concurrency: int = 2, max_attempts: int = 8, backoff_base: float = 30, backoff_max: float = 3600,
+                 lease: float = 300, poll_interval: float = 1):
+        """
+        The __init__ function creates a worker that drains the outbox in batches.
+        An email that fails is tried again after an exponential backoff with jitter, up to max_attempts times.
+        lease has to exceed the time a batch can take to send, or a slow batch is claimed a second time.
+
+        :param self: Represent the instance of the class
+        :param session_maker: async_sessionmaker: Sessions of the primary database
+        :param send: Callable[..., Awaitable[None]]: Sends one email, raising on failure, like email.deliver
+        :param batch_size: int: Emails claimed at once
+        :param concurrency: int: Emails being sent at the same time, at most the size of the mailer's pool is useful
+        :param max_attempts: int: Attempts before an email is given up
+        :param backoff_base: float: Seconds before the second attempt, doubled for every further one
+        :param backoff_max: float: Upper bound of the backoff in seconds
+        :param lease: float: Seconds claimed emails are reserved for this worker
+        :param poll_interval: float: Seconds to wait when the outbox has nothing due
+        :return: The instance of the class
+        """
+        self.session_maker = session_maker
+        self.send = send
+        self.batch_size = batch_size
+        self.slots = asyncio.Semaphore(concurrency)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def backoff(self, attempts: int) -> float:
+        """
+        The backoff function returns the delay before the next attempt, with full jitter in its upper half
+        so emails that failed together, e.g. during an SMTP outage, do not all come back at the same moment.
+
+        :param self: Represent the instance of the class
+        :param attempts: int: Attempts made so far
+        :return: Seconds to wait
+        """
+        delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+        return delay * random.uniform(0.5, 1)
+
+    async def _send(self, message: EmailOutbox) -> Exception | None:
+        async with self.slots:
+            try:
+                await self.send(message.email, message.username, message.host, message.subject, message.template_name)
+            except Exception as err:
+                return err
+        return None
+
+    async def run_once(self) -> int:
+        """
+        The run_once function claims one batch of due emails, sends them and records the outcome:
+        sent emails are deleted, failed ones are scheduled again or, when the error is permanent or
+        the attempts are used up, kept with their error and no next attempt.
+
+        :param self: Represent the instance of the class
+        :return: The number of emails claimed
+        """
+        async with self.session_maker() as db:
+            batch = await repository_outbox.claim_batch(self.batch_size, self.lease, db)
+            if not batch:
+                return 0
+            errors = await asyncio.gather(*(self._send(message) for message in batch))
+            await repository_outbox.delete_sent([message.id for message, err in zip(batch, errors) if err is None],
+                                                db)
+            for message, err in zip(batch, errors):
+                if err is None:
+                    self.sent += 1
+                    continue
+                if isinstance(err, PERMANENT_ERRORS) or message.attempts >= self.max_attempts:
+                    self.failed += 1
+                    next_attempt_at = None
+                    logger.warning("Giving up on email %s to %s after %s attempts: %r", message.id, message.email,
+                                   message.attempts, err)
+                else:
+                    self.retried += 1
+                    next_attempt_at = datetime.utcnow() + timedelta(seconds=self.backoff(message.attempts))
+                await repository_outbox.reschedule(message.id, repr(err), next_attempt_at, db)
+        return len(batch)
+
+    async def run(self, stop: asyncio.Event) -> None:
+        """
+        The run function drains the outbox until stop is set. Full batches follow each other immediately,
+        otherwise the outbox is polled every poll_interval seconds. A database error is reported and retried
+        at the next poll; the current batch always finishes before the worker stops.
+
+        :param self: Represent the instance of the class
+        :param stop: asyncio.Event: Set to stop the worker
+        :return: None
+        """
+        while not stop.is_set():
+            try:
+                claimed = await self.run_once()
+            except (SQLAlchemyError, OSError):
+                logger.exception("Outbox worker error")
+                claimed = 0
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(stop.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "retried": self.retried, "failed": self.failed}
+
+
+async def main(args):
+    worker = OutboxWorker(DBSession, deliver, batch_size=settings.outbox_batch_size,
+                          concurrency=settings.outbox_concurrency, max_attempts=settings.outbox_max_attempts,
+                          backoff_base=settings.outbox_backoff_base, backoff_max=settings.outbox_backoff_max,
+                          lease=settings.outbox_lease, poll_interval=settings.outbox_poll_interval)
+    try:
+        if args.once:
+            while await worker.run_once() == worker.batch_size:
+                pass
+        else:
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(signum, stop.set)
+            await worker.run(stop)
+    finally:
+        await mailer.close()
+        await engine.dispose()
+        logger.info("Outbox worker stopped: %s", worker.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="send everything that is due and exit")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,41 @@
+import base64
+import binascii
+
+from fastapi import HTTPException, status
+from starlette.datastructures import URL
+
+
+def encode_cursor(contact_id: int) -> str:
+    """
+    The encode_cursor function turns the id of the last contact on a page into an opaque cursor string.
+
+    :param contact_id: int: Id of the last contact on the page
+    :return: An url-safe cursor string
+    """
+    return base64.urlsafe_b64encode(str(contact_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    The decode_cursor function turns a cursor produced by encode_cursor back into a contact id.
+    A malformed cursor results in a 400 response.
+
+    :param cursor: str: Cursor received from the client
+    :return: The id of the last contact of the previous page
+    """
+    try:
+        return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def next_link(url: URL, cursor: str) -> str:
+    """
+    The next_link function builds the value of a Link header pointing to the next page.
+
+    :param url: URL: Url of the current request
+    :param cursor: str: Cursor of the next page
+    :return: A Link header value with rel="next"
+    """
+    next_url = url.remove_query_params("offset").include_query_params(cursor=cursor)
+    return f'<{next_url}>; rel="next"'
@@ -0,0 +1,28 @@
+"""
+bcrypt hashing and verification as plain functions, so they can run in the processes of password_executor.
+The module imports nothing but passlib, which keeps the start of a worker process short.
+"""
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def hash_password(password: str) -> str:
+    """
+    The hash_password function hashes a password with bcrypt.
+
+    :param password: str: The plain-text password
+    :return: The bcrypt hash
+    """
+    return pwd_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    The verify_password function checks a password against its bcrypt hash.
+
+    :param plain_password: str: The password entered by the user
+    :param hashed_password: str: The stored hash
+    :return: True if the password matches the hash
+    """
+    return pwd_context.verify(plain_password, hashed_password)
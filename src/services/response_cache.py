@@ -0,0 +1,158 @@
+import hashlib
+import json
+import zlib
+from contextvars import ContextVar
+
+import redis.asyncio as redis
+
+from src.conf.config import settings
+
+# (user id, data version) read by pin_version for the current request
+pinned_version: ContextVar[tuple[int, int | None] | None] = ContextVar('pinned_version', default=None)
+
+
+class ResponseCache:
+    r: redis.Redis | None = None
+
+    def __init__(self, ttl: int, level: int = 1):
+        """
+        The __init__ function creates a cache of serialized responses in Redis.
+        Entries are keyed by user, endpoint, parameters and the data version of the user.
+        Writes only increment the version, which makes every older entry of the user unreachable at once;
+        the orphaned entries expire after ttl seconds.
+
+        :param self: Represent the instance of the class
+        :param ttl: int: Lifetime of an entry in seconds
+        :param level: int: zlib compression level of the stored bodies
+        :return: The instance of the class
+        """
+        self.ttl = ttl
+        self.level = level
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.stored_bytes = 0
+        self.raw_bytes = 0
+
+    @staticmethod
+    def version_key(user_id: int) -> str:
+        return f"contacts:version:{user_id}"
+
+    async def _read_version(self, user_id: int) -> int | None:
+        if self.r is None:
+            return None
+        try:
+            version = await self.r.get(self.version_key(user_id))
+        except redis.RedisError:
+            self.errors += 1
+            return None
+        return int(version or 0)
+
+    async def pin_version(self, user_id: int) -> None:
+        """
+        The pin_version function reads the data version of the user once for the current request,
+        so key uses it even if the version changes later in the request.
+        get_read_db calls it before choosing the database: a write pins its user to the primary before it bumps
+        the version, so a request that sees the new version is never served by a replica that lacks the write.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: The user who reads
+        :return: None
+        """
+        pinned_version.set((user_id, await self._read_version(user_id)))
+
+    async def key(self, user_id: int, endpoint: str, **params) -> str | None:
+        """
+        The key function reads the data version of the user and builds the key of a response.
+        The version has to be read before the database is queried: a write that commits in between
+        bumps the version, so a response built from older data is stored under a key nobody reads anymore.
+        A version pinned for the current request with pin_version is used instead of reading it again.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Owner of the data
+        :param endpoint: str: Name of the endpoint
+        :param params: Parameters that change the response
+        :return: The key, or None if the cache is disabled or Redis is unavailable
+        """
+        pinned = pinned_version.get()
+        if pinned is not None and pinned[0] == user_id:
+            version = pinned[1]
+        else:
+            version = await self._read_version(user_id)
+        if version is None:
+            return None
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        return f"resp:{user_id}:{version}:{endpoint}:{digest}"
+
+    async def get(self, key: str | None) -> tuple[bytes, dict] | None:
+        """
+        The get function returns a cached response.
+
+        :param self: Represent the instance of the class
+        :param key: str | None: Key from the key function
+        :return: The body and the headers, or None on a miss
+        """
+        if key is None:
+            return None
+        try:
+            data = await self.r.get(key)
+        except redis.RedisError:
+            self.errors += 1
+            data = None
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        headers, _, body = zlib.decompress(data).partition(b'\n')
+        return body, json.loads(headers)
+
+    async def set(self, key: str | None, body: bytes, headers: dict | None = None) -> None:
+        """
+        The set function stores a response compressed with zlib, after a one-line JSON header block.
+
+        :param self: Represent the instance of the class
+        :param key: str | None: Key from the key function
+        :param body: bytes: The JSON body
+        :param headers: dict | None: Headers to replay on a hit
+        :return: None
+        """
+        if key is None:
+            return
+        data = zlib.compress(json.dumps(headers or {}).encode() + b'\n' + body, self.level)
+        try:
+            await self.r.set(key, data, ex=self.ttl)
+        except redis.RedisError:
+            self.errors += 1
+            return
+        self.raw_bytes += len(body)
+        self.stored_bytes += len(data)
+
+    async def bump(self, user_id: int) -> None:
+        """
+        The bump function invalidates every cached response of the user by incrementing the data version.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Owner of the data that changed
+        :return: None
+        """
+        if self.r is None:
+            return
+        try:
+            await self.r.incr(self.version_key(user_id))
+        except redis.RedisError:
+            self.errors += 1
+
+    def stats(self) -> dict:
+        """
+        The stats function returns the counters of the cache.
+
+        :param self: Represent the instance of the class
+        :return: Hits, misses, Redis errors, hit ratio and compression ratio of the stored bodies
+        """
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "compression_ratio": self.raw_bytes / self.stored_bytes if self.stored_bytes else 0.0}
+
+
+response_cache = ResponseCache(settings.response_cache_ttl)
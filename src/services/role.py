@@ -35,5 +35,17 @@ class RoleAccess:
         print(request.method, request.url)
         print(f'User role {current_user.roles}')
         print(f'Allowed roles: {self.allowed_roles}')
-        if current_user.roles not in self.allowed_roles:
+        self.check(current_user)
+
+    def check(self, user: User):
+        """
+        The check function raises 403 if the user's role is not allowed.
+        It lets endpoints that perform several kinds of operations, such as the contacts batch,
+        apply the same rules as the single-operation endpoints.
+
+        :param self: Access the class attributes
+        :param user: User: The user to check
+        :return: None
+        """
+        if user.roles not in self.allowed_roles:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Operation forbidden')
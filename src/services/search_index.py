@@ -0,0 +1,207 @@
+from collections import defaultdict
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.models import Contact, User, SEARCH_COLUMNS
+from src.services.lru_cache import LRUCache
+
+
+def trigrams(value: str) -> set[str]:
+    """
+    The trigrams function splits a string into the set of its three character substrings.
+
+    :param value: str: String to split
+    :return: A set of trigrams, empty for strings shorter than three characters
+    """
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class UserSearchIndex:
+    def __init__(self, rows=()):
+        """
+        The __init__ function builds an inverted trigram index over the searchable fields of one user's contacts.
+
+        :param self: Represent the instance of the class
+        :param rows: Iterable of (id, firstname, lastname, email, phone) tuples
+        :return: The instance of the class
+        """
+        self.values: dict[int, tuple[str, ...]] = {}
+        self.postings: defaultdict[str, set[int]] = defaultdict(set)
+        for contact_id, *fields in rows:
+            self.add(contact_id, fields)
+
+    def add(self, contact_id: int, fields) -> None:
+        """
+        The add function indexes a contact, replacing any previous version of it.
+
+        :param self: Represent the instance of the class
+        :param contact_id: int: Id of the contact
+        :param fields: Searchable field values of the contact
+        :return: None
+        """
+        self.remove(contact_id)
+        fields = tuple(field or '' for field in fields)
+        self.values[contact_id] = fields
+        for field in fields:
+            for gram in trigrams(field):
+                self.postings[gram].add(contact_id)
+
+    def remove(self, contact_id: int) -> None:
+        """
+        The remove function drops a contact from the index.
+
+        :param self: Represent the instance of the class
+        :param contact_id: int: Id of the contact
+        :return: None
+        """
+        fields = self.values.pop(contact_id, None)
+        if fields is None:
+            return
+        for field in fields:
+            for gram in trigrams(field):
+                ids = self.postings.get(gram)
+                if ids is not None:
+                    ids.discard(contact_id)
+                    if not ids:
+                        del self.postings[gram]
+
+    def search(self, partial_info: str) -> list[int]:
+        """
+        The search function returns the ids of the contacts with a field containing partial_info (case-sensitive).
+        Candidates come from the intersection of the posting lists and are verified against the stored values,
+        queries shorter than three characters check every contact of the user.
+
+        :param self: Represent the instance of the class
+        :param partial_info: str: Substring to look for
+        :return: A sorted list of contact ids
+        """
+        grams = trigrams(partial_info)
+        if grams:
+            postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+        else:
+            candidates = self.values.keys()
+        return sorted(contact_id for contact_id in candidates
+                      if any(partial_info in field for field in self.values[contact_id]))
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class SearchIndex:
+    def __init__(self, max_contacts: int, ttl: float | None = None):
+        """
+        The __init__ function creates the per-user index registry.
+        Memory is bounded by the total number of indexed contacts: when it is exceeded
+        the least recently searched users lose their whole index and rebuild it on their next search.
+        The ttl bounds how long an index may miss writes made by other worker processes.
+
+        :param self: Represent the instance of the class
+        :param max_contacts: int: Maximum number of contacts held by all indexes together
+        :param ttl: float | None: Lifetime of a user index in seconds
+        :return: The instance of the class
+        """
+        self.indexes = LRUCache(max_contacts, ttl=ttl, weigher=lambda index: max(len(index), 1))
+        self._builds: dict[int, int] = {}
+        self._changes: dict[int, int] = {}
+
+    async def search(self, user: User, partial_info: str, db: AsyncSession) -> list[int]:
+        """
+        The search function returns the ids of the user's contacts matching partial_info,
+        building the user's index from the database on the first call.
+
+        :param self: Represent the instance of the class
+        :param user: User: Owner of the contacts
+        :param partial_info: str: Substring to look for
+        :param db: AsyncSession: Database session used to build the index
+        :return: A sorted list of contact ids
+        """
+        index = self.indexes.get(user.id)
+        if index is None:
+            index = await self.build(user.id, db)
+        return index.search(partial_info)
+
+    async def build(self, user_id: int, db: AsyncSession) -> UserSearchIndex:
+        """
+        The build function loads the searchable columns of the user's contacts and indexes them.
+        If the user's contacts change while the rows are loaded the index is used once but not kept.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Owner of the contacts
+        :param db: AsyncSession: Database session
+        :return: The new index
+        """
+        self._builds[user_id] = self._builds.get(user_id, 0) + 1
+        changes = self._changes.get(user_id, 0)
+        try:
+            rows = await db.execute(select(Contact.id, *(getattr(Contact, name) for name in SEARCH_COLUMNS))
+                                    .filter(Contact.user_id == user_id))
+            index = UserSearchIndex(rows.all())
+        finally:
+            changed = self._changes.get(user_id, 0) != changes
+            self._builds[user_id] -= 1
+            if not self._builds[user_id]:
+                del self._builds[user_id]
+                self._changes.pop(user_id, None)
+        if not changed:
+            self.indexes.set(user_id, index)
+        return index
+
+    def contact_saved(self, contact: Contact) -> None:
+        """
+        The contact_saved function is the write-through hook for created and updated contacts.
+
+        :param self: Represent the instance of the class
+        :param contact: Contact: The saved contact
+        :return: None
+        """
+        self._changed(contact.user_id)
+        index = self.indexes.peek(contact.user_id)
+        if index is not None:
+            index.add(contact.id, [getattr(contact, name) for name in SEARCH_COLUMNS])
+            self.indexes.resize(contact.user_id)
+
+    def contact_removed(self, contact: Contact) -> None:
+        """
+        The contact_removed function is the write-through hook for deleted contacts.
+
+        :param self: Represent the instance of the class
+        :param contact: Contact: The deleted contact
+        :return: None
+        """
+        self._changed(contact.user_id)
+        index = self.indexes.peek(contact.user_id)
+        if index is not None:
+            index.remove(contact.id)
+            self.indexes.resize(contact.user_id)
+
+    def invalidate(self, user_id: int) -> None:
+        """
+        The invalidate function drops the index of a user, for writes that bypass the hooks.
+
+        :param self: Represent the instance of the class
+        :param user_id: int: Owner of the contacts
+        :return: None
+        """
+        self._changed(user_id)
+        self.indexes.pop(user_id)
+
+    def _changed(self, user_id: int) -> None:
+        if user_id in self._builds:
+            self._changes[user_id] = self._changes.get(user_id, 0) + 1
+
+    def stats(self) -> dict:
+        """
+        The stats function reports hits, misses, evictions and the number of indexed users and contacts.
+
+        :param self: Represent the instance of the class
+        :return: A dictionary with the counters
+        """
+        stats = self.indexes.stats()
+        return {"users": stats["entries"], "contacts": stats["weight"], "max_contacts": stats["maxsize"],
+                "hits": stats["hits"], "misses": stats["misses"], "evictions": stats["evictions"]}
+
+
+search_index = SearchIndex(settings.search_index_max_contacts, ttl=settings.search_index_ttl)
@@ -0,0 +1,74 @@
+import functools
+import operator
+from typing import Any, Callable, Iterable
+
+import orjson
+from fastapi import Response, status
+from pydantic import BaseModel
+
+
+@functools.cache
+def compile_serializer(model: type[BaseModel]) -> Callable[[Any], dict]:
+    """
+    The compile_serializer function builds a function that copies the fields of a response model from an object.
+    The attribute getter is created once per model, and nothing is validated: the objects come from the database
+    and were validated on the way in, so re-checking e.g. every EmailStr on the way out only costs time.
+    Only flat models are supported, nested models have to be composed by the caller.
+
+    :param model: type[BaseModel]: The response model, e.g. ContactResponse
+    :return: A function from an object (such as an ORM row) to a dictionary keyed by the field aliases
+    """
+    fields = model.__fields__.values()
+    nested = [field.name for field in fields if isinstance(field.type_, type) and issubclass(field.type_, BaseModel)]
+    if nested:
+        raise TypeError(f"{model.__name__} has nested models: {', '.join(nested)}")
+    keys = tuple(field.alias for field in fields)
+    getter = operator.attrgetter(*(field.name for field in fields))
+    if len(keys) == 1:
+        return lambda obj: {keys[0]: getter(obj)}
+    return lambda obj: dict(zip(keys, getter(obj)))
+
+
+def dumps(value: Any) -> bytes:
+    """
+    The dumps function encodes a value as JSON with orjson, which handles dates, datetimes and enums natively.
+
+    :param value: Any: Dictionaries, lists and scalars
+    :return: The JSON document
+    """
+    return orjson.dumps(value)
+
+
+def dump_one(model: type[BaseModel], obj: Any) -> bytes:
+    """
+    The dump_one function encodes an object as JSON in the shape of a response model.
+
+    :param model: type[BaseModel]: The response model
+    :param obj: Any: The object, e.g. a Contact
+    :return: The JSON document
+    """
+    return orjson.dumps(compile_serializer(model)(obj))
+
+
+def dump_many(model: type[BaseModel], objs: Iterable[Any]) -> bytes:
+    """
+    The dump_many function encodes objects as a JSON array in the shape of a response model.
+
+    :param model: type[BaseModel]: The response model
+    :param objs: Iterable[Any]: The objects, e.g. a page of contacts
+    :return: The JSON document
+    """
+    return orjson.dumps(list(map(compile_serializer(model), objs)))
+
+
+def json_response(body: bytes, status_code: int = status.HTTP_200_OK, headers: dict | None = None) -> Response:
+    """
+    The json_response function wraps an already encoded JSON body in a response,
+    so FastAPI neither validates it against the response_model nor encodes it again.
+
+    :param body: bytes: The JSON document
+    :param status_code: int: Status of the response
+    :param headers: dict | None: Headers of the response, such as Link and ETag
+    :return: The response
+    """
+    return Response(content=body, status_code=status_code, media_type='application/json', headers=headers)
@@ -0,0 +1,62 @@
+import time
+from contextvars import ContextVar
+
+
+class RequestTiming:
+    __slots__ = ('start', 'db_count', 'db_time', 'redis_count', 'redis_time')
+
+    def __init__(self):
+        """
+        The __init__ function starts the accounting of one request.
+
+        :param self: Represent the instance of the class
+        :return: The instance of the class
+        """
+        self.start = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.redis_count = 0
+        self.redis_time = 0.0
+
+    def server_timing(self) -> str:
+        """
+        The server_timing function formats the totals as a Server-Timing header value, in milliseconds.
+        app is the whole time spent in the application so far, db and redis are the parts spent waiting for them.
+
+        :param self: Represent the instance of the class
+        :return: The header value
+        """
+        app = (time.perf_counter() - self.start) * 1000
+        return (f'app;dur={app:.2f}, '
+                f'db;dur={self.db_time * 1000:.2f};desc="{self.db_count} queries", '
+                f'redis;dur={self.redis_time * 1000:.2f};desc="{self.redis_count} commands"')
+
+
+# set by the middleware for every request; None outside of requests (startup, scripts, tests)
+request_timing: ContextVar[RequestTiming | None] = ContextVar('request_timing', default=None)
+
+
+def add_db_time(seconds: float) -> None:
+    """
+    The add_db_time function adds one statement to the accounting of the current request, if there is one.
+
+    :param seconds: float: Time between sending the statement and receiving its result
+    :return: None
+    """
+    timing = request_timing.get()
+    if timing is not None:
+        timing.db_count += 1
+        timing.db_time += seconds
+
+
+def add_redis_time(seconds: float) -> None:
+    """
+    The add_redis_time function adds one Redis command to the accounting of the current request, if there is one.
+
+    :param seconds: float: Time the command took, including waiting for a connection
+    :return: None
+    """
+    timing = request_timing.get()
+    if timing is not None:
+        timing.redis_count += 1
+        timing.redis_time += seconds
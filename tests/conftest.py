@@ -1,14 +1,15 @@
-from unittest.mock import MagicMock
-
 import pytest
 from fastapi.testclient import TestClient
 from fastapi_limiter.depends import RateLimiter
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from main import app
 from src.database.models import Base, User
 from src.database.db import get_db
+from src.services.auth import auth_service
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -18,6 +19,12 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ASYNC_SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False,
+                                              bind=async_engine)
+
 
 @pytest.fixture(scope="module")
 def session():
@@ -33,15 +40,24 @@ def session():
         db.close()
 
 
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    # tests change users directly in the database, so nothing may be served from the in-process tier
+    auth_service.user_cache.clear()
+    yield
+    auth_service.user_cache.clear()
+
+
 @pytest.fixture(scope="module")
 def client(session):
     # Dependency override
 
-    def override_get_db():
+    async def override_get_db():
+        db = TestingAsyncSessionLocal()
         try:
-            yield session
+            yield db
         finally:
-            session.close()
+            await db.close()
 
     app.dependency_overrides[get_db] = override_get_db
 
@@ -72,9 +88,7 @@ def user():
 
 
 @pytest.fixture(scope="function")
-def token(client, user, session, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+def token(client, user, session):
     client.post("/api/auth/signup", json=user)
     current_user: User = session.query(User).filter(User.email == user.get('email')).first()
     current_user.confirmed = True
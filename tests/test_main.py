@@ -11,5 +11,31 @@ def test_read_main(client):
     assert response.status_code == 200
 
 
+def test_server_timing(client):
+    response = client.get("/")
+    timing = response.headers["server-timing"]
+    assert timing.startswith("app;dur=")
+    assert 'db;dur=0.00;desc="0 queries"' in timing
+    assert 'redis;dur=0.00;desc="0 commands"' in timing
+
+
+def test_metrics(client):
+    response = client.get("/api/metrics")
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert {"db_pool", "response_cache", "user_cache", "token_cache", "search_index"} <= set(data)
+    assert data["db_pool"]["wait_buckets"]["+Inf"] >= 0
+
+
+def test_prometheus_metrics(client):
+    client.get("/")
+    response = client.get("/metrics")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_request_duration_seconds_count{method="GET",route="/",status="200"}' in response.text
+    assert "# TYPE http_requests_in_flight gauge" in response.text
+    assert 'cache_hit_ratio{cache="user"}' in response.text
+
+
 if __name__ == '__main__':
     unittest.main()
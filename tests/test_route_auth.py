@@ -1,18 +1,18 @@
 import asyncio
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import patch
 
 import pytest
+from sqlalchemy.exc import SQLAlchemyError
 
 from src.services.auth import auth_service
 from src.conf import messages
 
-from src.database.models import User
+from src.database.models import User, EmailOutbox
+from src.repository import users as repository_users
 
 
-def test_create_user(client, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+def test_create_user(client, session, user):
     response = client.post(
         "/api/auth/signup",
         json=user,
@@ -21,6 +21,20 @@ def test_create_user(client, user, monkeypatch):
     data = response.json()
     assert data["email"] == user.get("email")
     assert "id" in data
+    queued: EmailOutbox = session.query(EmailOutbox).filter(EmailOutbox.email == user.get("email")).one()
+    assert queued.template_name == "email_template.html"
+    assert queued.host == "http://testserver/"
+    assert queued.attempts == 0 and queued.next_attempt_at is not None
+
+
+def test_create_user_failure_queues_no_email(client, session):
+    with patch.object(repository_users, "create_user", side_effect=SQLAlchemyError("insert failed")):
+        response = client.post(
+            "/api/auth/signup",
+            json={"username": "failed", "email": "failed@example.com", "password": "12345678"},
+        )
+    assert response.status_code >= 400, response.text
+    assert session.query(EmailOutbox).filter(EmailOutbox.email == "failed@example.com").count() == 0
 
 
 def test_repeat_create_user(client, user):
@@ -122,10 +136,12 @@ def test_confirmed_email_ok(client, session, user):
             "username": user["username"],
         }
     )
+    auth_service.user_cache.set(user["email"], {"confirmed": False})
     response = client.get(f"api/auth/confirmed_email/{email_token}")
 
     assert response.status_code == 200, response.json()
     assert response.json()["message"] == messages.EMAIL_CONFIRMED
+    assert auth_service.user_cache.get(user["email"]) is None
 
 
 def test_confirmed_email_fail(client, session, user):
@@ -152,9 +168,7 @@ def test_confirmed_email_fail(client, session, user):
     assert response.json()["detail"] == messages.VERIFICATION_ERROR
 
 
-def test_request_email_ok(client, session, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+def test_request_email_ok(client, session, user):
     current_user: User = session.query(User).filter(User.email == user.get("email")).first()
     current_user.confirmed = True
     session.commit()
@@ -165,17 +179,18 @@ def test_request_email_ok(client, session, user, monkeypatch):
     assert response.json()["message"] == messages.EMAIL_ALREADY_CONFIRMED
 
 
-def test_request_email_check(client, session, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr('src.routes.auth.send_email', mock_send_email)
+def test_request_email_check(client, session, user):
     current_user: User = session.query(User).filter(User.email == user.get('email')).first()
     current_user.confirmed = False
     session.commit()
 
+    queued = session.query(EmailOutbox).filter(EmailOutbox.email == user.get("email")).count()
+
     response = client.post("api/auth/request_email", json={"email": user.get("email")})
 
     assert response.status_code == 200, response.json()
     assert response.json()["message"] == messages.CHECK_EMAIL
+    assert session.query(EmailOutbox).filter(EmailOutbox.email == user.get("email")).count() == queued + 1
 
     response2 = client.post("api/auth/request_email", json={"email": "Email@notSignUp.user"})
 
@@ -183,9 +198,7 @@ def test_request_email_check(client, session, user, monkeypatch):
     assert response2.json()["message"] == messages.CHECK_EMAIL
 
 
-def test_reset_password_ok(client, session, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+def test_reset_password_ok(client, session, user):
     current_user: User = session.query(User).filter(User.email == user.get("email")).first()
     current_user.confirmed = True
     session.commit()
@@ -194,22 +207,18 @@ def test_reset_password_ok(client, session, user, monkeypatch):
 
     assert response.status_code == 200, response.json()
     assert response.json()["message"] == messages.CHECK_EMAIL_NEXT_STEP
+    queued: EmailOutbox = session.query(EmailOutbox).order_by(EmailOutbox.id.desc()).first()
+    assert (queued.email, queued.template_name) == (user.get("email"), "reset_password.html")
 
 
-def test_reset_password_check1(client, session, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
-
+def test_reset_password_check1(client, session, user):
     response = client.post("api/auth/reset_password", json={"email": user.get("email")})
 
     assert response.status_code == 200, response.json()
     assert response.json()["message"] == messages.CHECK_EMAIL_NEXT_STEP
 
 
-def test_reset_password_check2(client, session, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
-
+def test_reset_password_check2(client, session, user):
     response = client.post("api/auth/reset_password", json={"email": "fake@email.com"})
 
     assert response.status_code == 200, response.json()
@@ -235,10 +244,12 @@ def test_update_password_ok(client, session, user):
 
     payload = {"reset_password_token": reset_token, "new_password": "fake_password", "confirm_password": "fake_password"}
 
+    auth_service.user_cache.set(user["email"], {"password": "old hash"})
     response = client.post("api/auth/set_new_password", json=payload)
 
     assert response.status_code == 200, response.text
     assert response.json()["message"] == messages.PASSWORD_UPDATED
+    assert auth_service.user_cache.get(user["email"]) is None
 
 
 if __name__ == '__main__':
@@ -1,12 +1,16 @@
+import csv
+import io
+import json
 import unittest
 from unittest.mock import patch, AsyncMock
 
-from src.database.models import User
+from src.database.models import User, Contact
 from src.services.auth import auth_service
+from src.services.response_cache import response_cache
 
 
 def test_create_contact(client, token, contact, user):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         response = client.post("/api/contacts/",
                                json=contact,
@@ -24,7 +28,7 @@ def test_create_contact(client, token, contact, user):
 
 
 def test_get_contacts(client, token, monkeypatch):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
@@ -37,8 +41,45 @@ def test_get_contacts(client, token, monkeypatch):
         assert response.status_code == 200, response.text
 
 
+def test_get_contacts_cursor(client, token, monkeypatch):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
+        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
+        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
+
+        response = client.get(
+            "api/contacts/",
+            params={"limit": 1},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == 1
+        next_url = response.links["next"]["url"]
+
+        response = client.get(next_url, headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        assert response.json() == []
+        assert "next" not in response.links
+
+
+def test_get_contacts_invalid_cursor(client, token, monkeypatch):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
+        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
+        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
+
+        response = client.get(
+            "api/contacts/",
+            params={"cursor": "not a cursor"},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 400, response.text
+
+
 def test_get_contact_ok(client, token, monkeypatch, contact):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
@@ -60,7 +101,7 @@ def test_get_contact_ok(client, token, monkeypatch, contact):
 
 
 def test_get_contact_fail(client, token, monkeypatch):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
@@ -74,7 +115,7 @@ def test_get_contact_fail(client, token, monkeypatch):
 
 
 def test_favorite_contact_ok(client, token, monkeypatch, contact, session, user):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
@@ -95,7 +136,7 @@ def test_favorite_contact_ok(client, token, monkeypatch, contact, session, user)
 
 
 def test_favorite_contact_fail_role(client, token, monkeypatch, contact, session, user):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
@@ -114,7 +155,7 @@ def test_favorite_contact_fail_role(client, token, monkeypatch, contact, session
 
 
 def test_favorite_contact_contact_not_exist(client, token, monkeypatch, contact, session, user):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
@@ -133,7 +174,7 @@ def test_favorite_contact_contact_not_exist(client, token, monkeypatch, contact,
 
 
 def test_update_contact(client, token, monkeypatch, contact, session, user):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
@@ -172,7 +213,7 @@ def test_update_contact(client, token, monkeypatch, contact, session, user):
 
 
 def test_update_contact_fail_role(client, token, monkeypatch, contact, session, user):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
@@ -202,7 +243,7 @@ def test_update_contact_fail_role(client, token, monkeypatch, contact, session,
 
 
 def test_update_contact_fail_contact_not_exist(client, token, monkeypatch, contact, session, user):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
@@ -232,7 +273,7 @@ def test_update_contact_fail_contact_not_exist(client, token, monkeypatch, conta
 
 
 def test_remove_contact_ok(client, token, monkeypatch, contact, session, user):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
@@ -251,7 +292,7 @@ def test_remove_contact_ok(client, token, monkeypatch, contact, session, user):
 
 
 def test_remove_contact_fail_role(client, token, monkeypatch, contact, session, user):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
@@ -270,7 +311,7 @@ def test_remove_contact_fail_role(client, token, monkeypatch, contact, session,
 
 
 def test_remove_contact_fail_id(client, token, monkeypatch, contact, session, user):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
@@ -288,5 +329,197 @@ def test_remove_contact_fail_id(client, token, monkeypatch, contact, session, us
         assert response.status_code == 404, response.text
 
 
+def test_import_contacts_csv(client, token, session):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        data = ("firstname,lastname,email,phone,birthday\n"
+                "Import,Csv,import1@example.com,3800000000001,1990-02-28\n"
+                "MyFriend,Csv,import2@example.com,3800000000002,\n"
+                "Bad,Csv,not-an-email,3800000000003,1990-02-28\n"
+                "Dup,Csv,import1@example.com,3800000000004,1990-02-28\n")
+        response = client.post("/api/contacts/import",
+                               files={"file": ("contacts.csv", data.encode(), "text/csv")},
+                               headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        result = response.json()
+        assert result["inserted"] == 2
+        assert result["failed"] == 2
+        assert [error["row"] for error in result["errors"]] == [3, 4]
+        favorite = session.query(Contact).filter(Contact.email == "import2@example.com").first()
+        assert favorite.is_favorite is True
+        assert favorite.birth_md is not None
+
+
+def test_import_contacts_ndjson(client, token):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        data = ('{"firstname": "Import", "email": "import3@example.com", "phone": "3800000000005"}\n'
+                '\n'
+                'not json\n')
+        response = client.post("/api/contacts/import",
+                               params={"format": "ndjson"},
+                               files={"file": ("contacts.txt", data.encode(), "text/plain")},
+                               headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        assert response.json()["inserted"] == 1
+        assert response.json()["errors"][0]["row"] == 2
+
+        response = client.post("/api/contacts/import",
+                               files={"file": ("contacts.txt", data.encode(), "text/plain")},
+                               headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 400, response.text
+
+
+def test_import_contacts_not_utf8(client, token):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        data = "firstname,email,phone\nLatin1,caf\xe9@example.com,3800000000006\n".encode("latin-1")
+        response = client.post("/api/contacts/import",
+                               files={"file": ("contacts.csv", data, "text/csv")},
+                               headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        result = response.json()
+        assert (result["inserted"], result["failed"]) == (0, 1)
+        assert "UTF-8" in result["errors"][0]["error"]
+
+
+def test_export_contacts_ndjson(client, token):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.get("/api/contacts/export", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["email"] for row in rows] == ["import1@example.com", "import2@example.com", "import3@example.com"]
+        assert rows[0]["birthday"] == "1990-02-28"
+        assert rows[1]["is_favorite"] is True
+
+
+def test_export_contacts_csv(client, token):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        response = client.get("/api/contacts/export", params={"format": "csv"},
+                              headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == 3
+        assert rows[0]["email"] == "import1@example.com"
+        assert "attachment" in response.headers["content-disposition"]
+
+
+def test_batch_contacts(client, token, session):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        ids = {contact.email: contact.id for contact in session.query(Contact).all()}
+        body = {
+            "get": [ids["import1@example.com"]],
+            "operations": [
+                {"op": "create", "contact": {"firstname": "Batch", "lastname": "Created", "email": "batch@example.com",
+                                             "phone": "3800000000009", "birthday": "2000-01-01"}},
+                {"op": "update", "id": ids["import2@example.com"],
+                 "contact": {"firstname": "Batch", "lastname": "Updated", "email": "import2@example.com",
+                             "phone": "3800000000002", "birthday": "2000-01-02"}},
+                {"op": "favorite", "id": ids["import1@example.com"], "is_favorite": True},
+                {"op": "delete", "id": ids["import3@example.com"]},
+            ]}
+        response = client.post("/api/contacts/batch", json=body, headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert [result["op"] for result in data["results"]] == ["create", "update", "favorite", "delete"]
+        assert data["results"][0]["contact"]["email"] == "batch@example.com"
+        assert data["results"][1]["contact"]["lastname"] == "Updated"
+        assert data["results"][3]["contact"] is None
+        assert data["contacts"][0]["is_favorite"] is True
+        session.expire_all()
+        assert session.query(Contact).filter(Contact.email == "import3@example.com").first() is None
+
+
+def test_batch_contacts_all_or_nothing(client, token, session, user):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        batch_id = session.query(Contact).filter(Contact.email == "batch@example.com").first().id
+        operations = [{"op": "favorite", "id": batch_id, "is_favorite": True}, {"op": "delete", "id": 10_000}]
+        response = client.post("/api/contacts/batch", json={"operations": operations},
+                               headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 404, response.text
+
+        current_user: User = session.query(User).filter(User.email == user.get("email")).first()
+        current_user.roles = "moderator"
+        session.commit()
+        auth_service.user_cache.clear()
+        operations = [{"op": "favorite", "id": batch_id, "is_favorite": True}, {"op": "delete", "id": batch_id}]
+        response = client.post("/api/contacts/batch", json={"operations": operations},
+                               headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 403, response.text
+        session.expire_all()
+        assert session.query(Contact).filter(Contact.id == batch_id).first().is_favorite is False
+
+
+def test_contacts_etag(client, token, session, monkeypatch):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
+        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
+        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
+        headers = {"Authorization": f"Bearer {token}"}
+
+        response = client.get("/api/contacts/", params={"limit": 2}, headers=headers)
+        assert response.status_code == 200, response.text
+        etag = response.headers["etag"]
+        response = client.get("/api/contacts/", params={"limit": 2}, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304, response.text
+        assert response.headers["etag"] == etag
+        assert "next" in response.links
+
+        contact_id = session.query(Contact).filter(Contact.email == "import1@example.com").first().id
+        response = client.get(f"/api/contacts/{contact_id}", headers=headers)
+        contact_etag = response.headers["etag"]
+        response = client.get(f"/api/contacts/{contact_id}", headers={**headers, "If-None-Match": f'W/{contact_etag}'})
+        assert response.status_code == 304, response.text
+
+        session.query(Contact).filter(Contact.id == contact_id).delete()
+        session.commit()
+        response = client.get("/api/contacts/", params={"limit": 2}, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200, response.text
+        assert response.headers["etag"] != etag
+        response = client.get(f"/api/contacts/{contact_id}", headers={**headers, "If-None-Match": contact_etag})
+        assert response.status_code == 404, response.text
+
+
+def test_contacts_response_cache(client, token, contact, monkeypatch):
+    store = {}
+    cache_redis = AsyncMock()
+    cache_redis.get.side_effect = store.get
+    cache_redis.set.side_effect = lambda key, value, ex=None: store.__setitem__(key, value)
+    cache_redis.incr.side_effect = lambda key: store.__setitem__(key, int(store.get(key, 0)) + 1)
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock, \
+            patch.object(response_cache, "r", cache_redis):
+        redis_mock.get.return_value = None
+        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
+        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
+        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
+        headers = {"Authorization": f"Bearer {token}"}
+        hits = response_cache.hits
+
+        first = client.get("/api/contacts/", params={"limit": 500}, headers=headers)
+        assert first.status_code == 200, first.text
+        second = client.get("/api/contacts/", params={"limit": 500}, headers=headers)
+        assert second.content == first.content
+        assert second.headers["etag"] == first.headers["etag"]
+        assert response_cache.hits == hits + 1
+        response = client.get("/api/contacts/", params={"limit": 500},
+                              headers={**headers, "If-None-Match": first.headers["etag"]})
+        assert response.status_code == 304, response.text
+
+        client.get("/api/search/find/cache", headers=headers)
+        response = client.post("/api/contacts/", json={**contact, "firstname": "cache", "email": "cache@example.com",
+                                                       "phone": "+380990000001"}, headers=headers)
+        assert response.status_code == 201, response.text
+        response = client.get("/api/contacts/", params={"limit": 500}, headers=headers)
+        assert len(response.json()) == len(first.json()) + 1
+        response = client.get("/api/search/find/cache", headers=headers)
+        assert [c["email"] for c in response.json()] == ["cache@example.com"]
+
+
 if __name__ == '__main__':
     unittest.main()
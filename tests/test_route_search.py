@@ -1,11 +1,12 @@
 import unittest
+from datetime import date
 from unittest.mock import patch, AsyncMock
 
 from src.services.auth import auth_service
 
 
 def test_get_birthday_list(client, token, monkeypatch, contact, user):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
@@ -22,7 +23,7 @@ def test_get_birthday_list(client, token, monkeypatch, contact, user):
 
 
 def test_find_contacts_by_partial_info_ok(client, token, monkeypatch, contact, user):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
@@ -38,7 +39,7 @@ def test_find_contacts_by_partial_info_ok(client, token, monkeypatch, contact, u
 
 
 def test_find_contacts_by_partial_info_fail(client, token, monkeypatch, contact, user):
-    with patch.object(auth_service, "r") as redis_mock:
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
         redis_mock.get.return_value = None
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
         monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
@@ -55,5 +56,47 @@ def test_find_contacts_by_partial_info_fail(client, token, monkeypatch, contact,
         assert data == []
 
 
+class FrozenDate(date):
+    """date whose today() is set by the test, so the birthday window does not depend on the day the tests run."""
+    frozen = date(2023, 12, 30)
+
+    @classmethod
+    def today(cls):
+        return cls.frozen
+
+
+def test_get_birthday_list_upcoming(client, token, monkeypatch, contact, user):
+    with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+        redis_mock.get.return_value = None
+        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.redis', AsyncMock())
+        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.identifier', AsyncMock())
+        monkeypatch.setattr('fastapi_limiter.FastAPILimiter.http_callback', AsyncMock())
+        monkeypatch.setattr('src.repository.search.date', FrozenDate)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        birthdays = {"dec30@example.com": "1990-12-30", "jan02@example.com": "1985-01-02",
+                     "leap@example.com": "2000-02-29", "jun15@example.com": "1970-06-15"}
+        for n, (email, birthday) in enumerate(birthdays.items()):
+            response = client.post("/api/contacts/", json={**contact, "email": email, "phone": f"098765432{n}",
+                                                           "birthday": birthday}, headers=headers)
+            assert response.status_code == 201, response.text
+
+        def upcoming(today: date, shift: int) -> list[str]:
+            monkeypatch.setattr(FrozenDate, "frozen", today)
+            response = client.get(f"/api/search/shift/{shift}", headers=headers)
+            assert response.status_code == 200, response.text
+            return [item["email"] for item in response.json()]
+
+        assert upcoming(date(2023, 12, 30), 0) == ["dec30@example.com"]
+        # the window wraps over the new year
+        assert upcoming(date(2023, 12, 30), 5) == ["dec30@example.com", "jan02@example.com"]
+        assert upcoming(date(2023, 12, 31), 1) == []
+        # Feb 29 birthdays are between Feb 28 and Mar 1 in non-leap years, and on their day in leap years
+        assert upcoming(date(2023, 2, 28), 1) == ["leap@example.com"]
+        assert upcoming(date(2023, 2, 28), 0) == []
+        assert upcoming(date(2024, 2, 29), 0) == ["leap@example.com"]
+        assert len(upcoming(date(2023, 12, 30), 365)) == 4
+
+
 if __name__ == '__main__':
     unittest.main()
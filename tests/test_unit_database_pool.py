@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.database.db_pool import InstrumentedPool, PoolStats, instrument, pool_stats, prewarm
+from src.services.timing import RequestTiming, request_timing
+
+
+class TestInstrumentedPool(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{self.path}", poolclass=InstrumentedPool,
+                                          pool_size=2, max_overflow=1, pool_timeout=0.05)
+        instrument(self.engine)
+        pool_stats.reset()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        os.remove(self.path)
+
+    async def test_prewarm_opens_distinct_connections(self):
+        self.assertEqual(await prewarm(self.engine, 5), 2)
+        snapshot = pool_stats.snapshot(self.engine.pool)
+        self.assertEqual((snapshot["connects"], snapshot["checked_in"], snapshot["checked_out"]), (2, 2, 0))
+        self.assertEqual(snapshot["max_checked_out"], 2)
+
+    async def test_overflow_wait_and_timeout(self):
+        connections = [await self.engine.connect() for _ in range(3)]
+        self.assertEqual(pool_stats.snapshot(self.engine.pool)["overflow"], 1)
+        with self.assertRaises(exc.TimeoutError):
+            async with self.engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+        for connection in connections:
+            await connection.close()
+        snapshot = pool_stats.snapshot(self.engine.pool)
+        self.assertEqual((snapshot["timeouts"], snapshot["max_overflow"], snapshot["checkouts"]), (1, 1, 3))
+        self.assertEqual(snapshot["wait_count"], 4)
+        self.assertGreaterEqual(snapshot["wait_max"], 0.05)
+        self.assertEqual(sum(snapshot["wait_buckets"].values()), 4)
+
+    async def test_every_engine_counts_into_its_own_stats(self):
+        stats = PoolStats()
+        other = create_async_engine(f"sqlite+aiosqlite:///{self.path}", poolclass=InstrumentedPool,
+                                    pool_size=1, max_overflow=0, pool_timeout=0.05)
+        instrument(other, stats)
+        try:
+            async with other.connect():
+                with self.assertRaises(exc.TimeoutError):
+                    await other.connect()
+            await other.dispose()
+            async with other.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+        finally:
+            await other.dispose()
+        self.assertEqual((stats.timeouts, stats.wait_count, stats.checkouts), (1, 3, 2))
+        self.assertEqual((pool_stats.timeouts, pool_stats.wait_count, pool_stats.checkouts), (0, 0, 0))
+
+    async def test_statements_are_added_to_the_request_timing(self):
+        async with self.engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+            timing = RequestTiming()
+            token = request_timing.set(timing)
+            try:
+                await connection.execute(text("SELECT 1"))
+                await connection.execute(text("SELECT 2"))
+            finally:
+                request_timing.reset(token)
+            await connection.execute(text("SELECT 3"))
+        self.assertEqual(timing.db_count, 2)
+        self.assertGreater(timing.db_time, 0)
+        self.assertIn('desc="2 queries"', timing.server_timing())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import os
+import tempfile
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from src.database.db_pool import db_pool_events
+from src.database.models import Base, User, Contact
+from src.database.replicas import ReplicaRouter, get_read_db, replica_router
+from src.services.response_cache import response_cache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.ttl = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.ttl[key] = ex
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key) or 0) + 1
+        return self.data[key]
+
+
+class TestReplicaRouter(IsolatedAsyncioTestCase):
+    """A primary and a replica as two SQLite files: the replica never receives the primary's writes."""
+
+    async def asyncSetUp(self):
+        self.paths = []
+        for name in ("primary", "replica"):
+            fd, path = tempfile.mkstemp(suffix=f"_{name}.db")
+            os.close(fd)
+            self.paths.append(path)
+        self.primary = create_async_engine(f"sqlite+aiosqlite:///{self.paths[0]}")
+        self.router = ReplicaRouter([f"sqlite+aiosqlite:///{self.paths[1]}"], max_lag=2, marker_ttl=10,
+                                    check_timeout=1)
+        for engine in (self.primary, self.router.replicas[0].engine):
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+        async with self.primary.begin() as conn:
+            await conn.execute(insert(User), [{"id": 1, "username": "reader", "email": "reader@example.com",
+                                               "password": "x"}])
+            await conn.execute(insert(Contact), [{"firstname": "Only", "lastname": "Primary",
+                                                  "email": "only@primary.com", "phone": "+380000000001",
+                                                  "user_id": 1}])
+        self.router.r = FakeRedis()
+        self.user = User(id=1)
+
+    async def asyncTearDown(self):
+        await self.primary.dispose()
+        await self.router.dispose()
+        for path in self.paths:
+            os.remove(path)
+
+    async def test_replicas_are_used_after_a_passed_check(self):
+        replica = self.router.replicas[0]
+        self.assertIsNone(await self.router.choose(1))
+        await self.router.check()
+        self.assertTrue(replica.healthy)
+        self.assertEqual(replica.lag, 0)
+        self.assertIs(await self.router.choose(1), replica)
+        stats = self.router.stats()
+        self.assertEqual((stats["primary_reads"], stats["replicas"][0]["reads"]), (1, 1))
+        self.router.export()
+        self.assertEqual(db_pool_events.series[(replica.name, 'checkouts')], replica.pool_stats.checkouts)
+        self.assertEqual(replica.pool_stats.wait_count, replica.pool_stats.checkouts)
+
+    async def test_write_pins_the_user_to_the_primary(self):
+        await self.router.check()
+        await self.router.mark_write(1)
+        self.assertEqual(self.router.r.ttl[self.router.marker_key(1)], 10)
+        self.assertIsNone(await self.router.choose(1))
+        self.assertIs(await self.router.choose(2), self.router.replicas[0])
+        self.assertEqual(self.router.stats()["pinned_reads"], 1)
+
+    async def test_without_redis_reads_stay_on_the_primary(self):
+        await self.router.check()
+        self.router.r = None
+        self.assertIsNone(await self.router.choose(1))
+
+    async def test_lagging_replica_is_dropped(self):
+        await self.router.check()
+        self.router.max_lag = -1
+        await self.router.check()
+        replica = self.router.replicas[0]
+        self.assertFalse(replica.healthy)
+        self.assertIn("exceeds", replica.last_error)
+        self.assertIsNone(await self.router.choose(1))
+
+    async def test_unreachable_replica_is_dropped(self):
+        router = ReplicaRouter(["sqlite+aiosqlite:////nonexistent/dir/replica.db"], max_lag=2, marker_ttl=10,
+                               check_timeout=1)
+        await router.check()
+        self.assertFalse(router.replicas[0].healthy)
+        self.assertIsNone(router.replicas[0].lag)
+        self.assertIn("check failed", router.replicas[0].last_error)
+        await router.dispose()
+
+    async def read_contacts(self) -> list:
+        async with AsyncSession(self.primary) as primary_session:
+            dependency = get_read_db(current_user=self.user, db=primary_session)
+            db = await dependency.__anext__()
+            contacts = (await db.execute(select(Contact.email))).scalars().all()
+            await dependency.aclose()
+        return contacts
+
+    async def test_get_read_db_routes_between_primary_and_replica(self):
+        original = replica_router.replicas, replica_router.r
+        replica_router.replicas, replica_router.r = self.router.replicas, self.router.r
+        try:
+            self.assertEqual(await self.read_contacts(), ["only@primary.com"])
+            await replica_router.check()
+            self.assertEqual(await self.read_contacts(), [])
+            await replica_router.mark_write(self.user.id)
+            self.assertEqual(await self.read_contacts(), ["only@primary.com"])
+        finally:
+            replica_router.replicas, replica_router.r = original
+
+
+    async def read_during_write(self, routed: bool) -> tuple[list, str]:
+        """Reads the contacts and the cache key while a write of the user commits before or after the routing."""
+        original = replica_router.replicas, replica_router.r, response_cache.r
+        replica_router.replicas, replica_router.r = self.router.replicas, self.router.r
+        response_cache.r = self.router.r
+        choose = replica_router.choose
+
+        async def write():
+            await replica_router.mark_write(self.user.id)
+            await response_cache.bump(self.user.id)
+
+        async def write_then_choose(user_id):
+            await write()
+            return await choose(user_id)
+
+        if not routed:
+            replica_router.choose = write_then_choose
+        try:
+            await replica_router.check()
+            async with AsyncSession(self.primary) as primary_session:
+                dependency = get_read_db(current_user=self.user, db=primary_session)
+                db = await dependency.__anext__()
+                if routed:
+                    await write()
+                contacts = (await db.execute(select(Contact.email))).scalars().all()
+                cache_key = await response_cache.key(self.user.id, "contacts")
+                await dependency.aclose()
+        finally:
+            replica_router.__dict__.pop("choose", None)
+            replica_router.replicas, replica_router.r = original[:2]
+            response_cache.r = original[2]
+        self.assertEqual(self.router.r.data[response_cache.version_key(self.user.id)], 1)
+        return contacts, cache_key
+
+    async def test_write_before_routing_is_read_from_the_primary(self):
+        contacts, cache_key = await self.read_during_write(routed=False)
+        self.assertEqual(contacts, ["only@primary.com"])
+        self.assertTrue(cache_key.startswith("resp:1:0:"))
+
+    async def test_write_after_routing_is_not_cached_under_the_new_version(self):
+        contacts, cache_key = await self.read_during_write(routed=True)
+        # the replica lacks the write, its rows must stay unreachable once the version is bumped
+        self.assertEqual(contacts, [])
+        self.assertTrue(cache_key.startswith("resp:1:0:"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,8 @@
 import unittest
 from unittest import IsolatedAsyncioTestCase
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, AsyncMock
 
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import Contact, User
 from src.repository.contacts import (
@@ -22,7 +21,7 @@ class TestContacts(IsolatedAsyncioTestCase):
         :return: A user object with id= 1
         :doc-author: Trelent
         """
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
         self.user = User(id=1)
         self.contacts = [Contact(id=i, firstname=f"firstname{i}", lastname=f"lastname{i}") for i in range(10)]
         self.body = ContactModel(firstname="firstname",
@@ -49,7 +48,6 @@ class TestContacts(IsolatedAsyncioTestCase):
         :return: A delete function to remove the session, user and contacts
         :doc-author: Trelent
         """
-        self.session.delete()
         self.user = None
         self.contacts = None
         self.body = None
@@ -68,10 +66,22 @@ class TestContacts(IsolatedAsyncioTestCase):
         user = self.user
         limit = 10
         offset = 0
-        self.session.query().filter().limit().offset().all.return_value = self.contacts
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = self.contacts
+        self.session.execute.return_value = result
         result = await get_contacts(user, limit, offset, self.session)
         self.assertEqual(result, self.contacts)
 
+    async def test_get_contacts_after_id(self):
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = self.contacts[5:]
+        self.session.execute.return_value = result
+        contacts = await get_contacts(self.user, 10, 0, self.session, after_id=4)
+        self.assertEqual(contacts, self.contacts[5:])
+        query = str(self.session.execute.call_args.args[0])
+        self.assertIn("contacts.id >", query)
+        self.assertNotIn("OFFSET", query)
+
     async def test_get_contact_by_id(self):
         """
         The test_get_contact_by_id function tests the get_contact_by_id function.
@@ -89,8 +99,8 @@ class TestContacts(IsolatedAsyncioTestCase):
         contact_id = 1
         contact = Contact(id=contact_id, firstname="firstname", lastname="lastname", user_id=user.id)
         db = self.session
-        db.query(Contact).filter(
-            and_(Contact.user_id == user.id, Contact.id == contact_id)).first.return_value = contact
+        db.execute.return_value = MagicMock()
+        db.execute.return_value.scalars.return_value.first.return_value = contact
         result = await get_contact_by_id(user, contact_id, db)
         self.assertEqual(result, contact)
 
@@ -139,8 +149,8 @@ class TestContacts(IsolatedAsyncioTestCase):
         contact_id = 1
         contact = Contact(id=contact_id, firstname="old_firstname", lastname="old_lastname",
                           email="old_email@example.com", user_id=user.id)
-        db.query(Contact).filter(
-            and_(Contact.user_id == user.id, Contact.id == contact_id)).first.return_value = contact
+        db.execute.return_value = MagicMock()
+        db.execute.return_value.scalars.return_value.first.return_value = contact
         result = await update(user, contact_id, body, db)
 
         self.assertEqual(result, contact)
@@ -172,8 +182,8 @@ class TestContacts(IsolatedAsyncioTestCase):
         contact_id = 1
         db = self.session
         contact = Contact(id=contact_id, user_id=user.id)
-        db.query(Contact).filter(
-            and_(Contact.user_id == user.id, Contact.id == contact_id)).first.return_value = contact
+        db.execute.return_value = MagicMock()
+        db.execute.return_value.scalars.return_value.first.return_value = contact
         result = await remove(user, contact_id, db)
         self.assertEqual(result, contact)
 
@@ -192,8 +202,8 @@ class TestContacts(IsolatedAsyncioTestCase):
         contact_id = 1
         db = self.session
         contact = Contact(id=contact_id, user_id=user.id, is_favorite=False)
-        db.query(Contact).filter(
-            and_(Contact.user_id == user.id, Contact.id == contact_id)).first.return_value = contact
+        db.execute.return_value = MagicMock()
+        db.execute.return_value.scalars.return_value.first.return_value = contact
         result = await set_favorite(user, contact_id, self.favorite_body, db)
         self.assertEqual(result, contact)
         self.assertTrue(result.is_favorite)
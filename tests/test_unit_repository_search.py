@@ -1,25 +1,26 @@
 import unittest
-from datetime import datetime
+from datetime import date, datetime
 from unittest import IsolatedAsyncioTestCase
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, AsyncMock, patch
 
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import User, Contact
+from src.database.models import User, Contact, birth_md_of
 from src.repository.search import (
     get_contact_by_firstname,
     get_contact_by_lastname,
     get_contact_by_email,
     get_contact_by_phone,
     get_birthday_list,
-    get_users_by_partial_info)
-from src.schemas import ContactModel
+    get_users_by_partial_info,
+    partial_info_filter,
+    IDS_PER_QUERY)
 
 
 class TestSearch(IsolatedAsyncioTestCase):
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
         self.user = User(id=1)
         self.contacts = [Contact(id=i, firstname=f"firstname{i}",
                                  lastname=f"lastname{i}",
@@ -29,45 +30,92 @@ class TestSearch(IsolatedAsyncioTestCase):
                                  ) for i in range(9)]
 
     def tearDown(self):
-        self.session.delete()
         self.user = None
         self.contacts = None
 
     async def test_get_contact_by_firstname(self):
-        self.session.query().filter().all.return_value = self.contacts
+        self.session.execute.return_value.scalars.return_value.all.return_value = self.contacts
         result = await get_contact_by_firstname(self.user, "firstname2", self.session)
         self.assertEqual(result, self.contacts)
-        self.session.query().filter().all.assert_called_once()
+        self.session.execute.assert_awaited_once()
 
     async def test_get_contact_by_lastname(self):
-        self.session.query().filter().all.return_value = self.contacts
+        self.session.execute.return_value.scalars.return_value.all.return_value = self.contacts
         result = await get_contact_by_lastname(self.user, "lastname2", self.session)
         self.assertEqual(result, self.contacts)
-        self.session.query().filter().all.assert_called_once()
+        self.session.execute.assert_awaited_once()
 
     async def test_get_contact_by_email(self):
-        self.session.query().filter().all.return_value = self.contacts
+        self.session.execute.return_value.scalars.return_value.all.return_value = self.contacts
         result = await get_contact_by_email(self.user, "email2@@example.com", self.session)
         self.assertEqual(result, self.contacts)
-        self.session.query().filter().all.assert_called_once()
+        self.session.execute.assert_awaited_once()
 
     async def test_get_contact_by_phone(self):
-        self.session.query().filter().all.return_value = self.contacts
+        self.session.execute.return_value.scalars.return_value.all.return_value = self.contacts
         result = await get_contact_by_phone(self.user, "380501234567", self.session)
         self.assertEqual(result, self.contacts)
-        self.session.query().filter().all.assert_called_once()
+        self.session.execute.assert_awaited_once()
 
     async def test_get_birthday_list(self):
-        self.session.query(Contact).filter_by(user_id=self.user.id).all.return_value = self.contacts
-        # self.session.query().filter().all.return_value = self.contacts
-        result = await get_birthday_list(self.user, 360, self.session)
+        self.session.execute.return_value.scalars.return_value.all.return_value = self.contacts
+        result = await get_birthday_list(self.user, 30, self.session)
         self.assertListEqual(result, self.contacts)
+        condition = str(self.session.execute.call_args.args[0].whereclause)
+        self.assertIn("birth_md", condition)
+
+    async def test_get_birthday_list_whole_year(self):
+        self.session.execute.return_value.scalars.return_value.all.return_value = self.contacts
+        result = await get_birthday_list(self.user, 365, self.session)
+        self.assertListEqual(result, self.contacts)
+        condition = str(self.session.execute.call_args.args[0].whereclause)
+        self.assertNotIn("birth_md", condition)
+
+    async def test_get_birthday_list_negative_shift(self):
+        result = await get_birthday_list(self.user, -1, self.session)
+        self.assertListEqual(result, [])
+        self.session.execute.assert_not_awaited()
+
+    def test_birth_md_of(self):
+        self.assertEqual(birth_md_of(date(2020, 2, 29)), 229)
+        self.assertEqual(birth_md_of(date(1990, 12, 31)), 1231)
 
     async def test_get_users_by_partial_info(self):
-        self.session.query().filter().all.return_value = self.contacts
+        self.session.execute.return_value.scalars.return_value.all.return_value = [self.contacts[1]]
         result = await get_users_by_partial_info(self.user, "firstname1", self.session)
         self.assertEqual(result[0], self.contacts[1])
         self.assertNotEqual(result[0], self.contacts[3])
+        query = str(self.session.execute.call_args.args[0])
+        self.assertIn("LIKE", query)
+
+    async def test_get_users_by_partial_info_pages_in_sql(self):
+        await get_users_by_partial_info(self.user, "firstname1", self.session, limit=5, offset=10)
+        query = self.session.execute.call_args.args[0]
+        self.assertEqual((query._limit, query._offset), (5, 10))
+
+    async def test_get_users_by_partial_info_memory_index_chunks_ids(self):
+        ids = list(range(IDS_PER_QUERY * 2 + 1))
+        self.session.execute.return_value.scalars.return_value = []
+        with patch("src.repository.search.settings.search_backend", "memory"), \
+                patch("src.repository.search.search_index.search", AsyncMock(return_value=ids)):
+            await get_users_by_partial_info(self.user, "a", self.session)
+            self.assertEqual(self.session.execute.await_count, 3)
+            self.session.execute.reset_mock()
+            await get_users_by_partial_info(self.user, "a", self.session, limit=5, offset=3)
+        self.session.execute.assert_awaited_once()
+        bound = self.session.execute.call_args.args[0].compile().params
+        self.assertIn([3, 4, 5, 6, 7], bound.values())
+
+    async def test_get_users_by_partial_info_memory_index_without_matches(self):
+        with patch("src.repository.search.settings.search_backend", "memory"), \
+                patch("src.repository.search.search_index.search", AsyncMock(return_value=[])):
+            self.assertEqual(await get_users_by_partial_info(self.user, "zzz", self.session), [])
+        self.session.execute.assert_not_awaited()
+
+    def test_partial_info_filter_sqlite(self):
+        self.assertIn("MATCH", str(partial_info_filter("firstname1", "sqlite")))
+        self.assertIn("instr", str(partial_info_filter("fi", "sqlite")))
+        self.assertIn("LIKE", str(partial_info_filter("firstname1", "postgresql")))
 
 
 if __name__ == '__main__':
@@ -1,9 +1,8 @@
 import unittest
 from unittest import IsolatedAsyncioTestCase
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, AsyncMock
 
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User
 from src.repository.users import (
@@ -20,14 +19,15 @@ from src.schemas import UserModel
 
 class TestUser(IsolatedAsyncioTestCase):
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
         self.body = UserModel(username="username", email="username@test.ua", password="12345678")
         self.user = User(username="username", email="username@test.ua", password="12345678", refresh_token="token", confirmed=False)
 
     async def test_get_user_by_email(self):
         email = self.user.email
         db = self.session
-        db.query(User).filter_by(email=email).first.return_value = self.user
+        db.execute.return_value = MagicMock()
+        db.execute.return_value.scalars.return_value.first.return_value = self.user
         result = await get_user_by_email(email, db)
         self.assertEqual(result, self.user)
         self.assertTrue(hasattr(result, "id"))
@@ -62,13 +62,16 @@ class TestUser(IsolatedAsyncioTestCase):
     async def test_confirmed_email(self):
         email = self.user.email
         db = self.session
-        db.query(User).filter_by(email=email).first.return_value = self.user
+        db.execute.return_value = MagicMock()
+        db.execute.return_value.scalars.return_value.first.return_value = self.user
         result = await confirmed_email(email, db)
         self.assertTrue(result.confirmed)
 
     async def test_update_avatar(self):
         url = 'https://www.gravatar.com/avatar/4c6ddf65f17aa11c4fffd9a2faccc2eb'
         user = self.user
+        self.session.execute.return_value = MagicMock()
+        self.session.execute.return_value.scalars.return_value.first.return_value = user
         result = await update_avatar(email=self.user.email, url=url, db=self.session)
         self.assertEqual(result.avatar, url)
 
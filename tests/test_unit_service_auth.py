@@ -0,0 +1,120 @@
+import json
+import unittest
+from datetime import datetime
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import MagicMock, AsyncMock, patch
+
+from jose import jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import User, Role
+from src.conf.config import settings
+from src.services import auth
+from src.services.auth import auth_service, auth_password, dump_user, load_user_fields
+
+
+class TestUserCache(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.session = AsyncMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
+        self.user = User(id=1, username="user", email="user@example.com", password="hash", roles=Role.moderator,
+                         confirmed=True, avatar=None, created_at=datetime(2023, 5, 4, 10, 30))
+        auth_service.user_cache.clear()
+
+    def tearDown(self):
+        auth_service.user_cache.clear()
+
+    def test_dump_and_load_user(self):
+        fields = load_user_fields(dump_user(self.user))
+        self.assertEqual(fields["id"], 1)
+        self.assertEqual(fields["roles"], Role.moderator)
+        self.assertEqual(fields["created_at"], datetime(2023, 5, 4, 10, 30))
+        self.assertIsNone(fields["updated_at"])
+
+    def test_load_user_other_version(self):
+        row = json.loads(dump_user(self.user))
+        row[0] += 1
+        self.assertIsNone(load_user_fields(json.dumps(row).encode()))
+        self.assertIsNone(load_user_fields(b"\x80\x04garbage"))
+
+    async def test_get_current_user_tiers(self):
+        token = await auth_service.create_access_token(data={"sub": self.user.email})
+        self.session.execute.return_value.scalars.return_value.first.return_value = self.user
+        with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+            redis_mock.get.return_value = None
+            user = await auth_service.get_current_user(token, self.session)
+            self.assertEqual(user.email, self.user.email)
+            redis_mock.set.assert_awaited_once_with(f"user:v1:{self.user.email}", dump_user(self.user), ex=900)
+            self.session.execute.assert_awaited_once()
+            again = await auth_service.get_current_user(token, self.session)
+            self.assertIsNot(again, user)
+            redis_mock.get.assert_awaited_once()
+            self.session.execute.assert_awaited_once()
+
+    async def test_get_current_user_from_redis(self):
+        token = await auth_service.create_access_token(data={"sub": self.user.email})
+        with patch.object(auth_service, "r", new_callable=AsyncMock) as redis_mock:
+            redis_mock.get.return_value = dump_user(self.user)
+            user = await auth_service.get_current_user(token, self.session)
+            self.assertEqual(user.roles, Role.moderator)
+            self.session.execute.assert_not_awaited()
+
+    async def test_get_current_user_without_redis(self):
+        token = await auth_service.create_access_token(data={"sub": self.user.email})
+        self.session.execute.return_value.scalars.return_value.first.return_value = self.user
+        with patch.object(auth_service, "r", None):
+            user = await auth_service.get_current_user(token, self.session)
+        self.assertEqual(user.id, self.user.id)
+
+
+class TestTokenCache(IsolatedAsyncioTestCase):
+    def setUp(self):
+        auth_service.token_cache.clear()
+
+    async def test_decode_access_token_cached(self):
+        token = await auth_service.create_access_token(data={"sub": "user@example.com"})
+        hits = auth_service.token_cache.hits
+        with patch("src.services.auth.jwt.decode", wraps=jwt.decode) as decode:
+            self.assertEqual(auth_service.decode_access_token(token)["sub"], "user@example.com")
+            self.assertEqual(auth_service.decode_access_token(token)["sub"], "user@example.com")
+            decode.assert_called_once()
+        self.assertEqual(auth_service.token_cache.hits, hits + 1)
+
+    async def test_decode_access_token_invalid(self):
+        expired = await auth_service.create_access_token(data={"sub": "user@example.com"}, expires_delta=-10)
+        self.assertIsNone(auth_service.decode_access_token(expired))
+        self.assertIsNone(auth_service.decode_access_token("not.a.token"))
+        self.assertEqual(len(auth_service.token_cache), 0)
+
+
+class TestPasswordHashing(IsolatedAsyncioTestCase):
+    async def test_hash_and_verify_off_loop(self):
+        hashed = await auth_service.get_password_hash("password")
+        self.assertTrue(await auth_service.verify_password("password", hashed))
+        self.assertFalse(await auth_password.verify_password("wrong", hashed))
+        self.assertTrue(await auth_password.verify_password("password", await auth_password.get_hash_password("password")))
+
+    async def test_hash_on_the_process_pool(self):
+        executor = auth.start_password_executor()
+        try:
+            hashed = await auth_service.get_password_hash("password")
+            self.assertTrue(await auth_service.verify_password("password", hashed))
+            self.assertTrue(executor._processes)
+        finally:
+            auth.shutdown_password_executor()
+        self.assertIsNone(auth.password_executor)
+
+    def test_pool_is_sized_per_web_worker(self):
+        with patch.object(settings, "password_hash_workers", None), patch("os.cpu_count", return_value=9):
+            with patch.object(settings, "web_concurrency", 1):
+                self.assertEqual(auth.password_workers(), 8)
+            with patch.object(settings, "web_concurrency", 4):
+                self.assertEqual(auth.password_workers(), 2)
+            with patch.object(settings, "web_concurrency", 16):
+                self.assertEqual(auth.password_workers(), 1)
+        with patch.object(settings, "password_hash_workers", 3):
+            self.assertEqual(auth.password_workers(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
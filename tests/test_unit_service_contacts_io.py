@@ -0,0 +1,29 @@
+import io
+import unittest
+
+from src.services.contacts_io import ImportReport, parse_contacts
+
+
+class TestParseContacts(unittest.TestCase):
+    def test_rows_before_bad_encoding_are_kept(self):
+        rows = "".join(f'{{"firstname": "User{n}", "email": "user{n}@example.com", "phone": "38000000{n:05}"}}\n'
+                       for n in range(1, 301))
+        data = rows.encode() + b'{"firstname": "Caf\xe9", "email": "cafe@example.com", "phone": "3800000099999"}\n'
+        report = ImportReport()
+        contacts = list(parse_contacts(io.BytesIO(data), "ndjson", report))
+        self.assertGreater(len(contacts), 0)
+        self.assertEqual([row for row, _ in contacts], list(range(1, len(contacts) + 1)))
+        self.assertEqual(report.failed, 1)
+        self.assertEqual(report.errors[0]["row"], len(contacts) + 1)
+        self.assertIn("UTF-8", report.errors[0]["error"])
+
+    def test_invalid_rows_are_reported(self):
+        data = b'{"firstname": "Ok", "email": "ok@example.com", "phone": "3800000000001"}\n[1]\n{"email": "x"}\n'
+        report = ImportReport()
+        contacts = list(parse_contacts(io.BytesIO(data), "ndjson", report))
+        self.assertEqual([row for row, _ in contacts], [1])
+        self.assertEqual([error["row"] for error in report.errors], [2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
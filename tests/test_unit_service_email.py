@@ -0,0 +1,120 @@
+import socket
+import unittest
+from unittest import IsolatedAsyncioTestCase
+
+from aiosmtplib import SMTPRecipientsRefused
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+from src.services.email import SMTPPool, build_message, render, templates
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("unknown"):
+            return '550 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.sessions.add(id(session))
+        return '250 OK'
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def accept_all(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+class TestSMTPPool(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.handler = RecordingHandler()
+        self.port = free_port()
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=self.port, authenticator=accept_all,
+                                     auth_require_tls=False)
+        self.controller.start()
+
+    def tearDown(self):
+        self.controller.stop()
+
+    def pool(self, **kwargs) -> SMTPPool:
+        return SMTPPool("127.0.0.1", self.port, "user", "password", use_tls=False, **kwargs)
+
+    @staticmethod
+    def message(n: int):
+        return build_message(f"user{n}@example.com", f"Message {n}", f"<p>{n}</p>")
+
+    async def test_connection_is_reused_across_messages(self):
+        pool = self.pool(size=2)
+        for n in range(5):
+            await pool.send(self.message(n))
+        await pool.close()
+        self.assertEqual(len(self.handler.messages), 5)
+        self.assertEqual(len(self.handler.sessions), 1)
+        self.assertEqual(pool.stats()["connects"], 1)
+        self.assertEqual(self.handler.messages[0].rcpt_tos, ["user0@example.com"])
+
+    async def test_send_many_uses_every_connection(self):
+        pool = self.pool(size=3)
+        await pool.send_many([self.message(n) for n in range(30)])
+        await pool.close()
+        self.assertEqual(len(self.handler.messages), 30)
+        self.assertEqual(pool.stats()["connects"], 3)
+        self.assertEqual(pool.stats()["idle"], 0)
+
+    async def test_connection_is_replaced_after_max_messages(self):
+        pool = self.pool(size=1, max_messages=2)
+        for n in range(5):
+            await pool.send(self.message(n))
+        await pool.close()
+        self.assertEqual(pool.stats()["connects"], 3)
+
+    async def test_dropped_connection_is_reopened(self):
+        pool = self.pool(size=1)
+        await pool.send(self.message(1))
+        # the server ends the session, e.g. after its idle timeout
+        pool.idle[0].client.transport.close()
+        await pool.send(self.message(2))
+        await pool.close()
+        self.assertEqual(len(self.handler.messages), 2)
+        stats = pool.stats()
+        self.assertEqual((stats["connects"], stats["sent"], stats["errors"]), (2, 2, 0))
+
+    async def test_connection_is_kept_after_a_refused_message(self):
+        pool = self.pool(size=1)
+        with self.assertRaises(SMTPRecipientsRefused):
+            await pool.send(build_message("unknown@example.com", "Refused", "<p>0</p>"))
+        await pool.send(self.message(1))
+        await pool.close()
+        self.assertEqual(len(self.handler.messages), 1)
+        stats = pool.stats()
+        self.assertEqual((stats["connects"], stats["sent"], stats["errors"]), (1, 1, 1))
+
+    async def test_unreachable_server_is_an_error(self):
+        pool = SMTPPool("127.0.0.1", free_port(), "user", "password", use_tls=False, size=1, timeout=1)
+        with self.assertRaises(OSError):
+            await pool.send(self.message(1))
+        self.assertEqual(pool.stats()["errors"], 1)
+
+
+class TestTemplates(unittest.TestCase):
+    def test_template_is_compiled_once(self):
+        first = templates.get_template("email_template.html")
+        html = render("email_template.html", host="http://localhost/", username="<b>", token="abc")
+        self.assertIs(templates.get_template("email_template.html"), first)
+        self.assertIn("http://localhost/api/auth/confirmed_email/abc", html)
+        self.assertIn("&lt;b&gt;", html)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from src.services import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = dict(metrics.REGISTRY)
+        metrics.REGISTRY.clear()
+        self.requests = metrics.Counter('test_requests_total', 'Requests', ('route',))
+        self.in_flight = metrics.Gauge('test_in_flight', 'In flight')
+        self.latency = metrics.Histogram('test_latency_seconds', 'Latency', ('route',),
+                                         buckets=(0.1, 1.0, float('inf')))
+
+    def tearDown(self):
+        metrics.REGISTRY.clear()
+        metrics.REGISTRY.update(self.registry)
+
+    def test_render(self):
+        self.requests.inc('/a"b')
+        self.requests.inc('/a"b', amount=2)
+        self.latency.observe(0.05, '/a')
+        self.latency.observe(0.5, '/a')
+        self.latency.observe(5, '/a')
+        text = metrics.render(metrics.snapshot())
+        self.assertIn('# TYPE test_requests_total counter', text)
+        self.assertIn('test_requests_total{route="/a\\"b"} 3.0', text)
+        self.assertIn('test_latency_seconds_bucket{route="/a",le="0.1"} 1', text)
+        self.assertIn('test_latency_seconds_bucket{route="/a",le="1.0"} 2', text)
+        self.assertIn('test_latency_seconds_bucket{route="/a",le="+Inf"} 3', text)
+        self.assertIn('test_latency_seconds_sum{route="/a"} 5.55', text)
+        self.assertIn('test_latency_seconds_count{route="/a"} 3', text)
+
+    def test_merge_drops_gauges_of_exited_workers(self):
+        self.requests.inc('/a')
+        self.in_flight.inc()
+        self.latency.observe(0.5, '/a')
+        dumped = json.loads(json.dumps(metrics.snapshot()))
+        merged = metrics.merge([(dumped, True), (dumped, False)])
+        self.assertEqual(merged['test_requests_total']['series'], [[['/a'], 2]])
+        self.assertEqual(merged['test_in_flight']['series'], [[[], 1]])
+        self.assertEqual(merged['test_latency_seconds']['series'], [[['/a'], [0, 2, 0, 1.0]]])
+
+    def test_exposition_adds_up_workers(self):
+        self.requests.inc('/a')
+        with tempfile.TemporaryDirectory() as directory:
+            other = metrics.snapshot()
+            other['test_requests_total']['series'] = [[['/a'], 4]]
+            with open(os.path.join(directory, '1.json'), 'w') as file:
+                json.dump(other, file)
+            with open(os.path.join(directory, '2.json.tmp'), 'w') as file:
+                file.write('{')
+            text = metrics.exposition(directory)
+            self.assertTrue(os.path.exists(os.path.join(directory, f'{os.getpid()}.json')))
+        self.assertIn('test_requests_total{route="/a"} 5.0', text)
+
+    def test_exposition_folds_exited_workers(self):
+        worker = subprocess.Popen([sys.executable, '-c', ''])
+        worker.wait()
+        self.requests.inc('/a')
+        self.in_flight.inc()
+        with tempfile.TemporaryDirectory() as directory:
+            exited = json.loads(json.dumps(metrics.snapshot()))
+            for _ in range(2):
+                with open(os.path.join(directory, f'{worker.pid}.json'), 'w') as file:
+                    json.dump(exited, file)
+                text = metrics.exposition(directory)
+            self.assertEqual(sorted(os.listdir(directory)), sorted([f'{os.getpid()}.json', 'exited.json',
+                                                                    'exited.lock']))
+            metrics.clear(directory)
+            self.assertEqual(os.listdir(directory), [])
+        self.assertIn('test_requests_total{route="/a"} 3.0', text)
+        self.assertIn('test_in_flight 1.0', text)
+
+    def test_cache_hit_ratio(self):
+        metrics.REGISTRY.update(self.registry)
+        collectors = list(metrics.collectors)
+        try:
+            metrics.register_cache('test', lambda: {"hits": 3, "misses": 1})
+            dumped = metrics.with_hit_ratios(metrics.snapshot())
+        finally:
+            metrics.collectors[:] = collectors
+        self.assertIn([['test'], 0.75], dumped['cache_hit_ratio']['series'])
+
+
+if __name__ == '__main__':
+    unittest.main()
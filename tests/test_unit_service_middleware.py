@@ -0,0 +1,61 @@
+import unittest
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from src.services import metrics
+from src.services.middleware import TimingMiddleware, ErrorsMiddleware
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(TimingMiddleware)
+    app.add_middleware(ErrorsMiddleware)
+
+    @app.get("/ok/{item}")
+    async def ok(item: int):
+        return {"item": item}
+
+    @app.get("/boom")
+    async def boom():
+        raise ValueError("broken")
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield f"{i}\n".encode()
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    return app
+
+
+class TestMiddleware(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(make_app())
+
+    def test_timing_headers_and_histogram(self):
+        before = metrics.http_request_duration.series.get(("GET", "/ok/{item}", 200), [0])[0:-1]
+        response = self.client.get("/ok/1")
+        self.assertEqual(response.json(), {"item": 1})
+        self.assertGreater(float(response.headers["performance"]), 0)
+        self.assertTrue(response.headers["server-timing"].startswith("app;dur="))
+        after = metrics.http_request_duration.series[("GET", "/ok/{item}", 200)][0:-1]
+        self.assertEqual(sum(after), sum(before) + 1)
+        self.assertEqual(metrics.http_requests_in_flight.series[()], 0)
+
+    def test_unhandled_error_is_json_500(self):
+        response = self.client.get("/boom")
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json(), {"reason": "broken"})
+        self.assertIn(("GET", "/boom", 500), metrics.http_request_duration.series)
+
+    def test_streaming_passes_through(self):
+        response = self.client.get("/stream")
+        self.assertEqual(response.text, "0\n1\n2\n")
+        self.assertIn("server-timing", response.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
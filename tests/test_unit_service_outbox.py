@@ -0,0 +1,145 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import IsolatedAsyncioTestCase
+
+from aiosmtplib import SMTPRecipientsRefused, SMTPServerDisconnected
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from src.database.models import Base, EmailOutbox
+from src.repository import outbox as repository_outbox
+from src.services.outbox import OutboxWorker
+
+PAYLOAD = {"subject": "Confirm your email", "template_name": "email_template.html"}
+
+
+class FakeSender:
+    def __init__(self, errors: dict | None = None):
+        self.errors = errors or {}
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, email, username, host, subject, template_name):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if email in self.errors:
+                raise self.errors[email]
+            self.sent.append(email)
+        finally:
+            self.in_flight -= 1
+
+
+class TestOutbox(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        fd, self.path = tempfile.mkstemp(suffix="_outbox.db")
+        os.close(fd)
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{self.path}")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_maker = async_sessionmaker(bind=self.engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        os.remove(self.path)
+
+    async def enqueue(self, *emails: str):
+        async with self.session_maker() as db:
+            for email in emails:
+                await repository_outbox.enqueue_email(email, "user", "http://localhost/", PAYLOAD, db)
+            await db.commit()
+
+    async def rows(self) -> list[EmailOutbox]:
+        async with self.session_maker() as db:
+            return list((await db.execute(select(EmailOutbox).order_by(EmailOutbox.id))).scalars())
+
+    def worker(self, send, **kwargs) -> OutboxWorker:
+        return OutboxWorker(self.session_maker, send, **{"batch_size": 10, "poll_interval": 0.01, **kwargs})
+
+    async def test_sent_emails_are_deleted(self):
+        await self.enqueue("a@example.com", "b@example.com")
+        sender = FakeSender()
+        self.assertEqual(await self.worker(sender).run_once(), 2)
+        self.assertEqual(sender.sent, ["a@example.com", "b@example.com"])
+        self.assertEqual(await self.rows(), [])
+
+    async def test_enqueued_email_is_stored_by_the_callers_commit(self):
+        async with self.session_maker() as db:
+            await repository_outbox.enqueue_email("a@example.com", "user", "http://localhost/", PAYLOAD, db)
+            await db.rollback()
+        self.assertEqual(await self.rows(), [])
+
+    async def test_claimed_emails_are_leased(self):
+        await self.enqueue("a@example.com")
+        async with self.session_maker() as db:
+            claimed = await repository_outbox.claim_batch(10, 300, db)
+            self.assertEqual([message.attempts for message in claimed], [1])
+            self.assertEqual(await repository_outbox.claim_batch(10, 300, db), [])
+        self.assertEqual((await self.rows())[0].attempts, 1)
+
+    async def test_failed_email_is_retried_after_backoff(self):
+        await self.enqueue("a@example.com", "b@example.com")
+        worker = self.worker(FakeSender({"b@example.com": SMTPServerDisconnected("gone")}), backoff_base=60)
+        await worker.run_once()
+        [row] = await self.rows()
+        self.assertEqual((row.email, row.attempts), ("b@example.com", 1))
+        self.assertIn("gone", row.last_error)
+        self.assertGreater(row.next_attempt_at, datetime.utcnow())
+        self.assertEqual(await worker.run_once(), 0)
+        self.assertEqual(worker.stats(), {"sent": 1, "retried": 1, "failed": 0})
+
+    async def test_email_is_given_up_after_max_attempts(self):
+        await self.enqueue("a@example.com")
+        worker = self.worker(FakeSender({"a@example.com": OSError("refused")}), max_attempts=2)
+        for _ in range(2):
+            await worker.run_once()
+            async with self.session_maker() as db:
+                await db.execute(update(EmailOutbox).where(EmailOutbox.next_attempt_at.is_not(None))
+                                 .values(next_attempt_at=datetime.utcnow()))
+                await db.commit()
+        [row] = await self.rows()
+        self.assertEqual(row.attempts, 2)
+        self.assertIsNone(row.next_attempt_at)
+        self.assertEqual(worker.stats(), {"sent": 0, "retried": 1, "failed": 1})
+
+    async def test_rejected_recipient_is_not_retried(self):
+        await self.enqueue("a@example.com")
+        refused = SMTPRecipientsRefused([])
+        worker = self.worker(FakeSender({"a@example.com": refused}))
+        with self.assertLogs("src.services.outbox", "WARNING") as logs:
+            await worker.run_once()
+        self.assertIn("Giving up on email", logs.output[0])
+        [row] = await self.rows()
+        self.assertIsNone(row.next_attempt_at)
+        self.assertEqual(worker.stats()["failed"], 1)
+
+    async def test_concurrency_is_limited(self):
+        await self.enqueue(*(f"user{n}@example.com" for n in range(8)))
+        sender = FakeSender()
+        await self.worker(sender, concurrency=3).run_once()
+        self.assertEqual(len(sender.sent), 8)
+        self.assertEqual(sender.max_in_flight, 3)
+
+    async def test_run_drains_the_outbox_until_stopped(self):
+        await self.enqueue(*(f"user{n}@example.com" for n in range(25)))
+        sender = FakeSender()
+        stop = asyncio.Event()
+        task = asyncio.create_task(self.worker(sender, concurrency=5).run(stop))
+        for _ in range(200):
+            if len(sender.sent) == 25:
+                break
+            await asyncio.sleep(0.01)
+        stop.set()
+        await asyncio.wait_for(task, 1)
+        self.assertEqual(len(sender.sent), 25)
+        self.assertEqual(await self.rows(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
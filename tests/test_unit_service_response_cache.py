@@ -0,0 +1,82 @@
+import unittest
+import zlib
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock
+
+import redis.asyncio as redis
+
+from src.services.response_cache import ResponseCache
+
+
+class DictRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+
+class TestResponseCache(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = ResponseCache(ttl=60)
+        self.cache.r = DictRedis()
+
+    async def test_disabled_without_redis(self):
+        self.cache.r = None
+        key = await self.cache.key(1, "contacts", url="/api/contacts/")
+        self.assertIsNone(key)
+        self.assertIsNone(await self.cache.get(key))
+        await self.cache.set(key, b"[]")
+        await self.cache.bump(1)
+        self.assertEqual(self.cache.stats()["misses"], 0)
+
+    async def test_round_trip_is_compressed(self):
+        key = await self.cache.key(1, "contacts", url="/api/contacts/")
+        self.assertIsNone(await self.cache.get(key))
+        body = b'[' + b'{"firstname":"name"},' * 100 + b'{}]'
+        await self.cache.set(key, body, {"ETag": '"abc"'})
+        self.assertLess(len(self.cache.r.data[key]), len(body))
+        self.assertTrue(zlib.decompress(self.cache.r.data[key]).endswith(body))
+        self.assertEqual(await self.cache.get(key), (body, {"ETag": '"abc"'}))
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_ratio"]), (1, 1, 0.5))
+        self.assertGreater(stats["compression_ratio"], 1)
+
+    async def test_key_depends_on_params_and_user(self):
+        key = await self.cache.key(1, "find", partial_info="ann")
+        self.assertEqual(key, await self.cache.key(1, "find", partial_info="ann"))
+        self.assertNotEqual(key, await self.cache.key(1, "find", partial_info="bob"))
+        self.assertNotEqual(key, await self.cache.key(2, "find", partial_info="ann"))
+        self.assertNotEqual(key, await self.cache.key(1, "contacts", partial_info="ann"))
+
+    async def test_bump_invalidates_only_that_user(self):
+        first = await self.cache.key(1, "contacts", url="/api/contacts/")
+        other = await self.cache.key(2, "contacts", url="/api/contacts/")
+        await self.cache.set(first, b"[]")
+        await self.cache.set(other, b"[]")
+        await self.cache.bump(1)
+        self.assertIsNone(await self.cache.get(await self.cache.key(1, "contacts", url="/api/contacts/")))
+        self.assertIsNotNone(await self.cache.get(await self.cache.key(2, "contacts", url="/api/contacts/")))
+
+    async def test_redis_errors_are_misses(self):
+        self.cache.r = AsyncMock()
+        self.cache.r.get.side_effect = redis.ConnectionError()
+        self.cache.r.incr.side_effect = redis.ConnectionError()
+        self.assertIsNone(await self.cache.key(1, "contacts"))
+        await self.cache.bump(1)
+        self.cache.r.get.side_effect = [b"3", redis.ConnectionError()]
+        key = await self.cache.key(1, "contacts")
+        self.assertTrue(key.startswith("resp:1:3:contacts:"))
+        self.assertIsNone(await self.cache.get(key))
+        self.assertEqual(self.cache.stats()["errors"], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
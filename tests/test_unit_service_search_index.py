@@ -0,0 +1,82 @@
+import unittest
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import MagicMock, AsyncMock
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import User, Contact
+from src.services.lru_cache import LRUCache
+from src.services.search_index import SearchIndex, UserSearchIndex
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_weigher_and_ttl(self):
+        cache = LRUCache(5, weigher=len)
+        cache.set("a", [1, 2, 3])
+        cache.set("b", [1, 2, 3])
+        self.assertEqual(list(cache._data), ["b"])
+        cache.set("c", [1] * 6)
+        self.assertNotIn("c", cache)
+        cache.set("d", [1], ttl=-1)
+        self.assertIsNone(cache.get("d"))
+        self.assertEqual(cache.stats()["misses"], 1)
+
+
+class TestSearchIndex(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.session = AsyncMock(spec=AsyncSession)
+        self.session.execute.return_value = MagicMock()
+        self.user = User(id=1)
+        self.rows = [(i, f"firstname{i}", f"lastname{i}", f"email{i}@example.com", f"380{i}01234567")
+                     for i in range(1, 10)]
+
+    def test_user_search_index(self):
+        index = UserSearchIndex(self.rows)
+        self.assertEqual(index.search("firstname1"), [1])
+        self.assertEqual(index.search("example"), list(range(1, 10)))
+        self.assertEqual(index.search("38"), list(range(1, 10)))
+        self.assertEqual(index.search("Firstname"), [])
+        index.remove(1)
+        index.add(2, ("renamed", "", None, "000"))
+        self.assertEqual(index.search("firstname"), list(range(3, 10)))
+        self.assertEqual(index.search("renamed"), [2])
+
+    async def test_search_builds_once(self):
+        self.session.execute.return_value.all.return_value = self.rows
+        search_index = SearchIndex(100)
+        self.assertEqual(await search_index.search(self.user, "lastname5", self.session), [5])
+        self.assertEqual(await search_index.search(self.user, "lastname6", self.session), [6])
+        self.session.execute.assert_awaited_once()
+        self.assertEqual(search_index.stats()["hits"], 1)
+        self.assertEqual(search_index.stats()["contacts"], 9)
+
+    async def test_write_through(self):
+        self.session.execute.return_value.all.return_value = self.rows
+        search_index = SearchIndex(100)
+        await search_index.build(self.user.id, self.session)
+        search_index.contact_saved(Contact(id=10, user_id=1, firstname="new", lastname="contact",
+                                           email="new@example.com", phone="123"))
+        search_index.contact_removed(Contact(id=1, user_id=1))
+        self.assertEqual(await search_index.search(self.user, "@example", self.session), list(range(2, 11)))
+        self.assertEqual(search_index.stats()["contacts"], 9)
+
+    async def test_evicts_whole_users(self):
+        self.session.execute.return_value.all.return_value = self.rows
+        search_index = SearchIndex(10)
+        await search_index.search(User(id=1), "firstname", self.session)
+        await search_index.search(User(id=2), "firstname", self.session)
+        self.assertEqual(search_index.stats()["users"], 1)
+        self.assertEqual(search_index.stats()["evictions"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
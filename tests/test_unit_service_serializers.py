@@ -0,0 +1,39 @@
+import json
+import unittest
+from datetime import date, datetime
+
+from fastapi.encoders import jsonable_encoder
+
+from src.database.models import Contact
+from src.schemas import ContactResponse, ContactBatchResult
+from src.services.serializers import compile_serializer, dump_one, dump_many, json_response
+
+
+class TestSerializers(unittest.TestCase):
+    def setUp(self):
+        self.contacts = [Contact(id=i, firstname=f"name{i}", lastname="Ünicode", email=f"user{i}@example.com",
+                                 phone=f"+38050000000{i}", birthday=date(1990, 2, i + 1), additional_info="",
+                                 is_favorite=bool(i % 2), created_at=datetime(2023, 4, 4, 10, 0, 0, 123456),
+                                 updated_at=datetime(2023, 4, 5, 10, 0)) for i in range(3)]
+
+    def test_matches_pydantic_output(self):
+        expected = jsonable_encoder([ContactResponse.from_orm(contact) for contact in self.contacts])
+        self.assertEqual(json.loads(dump_many(ContactResponse, self.contacts)), expected)
+        self.assertEqual(json.loads(dump_one(ContactResponse, self.contacts[0])), expected[0])
+
+    def test_serializer_is_compiled_once(self):
+        self.assertIs(compile_serializer(ContactResponse), compile_serializer(ContactResponse))
+
+    def test_nested_models_are_rejected(self):
+        with self.assertRaises(TypeError):
+            compile_serializer(ContactBatchResult)
+
+    def test_json_response(self):
+        response = json_response(b"[]", status_code=201, headers={"ETag": '"x"'})
+        self.assertEqual((response.status_code, response.body), (201, b"[]"))
+        self.assertEqual(response.headers["content-type"], "application/json")
+        self.assertEqual(response.headers["etag"], '"x"')
+
+
+if __name__ == '__main__':
+    unittest.main()